@@ -134,6 +134,8 @@ module "glue_job" {
   user_product_features_table_arn         = module.dynamodb.user_product_features_table_arn
   product_features_table_arn              = module.dynamodb.product_features_table_arn
   user_features_table_arn                 = module.dynamodb.user_features_table_arn
+  table_versions_table_name               = module.dynamodb.table_versions_table_name
+  table_versions_table_arn                = module.dynamodb.table_versions_table_arn
   max_retries                             = 0
   number_of_workers                       = 4
   private_subnet_ids                      = module.vpc.private_subnet_ids
@@ -167,6 +169,7 @@ module "step_functions" {
   endpoint_config_name                    = var.endpoint_config_name
   private_subnet_ids                      = module.vpc.private_subnet_ids
   glue_sagemaker_lambda_security_group_id = module.vpc.glue_sagemaker_lambda_security_group_id
+  table_versions_table_name               = module.dynamodb.table_versions_table_name
   env                                     = var.env
 }
 
@@ -69,4 +69,22 @@ resource "aws_dynamodb_table" "user_features" {
     name = "user_id"
     type = "N"
   }
-}
\ No newline at end of file
+}
+
+# Pointer to the live version of each feature table (blue/green publishing).
+# The "current" item maps base table names to <table>-<run_id> tables.
+resource "aws_dynamodb_table" "table_versions" {
+  name         = var.table_versions_table_name
+  billing_mode = var.billing_mode
+  hash_key     = "pointer"
+
+  attribute {
+    name = "pointer"
+    type = "S"
+  }
+
+  tags = merge(var.tags, {
+    Name        = "${var.table_versions_table_name}"
+    Environment = var.env
+  })
+}
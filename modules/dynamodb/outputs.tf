@@ -50,4 +50,14 @@ output "user_features_table_name" {
 output "user_features_table_arn" {
   description = "ARN of the user_features DynamoDB table"
   value       = aws_dynamodb_table.user_features.arn
-}
\ No newline at end of file
+}
+
+output "table_versions_table_name" {
+  description = "Name of the table_versions DynamoDB table"
+  value       = aws_dynamodb_table.table_versions.name
+}
+
+output "table_versions_table_arn" {
+  description = "ARN of the table_versions DynamoDB table"
+  value       = aws_dynamodb_table.table_versions.arn
+}
@@ -26,6 +26,12 @@ variable "product_features_table_name" {
   default     = "product_features"
 }
 
+variable "table_versions_table_name" {
+  description = "Name of the table_versions pointer table"
+  type        = string
+  default     = "table_versions"
+}
+
 variable "user_features_table_name" {
   description = "Name of the user_features table"
   type        = string
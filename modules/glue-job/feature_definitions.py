@@ -0,0 +1,89 @@
+"""
+Backend-neutral feature definitions.
+
+features.py (Spark/Glue) and local_features.py (pandas) both build their
+features from these specs, each translating them to its own API, so a
+definition changes in one place and compare_outputs checks that the two
+engines still agree. Only plain Python here: the Glue job ships this file
+through --extra-py-files.
+"""
+
+# Typed schema of the Instacart source tables, as loaded and as written to their Parquet copies
+SOURCE_SCHEMAS = {
+    "products": {"product_id": "int", "product_name": "string", "aisle_id": "int", "department_id": "int"},
+    "aisles": {"aisle_id": "int", "aisle": "string"},
+    "departments": {"department_id": "int", "department": "string"},
+    "orders": {"order_id": "int", "user_id": "int", "eval_set": "string", "order_number": "int",
+               "order_dow": "int", "order_hour_of_day": "int", "days_since_prior_order": "double"},
+    "order_products__prior": {"order_id": "int", "product_id": "int", "add_to_cart_order": "int", "reordered": "int"},
+    "order_products__train": {"order_id": "int", "product_id": "int", "add_to_cart_order": "int", "reordered": "int"},
+}
+# Column names some crawled copies of the tables use instead
+SOURCE_RENAMES = {"days_since_prior": "days_since_prior_order"}
+# String spellings of the `reordered` flag; anything else loads as null
+REORDERED_VALUES = {"true": 1, "1": 1, "false": 0, "0": 0}
+# Directory partitions of the Parquet copies, so filters on these columns skip whole partitions
+SOURCE_PARTITIONS = {"orders": ["eval_set"]}
+# Row order within each Parquet file, so row-group statistics can skip order_id ranges
+SOURCE_SORT = {"orders": ["user_id", "order_number"],
+               "order_products__prior": ["order_id"], "order_products__train": ["order_id"]}
+
+# Columns of each order set the features read, and the fill for missing values
+ORDER_COLUMNS = {"prior": ["order_id", "user_id", "order_number", "days_since_prior_order"],
+                 "train": ["user_id", "order_id"],
+                 "test": ["user_id", "order_id"]}
+ORDER_FILLS = {"days_since_prior_order": 0}
+ORDER_PRODUCT_COLUMNS = ["order_id", "product_id", "add_to_cart_order", "reordered"]
+
+# 0/1 flags derived per prior order line before aggregating: name -> (column, comparison, value).
+# A null column gives 0. product_seq_time is the line's rank among the user's orders of the product.
+FLAGS = {
+    "reordered_flag": ("reordered", "==", 1),
+    "repeat_order_flag": ("order_number", ">", 1),
+    "first_order_flag": ("product_seq_time", "==", 1),
+    "second_order_flag": ("product_seq_time", "==", 2),
+}
+
+# Aggregates as (output, function, input); functions: max, sum, mean, count (non-null), count_distinct.
+# Prior orders grouped by user_id
+USER_ORDER_AGGREGATES = [
+    ("user_orders", "max", "order_number"),
+    ("user_periods", "sum", "days_since_prior_order"),
+    ("user_mean_days_since_prior", "mean", "days_since_prior_order"),
+]
+# Prior order lines grouped by user_id
+USER_PRODUCT_AGGREGATES = [
+    ("user_products", "count", "product_id"),
+    ("user_distinct_products", "count_distinct", "product_id"),
+    ("reordered_lines", "sum", "reordered_flag"),
+    ("repeat_order_lines", "sum", "repeat_order_flag"),
+]
+# Ratios of two aggregates, null when the denominator is 0: output -> (numerator, denominator)
+USER_RATIOS = {"user_reorder_ratio": ("reordered_lines", "repeat_order_lines")}
+# Prior order lines grouped by product_id
+PRODUCT_AGGREGATES = [
+    ("prod_orders", "count", "product_id"),
+    ("prod_reorders", "sum", "reordered_flag"),
+    ("prod_first_orders", "sum", "first_order_flag"),
+    ("prod_second_orders", "sum", "second_order_flag"),
+]
+
+USER_FEATURE_COLS = ['user_orders', 'user_periods', 'user_mean_days_since_prior', 'user_products',
+                     'user_distinct_products', 'user_reorder_ratio']
+PRODUCT_FEATURE_COLS = [name for name, _, _ in PRODUCT_AGGREGATES]
+# Model feature order; features missing after the joins are filled with 0
+FEATURE_COLS = USER_FEATURE_COLS + PRODUCT_FEATURE_COLS
+SCALED_FEATURE_COLS = [c + "_scaled" for c in FEATURE_COLS]
+LABEL_COL = "reordered"
+
+# Directory partitions the writers add to user-keyed outputs; not part of a dataset's columns
+PARTITION_COLUMNS = ["user_bucket"]
+
+
+def output_columns(dataset, feature_format="scaled"):
+    """Columns, in order, of a dataset written under features/ by either backend."""
+    published = FEATURE_COLS if feature_format == "raw" else SCALED_FEATURE_COLS
+    return {
+        "train_scaled": ["user_id", LABEL_COL] + SCALED_FEATURE_COLS,
+        "user_product_features": ["user_id", "product_id"] + published,
+    }[dataset]
@@ -1,78 +1,512 @@
 from pyspark.sql import functions as F
 from pyspark.sql.functions import when, col
 from pyspark.sql.window import Window
-from awsglue.context import GlueContext
-from awsglue.dynamicframe import DynamicFrame
-from awsglue.job import Job
 from pyspark.context import SparkContext
+from pyspark.sql import SparkSession
 import os
 import sys
-from pyspark.ml.feature import VectorAssembler, StandardScaler
+from pyspark.ml.feature import VectorAssembler, StandardScaler, Word2Vec, Normalizer
+from pyspark.ml.clustering import KMeans
 from pyspark.ml.functions import vector_to_array
 import boto3
+import cProfile
+import gzip
+import io
 import joblib
+import json
+import marshal
+import math
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from botocore.exceptions import ClientError
+
+# Shipped next to the job through --extra-py-files; shared with local_features.py
+from feature_definitions import (
+    FEATURE_COLS, FLAGS, ORDER_COLUMNS, ORDER_FILLS, ORDER_PRODUCT_COLUMNS, PRODUCT_AGGREGATES, PRODUCT_FEATURE_COLS,
+    REORDERED_VALUES, SCALED_FEATURE_COLS, SOURCE_PARTITIONS, SOURCE_RENAMES, SOURCE_SCHEMAS, SOURCE_SORT,
+    USER_FEATURE_COLS, USER_ORDER_AGGREGATES, USER_PRODUCT_AGGREGATES, USER_RATIOS, output_columns,
+)
+
+# awsglue only exists on Glue; without it the job runs on a plain local Spark session
+try:
+    from awsglue.context import GlueContext
+    from awsglue.dynamicframe import DynamicFrame
+    from awsglue.job import Job
+except ImportError:
+    GlueContext = DynamicFrame = Job = None
+
+# DynamoDB rejects items larger than this
+DYNAMODB_MAX_ITEM_BYTES = 400 * 1024
+
+
+def _job_arg(name, default=None):
+    """Read an optional `--name value` Glue job argument, falling back to default."""
+    flag = f"--{name}"
+    if flag in sys.argv:
+        idx = sys.argv.index(flag)
+        if idx + 1 < len(sys.argv):
+            return sys.argv[idx + 1]
+    return default
+
+
+def _to_ddb_attr(value):
+    """
+    Convert a Python value into a low-level DynamoDB attribute value, or None for
+    None/NaN/inf, which DynamoDB numbers cannot hold; callers omit those attributes.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (int, float)):
+        return {'N': str(value)}
+    return {'S': str(value)}
+
+
+def _to_ddb_item(item):
+    """Convert a row dict into a DynamoDB item, omitting attributes without a value."""
+    attrs = {k: _to_ddb_attr(v) for k, v in item.items()}
+    return {k: v for k, v in attrs.items() if v is not None}
+
+
+# Spark translations of the comparisons and aggregate functions used in feature_definitions
+SPARK_COMPARISONS = {"==": lambda c, v: c == v, ">": lambda c, v: c > v}
+SPARK_AGGREGATES = {"max": F.max, "sum": F.sum, "mean": F.mean, "count": F.count, "count_distinct": F.countDistinct}
+
+
+def _with_flags(df, aggregates):
+    """Add the FLAGS columns the aggregates read: 1 where the comparison holds, else 0."""
+    for _, _, column in aggregates:
+        if column in FLAGS:
+            source, op, value = FLAGS[column]
+            df = df.withColumn(column, when(SPARK_COMPARISONS[op](col(source), value), 1).otherwise(0))
+    return df
+
+
+def _aggregate(df, key, aggregates, ratios=None):
+    """Group by key and compute the aggregate specs (and ratios of them) from feature_definitions."""
+    out = _with_flags(df, aggregates).groupBy(key).agg(
+        *[SPARK_AGGREGATES[fn](column).alias(name) for name, fn, column in aggregates])
+    for name, (numerator, denominator) in (ratios or {}).items():
+        out = out.withColumn(name, when(col(denominator) != 0, col(numerator) / col(denominator)))
+    return out
+
+
+class AdaptiveWriteRate:
+    """
+    AIMD controller for DynamoDB writes: the rate grows additively while writes
+    succeed and is cut multiplicatively whenever DynamoDB throttles us.
+    """
+    THROTTLE_CODES = ('ProvisionedThroughputExceededException', 'ThrottlingException',
+                      'RequestLimitExceeded')
+
+    def __init__(self, initial_rate, max_rate, min_rate=1.0, increase=None, decrease=0.5):
+        self.rate = float(initial_rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.increase = increase if increase is not None else max(self.max_rate / 50.0, 1.0)
+        self.decrease = decrease
+        self._next_slot = time.monotonic()
+
+    def acquire(self, n_items):
+        """Block until n_items may be written at the current rate."""
+        now = time.monotonic()
+        if self._next_slot > now:
+            time.sleep(self._next_slot - now)
+        self._next_slot = max(self._next_slot, now) + n_items / self.rate
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+def _write_partition_to_dynamodb(rows, table_name, key_cols, region, initial_rate, max_rate, delete=False):
+    """Write (or delete) one Spark partition to DynamoDB with adaptive rate control; returns the row count."""
+    client = boto3.client('dynamodb', region_name=region)
+    controller = AdaptiveWriteRate(initial_rate, max_rate)
+
+    def flush(requests):
+        pending = requests
+        while pending:
+            controller.acquire(len(pending))
+            try:
+                response = client.batch_write_item(RequestItems={table_name: pending})
+            except ClientError as e:
+                if e.response['Error']['Code'] in AdaptiveWriteRate.THROTTLE_CODES:
+                    controller.on_throttle()
+                    continue
+                raise
+            pending = response.get('UnprocessedItems', {}).get(table_name, [])
+            if pending:
+                controller.on_throttle()
+            else:
+                controller.on_success()
+
+    batch = []
+    count = 0
+    for row in rows:
+        item = row.asDict()
+        if delete:
+            batch.append({'DeleteRequest': {'Key': {k: _to_ddb_attr(item[k]) for k in key_cols}}})
+        else:
+            batch.append({'PutRequest': {'Item': _to_ddb_item(item)}})
+        count += 1
+        if len(batch) == 25:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return count
+
+
+class PipelineProfiler:
+    """
+    Sampled profiling of one pipeline run: each stage runs under its own
+    cProfile (stages run in separate threads, so profiles do not mix) and
+    tracemalloc traces driver-side allocations for the whole run. Profiles are
+    handed to write_fn(name, bytes) gzip-compressed.
+    """
+
+    def __init__(self, write_fn, trace_allocations=True, frames=10):
+        self.write_fn = write_fn
+        self.trace_allocations = trace_allocations
+        self.frames = frames
+
+    def start(self):
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        if not tracemalloc.is_tracing():
+            return
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        with tempfile.NamedTemporaryFile(suffix=".tracemalloc") as tmp:
+            snapshot.dump(tmp.name)
+            tmp.seek(0)
+            self.write_fn("run_pipeline.tracemalloc.gz", gzip.compress(tmp.read()))
+
+    def profile(self, name, fn, *args):
+        """Run fn(*args) under cProfile and save the stats as <name>.prof.gz."""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            profiler.disable()
+            profiler.create_stats()
+            self.write_fn(f"{name}.prof.gz", gzip.compress(marshal.dumps(profiler.stats)))
+
+
+class SparkMetricsCollector:
+    """
+    Per-step Spark metrics from the driver's status store (the data Spark's own
+    listener collects, served by the monitoring REST API). StageScheduler runs
+    each pipeline step in a fair scheduler pool named after it, so every Spark
+    stage is attributed to a step through its schedulingPool. Per step:
+    executor time, GC time, input and shuffle bytes, spill, and the worst
+    max/median task run time ratio among its stages.
+    """
+
+    def __init__(self, spark, min_skew_tasks=4, timeout_s=10):
+        self.spark = spark
+        self.min_skew_tasks = min_skew_tasks
+        self.timeout_s = timeout_s
+        sc = spark.sparkContext
+        self.base_url = f"{sc.uiWebUrl.rstrip('/')}/api/v1/applications/{sc.applicationId}" if sc.uiWebUrl else None
+
+    def _get(self, path):
+        with urllib.request.urlopen(f"{self.base_url}/{path}", timeout=self.timeout_s) as response:
+            return json.loads(response.read())
+
+    def _skew_ratio(self, stage):
+        """max / median task run time of a stage attempt, or None for stages with few tasks."""
+        if stage.get("numCompleteTasks", 0) < self.min_skew_tasks:
+            return None
+        summary = self._get(f"stages/{stage['stageId']}/{stage['attemptId']}/taskSummary?quantiles=0.5,1.0")
+        median, longest = summary["executorRunTime"]
+        return round(longest / median, 2) if median > 0 else None
+
+    def input_bytes_by_pool(self):
+        """Bytes read from storage by completed Spark stages per scheduler pool ({} if unavailable)."""
+        if self.base_url is None:
+            return {}
+        try:
+            totals = {}
+            for s in self._get("stages?status=complete"):
+                pool = s.get("schedulingPool", "default")
+                totals[pool] = totals.get(pool, 0) + s.get("inputBytes", 0)
+            return totals
+        except Exception as e:
+            print(f"❌ Error reading Spark input metrics: {e}")
+            return {}
+
+    def collect(self, timeline):
+        """Return {"steps": [...], "stages": [...]} for a StageScheduler timeline, or None if unavailable."""
+        if self.base_url is None:
+            print("⚠️ Spark UI is disabled, no Spark metrics collected")
+            return None
+        try:
+            stages = [s for s in self._get("stages") if s.get("status") in ("COMPLETE", "FAILED")]
+            stage_rows = []
+            for s in stages:
+                stage_rows.append({
+                    "step": s.get("schedulingPool", "default"),
+                    "stage_id": s["stageId"], "attempt": s["attemptId"], "name": s.get("name"),
+                    "status": s["status"], "tasks": s.get("numTasks", 0),
+                    "executor_run_s": s.get("executorRunTime", 0) / 1000,
+                    "gc_s": s.get("jvmGcTime", 0) / 1000,
+                    "input_bytes": s.get("inputBytes", 0),
+                    "shuffle_read_bytes": s.get("shuffleReadBytes", 0),
+                    "shuffle_write_bytes": s.get("shuffleWriteBytes", 0),
+                    "memory_spill_bytes": s.get("memoryBytesSpilled", 0),
+                    "disk_spill_bytes": s.get("diskBytesSpilled", 0),
+                    "skew_ratio": self._skew_ratio(s),
+                })
+        except Exception as e:
+            print(f"❌ Error collecting Spark metrics: {e}")
+            return None
+
+        durations = {t["stage"]: t["duration_s"] for t in timeline}
+        steps = []
+        for step in list(durations) + sorted({r["step"] for r in stage_rows} - set(durations)):
+            rows = [r for r in stage_rows if r["step"] == step]
+            skewed = [r for r in rows if r["skew_ratio"] is not None]
+            worst = max(skewed, key=lambda r: r["skew_ratio"], default=None)
+            executor_s = sum(r["executor_run_s"] for r in rows)
+            gc_s = sum(r["gc_s"] for r in rows)
+            steps.append({
+                "step": step, "duration_s": durations.get(step),
+                "spark_stages": len(rows), "tasks": sum(r["tasks"] for r in rows),
+                "executor_run_s": round(executor_s, 2), "gc_s": round(gc_s, 2),
+                "gc_share": round(gc_s / executor_s, 3) if executor_s else 0.0,
+                **{key: sum(r[key] for r in rows) for key in
+                   ("input_bytes", "shuffle_read_bytes", "shuffle_write_bytes",
+                    "memory_spill_bytes", "disk_spill_bytes")},
+                "max_skew_ratio": worst["skew_ratio"] if worst else None,
+                "most_skewed_stage": worst["stage_id"] if worst else None,
+            })
+        return {"steps": steps, "stages": stage_rows}
+
+    @staticmethod
+    def print_summary(report):
+        print(f"{'step':<32}{'time s':>8}{'shuffle MB':>12}{'spill MB':>10}{'GC %':>7}{'skew':>7}")
+        for step in report["steps"]:
+            shuffle_mb = (step["shuffle_read_bytes"] + step["shuffle_write_bytes"]) / 2**20
+            spill_mb = (step["memory_spill_bytes"] + step["disk_spill_bytes"]) / 2**20
+            skew = f"{step['max_skew_ratio']:.1f}" if step["max_skew_ratio"] is not None else "-"
+            duration = f"{step['duration_s']:.1f}" if step["duration_s"] is not None else "-"
+            print(f"{step['step']:<32}{duration:>8}{shuffle_mb:>12.1f}{spill_mb:>10.1f}"
+                  f"{step['gc_share'] * 100:>7.1f}{skew:>7}")
+
+
+class StageScheduler:
+    """
+    Run pipeline stages in dependency order, submitting stages whose
+    dependencies are done concurrently from Python threads. Each stage runs in
+    its own Spark fair scheduler pool so concurrent jobs share the cluster.
+    """
+
+    def __init__(self, spark, max_workers=4, profiler=None):
+        self.spark = spark
+        self.max_workers = max_workers
+        self.profiler = profiler
+        self.stages = {}
+        self.timeline = []
+        self._t0 = None
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, deps=(), materialize=False):
+        """
+        Register a stage. fn receives a dict of dependency results by stage name.
+        With materialize, a returned DataFrame is persisted and counted inside the
+        stage so its Spark job runs concurrently with other stages.
+        """
+        self.stages[name] = {"fn": fn, "deps": tuple(deps), "materialize": materialize}
+
+    def _run_stage(self, name, results):
+        stage = self.stages[name]
+        self.spark.sparkContext.setLocalProperty("spark.scheduler.pool", name)
+        start = time.perf_counter() - self._t0
+        print(f"▶️ Stage started: {name}")
+        try:
+            inputs = {dep: results[dep] for dep in stage["deps"]}
+            if self.profiler is None:
+                result = stage["fn"](inputs)
+            else:
+                result = self.profiler.profile(name, stage["fn"], inputs)
+            if stage["materialize"] and result is not None:
+                result = result.persist()
+                result.count()
+        finally:
+            self.spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+        end = time.perf_counter() - self._t0
+        with self._lock:
+            self.timeline.append({"stage": name, "deps": list(stage["deps"]), "start_s": round(start, 2),
+                                  "end_s": round(end, 2), "duration_s": round(end - start, 2)})
+        print(f"⏹️ Stage finished: {name} ({end - start:.1f}s)")
+        return result
+
+    def run(self):
+        """Run all stages and return their results by name."""
+        self._t0 = time.perf_counter()
+        results, running = {}, {}
+        pending = dict(self.stages)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                ready = [name for name, stage in pending.items() if all(d in results for d in stage["deps"])]
+                for name in ready:
+                    del pending[name]
+                    running[executor.submit(self._run_stage, name, results)] = name
+                if not running:
+                    raise ValueError(f"Unsatisfiable stage dependencies: {sorted(pending)}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+        return results
+
+    def critical_path(self):
+        """Return (stages, seconds) of the longest dependency chain by measured duration."""
+        durations = {t["stage"]: t["duration_s"] for t in self.timeline}
+        best = {}
+
+        def longest(name):
+            if name not in best:
+                chains = [longest(d) for d in self.stages[name]["deps"]]
+                path, total = max(chains, key=lambda c: c[1], default=([], 0.0))
+                best[name] = (path + [name], total + durations.get(name, 0.0))
+            return best[name]
+
+        return max((longest(name) for name in self.stages), key=lambda c: c[1], default=([], 0.0))
+
+    def print_timeline(self, width=50):
+        """Print a text Gantt chart of the stage timeline."""
+        total = max((t["end_s"] for t in self.timeline), default=0.0) or 1.0
+        for t in sorted(self.timeline, key=lambda t: t["start_s"]):
+            offset = int(t["start_s"] / total * width)
+            length = max(1, int(t["duration_s"] / total * width))
+            print(f"{t['stage']:<32}|{' ' * offset}{'#' * length}{' ' * (width - offset - length)}| "
+                  f"{t['start_s']:>7.1f}s +{t['duration_s']:.1f}s")
 
 
 class FeatureEngineering:
-    def __init__(self, database=None, output_bucket=None):
-        """Initialize Spark context and configurations."""
+    def __init__(self, database=None, output_bucket=None, spark=None, data_dir=None, output_dir=None):
+        """
+        Initialize Spark context and configurations.
+
+        With data_dir/output_dir the job runs locally: source tables are read from
+        CSV/Parquet files in data_dir and every output (including the DynamoDB
+        tables, as Parquet) is written under output_dir instead of S3/DynamoDB.
+        """
         try:
             print(" Initializing Spark context...")
-            self.sc = SparkContext.getOrCreate()
-            self.glueContext = GlueContext(self.sc)
-            self.spark = self.glueContext.spark_session
-            self.job = Job(self.glueContext)
+            self.data_dir = data_dir
+            self.output_dir = output_dir
+            self.local = data_dir is not None
+            if self.local or GlueContext is None:
+                self.spark = spark or SparkSession.builder.getOrCreate()
+                self.sc = self.spark.sparkContext
+                self.glueContext = None
+                self.job = None
+            else:
+                self.sc = SparkContext.getOrCreate()
+                self.glueContext = GlueContext(self.sc)
+                self.spark = self.glueContext.spark_session
+                self.job = Job(self.glueContext)
             self.database = database or '${database}'
             self.output_bucket = output_bucket or '${output_bucket}'
+            # "incremental" writes only changed/deleted keys, "full" rewrites every row
+            # "import" skips per-item writes and exports gzip DynamoDB JSON for import-from-S3
+            self.dynamodb_write_mode = _job_arg('dynamodb_write_mode', 'incremental')
+            self.dynamodb_import_start = _job_arg('dynamodb_import_start', 'false').lower() == 'true'
+            # Blue/green: publish to <table>-<run_id>, validate, then switch the pointer readers follow
+            self.dynamodb_versioning = _job_arg('dynamodb_versioning', 'false').lower() == 'true'
+            self.dynamodb_version_table = _job_arg('dynamodb_version_table', 'table_versions')
+            self.dynamodb_keep_versions = int(_job_arg('dynamodb_keep_versions', '2'))
+            self.published_versions = {}
+            # Item2vec embeddings + IVF index for candidate expansion in the Lambda
+            self.build_embeddings = _job_arg('build_embeddings', 'false').lower() == 'true'
+            self.embedding_dim = int(_job_arg('embedding_dim', '32'))
+            self.embedding_min_count = int(_job_arg('embedding_min_count', '5'))
+            self.embedding_max_basket = int(_job_arg('embedding_max_basket', '50'))
+            self.ann_lists = int(_job_arg('ann_lists', '256'))
+            # Sparse co-occurrence neighbour lists (create_product_cooccurrence)
+            self.build_cooccurrence = _job_arg('build_cooccurrence', 'false').lower() == 'true'
+            self.cooc_max_basket = int(_job_arg('cooc_max_basket', '50'))
+            self.cooc_min_product_orders = int(_job_arg('cooc_min_product_orders', '20'))
+            self.cooc_min_count = int(_job_arg('cooc_min_count', '5'))
+            self.cooc_top_k = int(_job_arg('cooc_top_k', '50'))
+            self.dynamodb_max_write_rate = float(_job_arg('dynamodb_max_write_rate', '1000'))
+            self.dynamodb_write_parallelism = int(_job_arg('dynamodb_write_parallelism', '8'))
+            # Keys with more than skew_factor x the median row count are salted across skew_salt_buckets
+            self.skew_factor = float(_job_arg('skew_factor', '10'))
+            self.skew_salt_buckets = int(_job_arg('skew_salt_buckets', '16'))
+            self.join_benchmark = _job_arg('join_benchmark', 'false').lower() == 'true'
+            # Parquet layout for user-keyed outputs
+            self.parquet_user_buckets = int(_job_arg('parquet_user_buckets', '64'))
+            self.parquet_target_file_mb = int(_job_arg('parquet_target_file_mb', '128'))
+            self.parquet_row_group_mb = int(_job_arg('parquet_row_group_mb', '16'))
+            self.max_concurrent_stages = int(_job_arg('max_concurrent_stages', '4'))
+            # "raw" publishes unscaled features and leaves scaling to the serving side
+            self.dynamodb_feature_format = _job_arg('dynamodb_feature_format', 'scaled')
+            # Fraction of runs profiled with cProfile/tracemalloc; 0 leaves the pipeline untouched
+            self.profile_sample_rate = float(_job_arg('profile_sample_rate', '0'))
+            # "parquet" reads typed Parquet copies of the source tables (converted once) with column
+            # and partition pruning; "catalog" reads the raw tables through the Glue Catalog
+            self.source_format = _job_arg('source_format', 'catalog')
+            self.source_prefix = _job_arg('source_prefix', 'source_parquet')
+            self.reconvert_sources = _job_arg('reconvert_sources', 'false').lower() == 'true'
+            # Scan each source load once up front to report its rows/seconds/bytes; doubles the source reads
+            self.measure_loads = _job_arg('measure_loads', 'false').lower() == 'true'
+            self.load_report = {}
+            # Per-step shuffle/spill/GC/skew report from the Spark status store
+            self.collect_spark_metrics = _job_arg('collect_spark_metrics', 'true').lower() == 'true'
+            self.run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+            self.join_report = {}
+            # Let AQE split any remaining skewed shuffle partitions
+            self.spark.conf.set("spark.sql.adaptive.enabled", "true")
+            self.spark.conf.set("spark.sql.adaptive.skewJoin.enabled", "true")
             print(f"✅ Spark context initialized. Database: {self.database}, Output: {self.output_bucket}")
         except Exception as e:
             print(f"❌ Error initializing Spark context: {e}")
             sys.exit(1)
         
     def load_data(self):
-        """Load all required tables from Glue Catalog."""
+        """Load the columns and rows the features need from each source table."""
         try:
-                # List available databases and tables for debugging
+            print(f"📊 Loading data ({self.source_format} sources)...")
+            self.products_df = self._load_measured("products", "products")
+            self.aisles_df = self._load_measured("aisles", "aisles")
+            self.departments_df = self._load_measured("departments", "departments")
+
+            # Each order set is its own pruned read; with Parquet sources eval_set skips whole partitions
+            self.orders_prior_df = self._load_measured(
+                "orders[prior]", "orders", ORDER_COLUMNS["prior"], col("eval_set") == "prior"
+            ).fillna(ORDER_FILLS)
+            self.train_orders_df = self._load_measured("orders[train]", "orders", ORDER_COLUMNS["train"],
+                                                       col("eval_set") == "train")
+            self.test_orders_df = self._load_table("orders", ORDER_COLUMNS["test"], col("eval_set") == "test")
+
+            self.order_products__prior_df = self._load_measured("order_products__prior", "order_products__prior",
+                                                                ORDER_PRODUCT_COLUMNS)
+            self.order_products__train_df = self._load_measured("order_products__train", "order_products__train",
+                                                                ORDER_PRODUCT_COLUMNS)
+            self.order_products_df = self.order_products__prior_df.unionByName(self.order_products__train_df)
+            if self.measure_loads:
+                rows = self.load_report["order_products__prior"]["rows"] + self.load_report["order_products__train"]["rows"]
+                print(f"✅ Loaded order_products: {rows} rows")
 
-            print("📊 Loading data from Glue Catalog...")
-            self.products_df = self._load_table('products')
-            print(f"✅ Loaded products: {self.products_df.count()} rows")
-            
-            self.orders_df = self._load_table('orders')
-            print(f"✅ Loaded orders: {self.orders_df.count()} rows")
-            
-            self.aisles_df = self._load_table('aisles')
-            print(f"✅ Loaded aisles: {self.aisles_df.count()} rows")
-            
-            self.departments_df = self._load_table('departments')
-            print(f"✅ Loaded departments: {self.departments_df.count()} rows")
-            
-            self.order_products__prior_df = self._load_table('order_products__prior')
-            self.order_products__train_df = self._load_table('order_products__train')
-            
-            self.order_products_df = self.order_products__prior_df.unionByName(self.order_products__train_df) \
-                                        .withColumn(
-                                            "reordered_int",
-                                            when(F.lower(col("reordered").cast("string")) == "true", 1)
-                                            .when(F.lower(col("reordered").cast("string")) == "false", 0)
-                                            .otherwise(None)
-                                        ).drop("reordered") \
-                                        .withColumnRenamed("reordered_int", "reordered")
-
-            # self.order_products_df = self._load_table('order_products')
-            print(f"✅ Loaded order_products: {self.order_products_df.count()} rows")
-            
-            # Clean days_since_prior_order
-            self.orders_df = self.orders_df.withColumnRenamed("days_since_prior", "days_since_prior_order").withColumn(
-                "days_since_prior_order",
-                when(col("days_since_prior_order").isNull(), 0).otherwise(col("days_since_prior_order"))
-            )
-            
-            # Filter order sets
-            self.orders_prior_df = self.orders_df.filter(col("eval_set") == "prior")
-            self.train_orders_df = self.orders_df.filter(col("eval_set") == "train").select("user_id", "order_id")
-            self.test_orders_df = self.orders_df.filter(col("eval_set") == "test").select("user_id", "order_id")
-            
             # Join orders with products
             self.order_products_prior = self.orders_prior_df.join(self.order_products_df, "order_id") \
                                       .select("user_id", "order_id", "order_number", 
@@ -85,27 +519,174 @@ class FeatureEngineering:
         except Exception as e:
             print(f"❌ Error loading data: {e}")
             raise
-    
-    def _load_table(self, table):
-        """Helper to load a table from Glue Catalog."""
+
+    def _read_raw_table(self, table):
+        """Read a raw source table from the Glue Catalog (or data_dir when running locally)."""
+        if self.local:
+            base = os.path.join(self.data_dir, table)
+            if os.path.exists(base + ".parquet"):
+                return self.spark.read.parquet(base + ".parquet")
+            if os.path.exists(base + ".csv"):
+                return self.spark.read.csv(base + ".csv", header=True, inferSchema=True)
+            return self.spark.read.parquet(base)
+        return self.glueContext.create_dynamic_frame.from_catalog(
+            database=self.database, 
+            table_name=table
+        ).toDF()
+
+    def _typed_source(self, table, df):
+        """Cast a raw source table to SOURCE_SCHEMAS, normalizing crawler column names and string flags."""
+        for raw_name, name in SOURCE_RENAMES.items():
+            if raw_name in df.columns:
+                df = df.withColumnRenamed(raw_name, name)
+        columns = []
+        for name, dtype in SOURCE_SCHEMAS[table].items():
+            if name == "reordered":
+                text = F.lower(col(name).cast("string"))
+                flag = None
+                for spelling, value in REORDERED_VALUES.items():
+                    flag = (F.when if flag is None else flag.when)(text == spelling, value)
+                columns.append(flag.otherwise(None).cast(dtype).alias(name))
+            else:
+                columns.append(col(name).cast(dtype).alias(name))
+        return df.select(*columns)
+
+    def _load_table(self, table, columns=None, predicate=None):
+        """
+        Load a typed source table, keeping only rows matching predicate and the given
+        columns. Against the Parquet copies both are pushed into the scan.
+        """
         try:
             print(f"📖 Loading table: {table}")
-            df = self.glueContext.create_dynamic_frame.from_catalog(
-                database=self.database, 
-                table_name=table
-            ).toDF()
+            if self.source_format == "parquet":
+                df = self.spark.read.parquet(self._output_path(f"{self.source_prefix}/{table}"))
+            else:
+                df = self._typed_source(table, self._read_raw_table(table))
+            if predicate is not None:
+                df = df.filter(predicate)
+            if columns:
+                df = df.select(*columns)
             print(f"✅ Successfully loaded {table}")
             return df
         except Exception as e:
             print(f"❌ Error loading table {table}: {e}")
             raise
-    
-    def _save_parquet(self, df, path_suffix):
-        """Save DataFrame as Parquet."""
+
+    def _load_measured(self, label, table, columns=None, predicate=None):
+        """
+        Load a table. With --measure_loads, also scan its selected columns once in a
+        scheduler pool of its own, recording rows and seconds in load_report (bytes
+        scanned are added from the pool's Spark input metrics after the run). That
+        scan is an extra read of the source, so it is off by default.
+        """
+        df = self._load_table(table, columns, predicate)
+        if not self.measure_loads:
+            return df
+        sc = self.spark.sparkContext
+        pool = sc.getLocalProperty("spark.scheduler.pool")
+        sc.setLocalProperty("spark.scheduler.pool", f"load_data/{label}")
+        try:
+            start = time.perf_counter()
+            # Counting every column (not count()) makes the scan read what the pipeline will read
+            rows = df.agg(F.count(F.lit(1)), *[F.count(c) for c in df.columns]).first()[0]
+            seconds = time.perf_counter() - start
+        finally:
+            sc.setLocalProperty("spark.scheduler.pool", pool)
+        self.load_report[label] = {"table": table, "columns": df.columns,
+                                   "predicate": str(predicate) if predicate is not None else None,
+                                   "rows": rows, "seconds": round(seconds, 2)}
+        print(f"✅ Loaded {label}: {rows} rows in {seconds:.1f}s")
+        return df
+
+    def _source_converted(self, table):
+        key = f"{self.source_prefix}/{table}/_SUCCESS"
+        if self.local:
+            return os.path.exists(self._output_path(key))
+        try:
+            boto3.client('s3').head_object(Bucket=self.output_bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def convert_source_tables(self):
+        """
+        One-time conversion of the raw source tables to typed, snappy-compressed Parquet
+        under source_prefix: orders partitioned by eval_set, files sorted so row-group
+        statistics prune. Tables already converted are skipped unless --reconvert_sources.
+        """
         try:
-            path = f"s3://{self.output_bucket}/features/{path_suffix}"
+            for table in SOURCE_SCHEMAS:
+                path = self._output_path(f"{self.source_prefix}/{table}")
+                if self._source_converted(table) and not self.reconvert_sources:
+                    print(f"⏭️ Source already converted: {path}")
+                    continue
+                print(f"🧱 Converting source table {table}: {path}")
+                df = self._typed_source(table, self._read_raw_table(table))
+                partitions = SOURCE_PARTITIONS.get(table, [])
+                if partitions:
+                    df = df.repartition(*partitions)
+                df = df.sortWithinPartitions(*partitions, *SOURCE_SORT.get(table, []))
+                writer = df.write.mode("overwrite") \
+                                 .option("maxRecordsPerFile", self._records_per_file(df)) \
+                                 .option("parquet.block.size", self.parquet_row_group_mb * 1024 * 1024) \
+                                 .option("compression", "snappy")
+                if partitions:
+                    writer = writer.partitionBy(*partitions)
+                writer.parquet(path)
+                print(f"✅ Converted {table}")
+        except Exception as e:
+            print(f"❌ Error converting source tables: {e}")
+            raise
+
+    def _write_load_report(self):
+        """Add bytes scanned per table load from Spark input metrics and save the source_load report."""
+        input_bytes = SparkMetricsCollector(self.spark).input_bytes_by_pool() if self.collect_spark_metrics else {}
+        print(f"{'table':<28}{'rows':>12}{'seconds':>9}{'MB scanned':>12}")
+        for label, entry in self.load_report.items():
+            entry["bytes_scanned"] = input_bytes.get(f"load_data/{label}")
+            scanned = f"{entry['bytes_scanned'] / 2**20:.1f}" if entry["bytes_scanned"] is not None else "-"
+            print(f"{label:<28}{entry['rows']:>12}{entry['seconds']:>9.1f}{scanned:>12}")
+        self._write_report("source_load", {"source_format": self.source_format, "tables": self.load_report})
+
+    def _output_path(self, suffix):
+        """Location of an output under the output bucket (or output_dir when running locally)."""
+        if self.local:
+            return os.path.join(self.output_dir, suffix)
+        return f"s3://{self.output_bucket}/{suffix}"
+
+    def _records_per_file(self, df):
+        """Approximate how many rows fit in parquet_target_file_mb from the schema."""
+        type_bytes = {"int": 4, "bigint": 8, "double": 8, "float": 4, "boolean": 1, "date": 4, "timestamp": 8}
+        row_bytes = sum(type_bytes.get(field.dataType.simpleString(), 32) for field in df.schema.fields)
+        return max(1, (self.parquet_target_file_mb * 1024 * 1024) // max(row_bytes, 1))
+
+    def _save_parquet(self, df, path_suffix, bucket_by_user=False, sort_cols=None):
+        """
+        Save DataFrame as Parquet.
+
+        With bucket_by_user, rows go to user_bucket=pmod(user_id, parquet_user_buckets)
+        directories and are sorted by sort_cols (default user_id) within each file, so
+        a reader looking for one user or segment can skip other buckets and, via the
+        min/max column statistics, most row groups of the remaining files.
+        """
+        try:
+            path = self._output_path(f"features/{path_suffix}")
             print(f"💾 Saving Parquet: {path}")
-            df.write.mode("overwrite").parquet(path)
+            if bucket_by_user:
+                sort_cols = sort_cols or ["user_id"]
+                df = df.withColumn("user_bucket", F.pmod(col("user_id"), F.lit(self.parquet_user_buckets))) \
+                       .repartition("user_bucket") \
+                       .sortWithinPartitions("user_bucket", *sort_cols)
+            elif sort_cols:
+                df = df.sortWithinPartitions(*sort_cols)
+
+            writer = df.write.mode("overwrite") \
+                             .option("maxRecordsPerFile", self._records_per_file(df)) \
+                             .option("parquet.block.size", self.parquet_row_group_mb * 1024 * 1024) \
+                             .option("compression", "snappy")
+            if bucket_by_user:
+                writer = writer.partitionBy("user_bucket")
+            writer.parquet(path)
             print(f"✅ Saved Parquet: {path}")
         except Exception as e:
             print(f"❌ Error saving Parquet {path}: {e}")
@@ -130,7 +711,422 @@ class FeatureEngineering:
         except Exception as e:
             print(f"❌ Error saving to DynamoDB {table_name}: {e}")
             raise
+
+    def _snapshot_prefix(self, table_name):
+        return f"snapshots/{table_name}"
+
+    def _latest_snapshot_path(self, table_name):
+        """Return the S3 path of the previous run's snapshot for a table, or None."""
+        try:
+            obj = boto3.client('s3').get_object(
+                Bucket=self.output_bucket, Key=f"{self._snapshot_prefix(table_name)}/_LATEST"
+            )
+            run_id = obj['Body'].read().decode('utf-8').strip()
+            return f"s3://{self.output_bucket}/{self._snapshot_prefix(table_name)}/{run_id}"
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def _save_to_dynamodb_incremental(self, df, table_name, key_cols):
+        """
+        Write only rows whose content changed since the previous run and delete keys
+        that disappeared. Each row is reduced to a content hash which is kept as a
+        snapshot in S3 for the next run to diff against.
+        """
+        try:
+            print(f" Saving changed rows to DynamoDB: {table_name}")
+            value_cols = [c for c in df.columns if c not in key_cols]
+            hashed_df = df.withColumn("_row_hash", F.xxhash64(*value_cols)).persist()
+
+            prev_path = self._latest_snapshot_path(table_name)
+            if prev_path:
+                print(f"🔍 Diffing against snapshot: {prev_path}")
+                prev_df = self.spark.read.parquet(prev_path).withColumnRenamed("_row_hash", "_prev_hash")
+                changed_df = hashed_df.join(prev_df, key_cols, "left") \
+                                      .filter(col("_prev_hash").isNull() | (col("_prev_hash") != col("_row_hash"))) \
+                                      .drop("_prev_hash", "_row_hash")
+                deleted_df = prev_df.select(*key_cols).join(hashed_df.select(*key_cols), key_cols, "left_anti")
+            else:
+                print(f"⚠️ No previous snapshot for {table_name}, writing all rows")
+                changed_df = hashed_df.drop("_row_hash")
+                deleted_df = None
+
+            region = boto3.session.Session().region_name
+            parallelism = self.dynamodb_write_parallelism
+            max_rate = self.dynamodb_max_write_rate / parallelism
+            initial_rate = max_rate / 4
+
+            # Count rows as they are written instead of evaluating the diff twice
+            sc = self.spark.sparkContext
+            changed_count = sc.accumulator(0)
+            changed_df.coalesce(parallelism).foreachPartition(
+                lambda rows: changed_count.add(_write_partition_to_dynamodb(rows, table_name, key_cols, region,
+                                                                            initial_rate, max_rate))
+            )
+            print(f"📝 Wrote {changed_count.value} changed rows")
+
+            if deleted_df is not None:
+                deleted_count = sc.accumulator(0)
+                deleted_df.coalesce(parallelism).foreachPartition(
+                    lambda rows: deleted_count.add(_write_partition_to_dynamodb(rows, table_name, key_cols, region,
+                                                                                initial_rate, max_rate, delete=True))
+                )
+                print(f"🗑️ Removed {deleted_count.value} deleted keys")
+
+            # Record the new snapshot only after DynamoDB is up to date
+            run_id = self.run_id
+            snapshot_path = f"s3://{self.output_bucket}/{self._snapshot_prefix(table_name)}/{run_id}"
+            hashed_df.select(*key_cols, "_row_hash").write.mode("overwrite").parquet(snapshot_path)
+            boto3.client('s3').put_object(
+                Bucket=self.output_bucket, Key=f"{self._snapshot_prefix(table_name)}/_LATEST", Body=run_id.encode('utf-8')
+            )
+            hashed_df.unpersist()
+            print(f"✅ Saved changed rows to DynamoDB: {table_name} (snapshot {run_id})")
+        except Exception as e:
+            print(f"❌ Error saving changed rows to DynamoDB {table_name}: {e}")
+            raise
+
+    def _export_for_dynamodb_import(self, df, table_name, key_cols):
+        """
+        Write a table as gzip DynamoDB JSON lines ({"Item": {...}}) under
+        dynamodb_import/<table>/<run_id>/data/, the layout DynamoDB's import-from-S3
+        loads into a new table, plus a manifest.json with the key schema. With
+        dynamodb_import_start the import into <table>-<run_id> is started as well.
+        NaN/inf numbers are left out of the items, and the items are checked for
+        duplicate keys and oversized items before anything is written.
+        """
+        try:
+            prefix = f"dynamodb_import/{table_name}/{self.run_id}"
+            path = self._output_path(f"{prefix}/data")
+            print(f"📦 Exporting {table_name} for DynamoDB import: {path}")
+
+            numeric = ("tinyint", "smallint", "int", "bigint", "float", "double")
+            attr_types, attrs = {}, []
+            for field in df.schema.fields:
+                type_name = field.dataType.simpleString()
+                if type_name == "boolean":
+                    attr_type, value = "BOOL", col(field.name)
+                elif type_name in numeric or type_name.startswith("decimal"):
+                    attr_type, value = "N", col(field.name).cast("string")
+                else:
+                    attr_type, value = "S", col(field.name).cast("string")
+                attr_types[field.name] = attr_type
+                # DynamoDB numbers cannot hold NaN/inf (cast to "NaN"/"Infinity"), so treat them as null
+                present = col(field.name).isNotNull()
+                if type_name in ("float", "double"):
+                    present = present & ~F.isnan(col(field.name)) & (F.abs(col(field.name)) != float("inf"))
+                # Null attributes become null structs, which to_json leaves out of the item
+                attrs.append(F.when(present, F.struct(value.alias(attr_type))).alias(field.name))
+
+            for key in key_cols:
+                df = df.filter(col(key).isNotNull())
+                if attr_types[key] == "N":
+                    df = df.filter(~F.isnan(col(key)))
+            items = df.select(*key_cols, F.to_json(F.struct(F.struct(*attrs).alias("Item"))).alias("value")).persist()
+
+            # An import fails on duplicate primary keys or items over the size limit; catch both here
+            stats = items.agg(F.count(F.lit(1)).alias("items"),
+                              F.countDistinct(*key_cols).alias("keys"),
+                              F.max(F.expr("octet_length(value)")).alias("max_bytes")).first()
+            item_count = stats["items"]
+            if stats["keys"] != item_count:
+                raise ValueError(f"{table_name} has {item_count - stats['keys']} duplicate primary keys")
+            if (stats["max_bytes"] or 0) > DYNAMODB_MAX_ITEM_BYTES:
+                raise ValueError(f"{table_name} has an item of {stats['max_bytes']} bytes, "
+                                 f"over the {DYNAMODB_MAX_ITEM_BYTES} byte limit")
+            print(f"✅ Validated {item_count} items for DynamoDB import: {table_name}")
+
+            items.select("value").write.mode("overwrite") \
+                       .option("maxRecordsPerFile", self._records_per_file(df)) \
+                       .option("compression", "gzip") \
+                       .text(path)
+            items.unpersist()
+
+            manifest = {
+                "table_name": table_name,
+                "run_id": self.run_id,
+                "item_count": item_count,
+                "input_format": "DYNAMODB_JSON",
+                "input_compression_type": "GZIP",
+                # part- excludes the _SUCCESS marker from the import
+                "s3_key_prefix": f"{prefix}/data/part-",
+                "key_schema": [{"AttributeName": k, "KeyType": "HASH" if i == 0 else "RANGE"}
+                               for i, k in enumerate(key_cols)],
+                "attribute_definitions": [{"AttributeName": k, "AttributeType": attr_types[k]} for k in key_cols],
+            }
+
+            if (self.dynamodb_import_start or self.dynamodb_versioning) and not self.local:
+                response = boto3.client('dynamodb').import_table(
+                    S3BucketSource={"S3Bucket": self.output_bucket, "S3KeyPrefix": manifest["s3_key_prefix"]},
+                    InputFormat="DYNAMODB_JSON",
+                    InputCompressionType="GZIP",
+                    TableCreationParameters={
+                        "TableName": f"{table_name}-{self.run_id}",
+                        "KeySchema": manifest["key_schema"],
+                        "AttributeDefinitions": manifest["attribute_definitions"],
+                        "BillingMode": "PAY_PER_REQUEST",
+                    },
+                )
+                manifest["import_arn"] = response["ImportTableDescription"]["ImportArn"]
+                print(f"🚚 Started DynamoDB import into {table_name}-{self.run_id}: {manifest['import_arn']}")
+
+            body = json.dumps(manifest, indent=2)
+            if self.local:
+                with open(self._output_path(f"{prefix}/manifest.json"), "w") as f:
+                    f.write(body)
+            else:
+                boto3.client('s3').put_object(Bucket=self.output_bucket, Key=f"{prefix}/manifest.json",
+                                              Body=body.encode('utf-8'))
+            print(f"✅ Exported {item_count} items for DynamoDB import: {table_name}")
+            return manifest
+        except Exception as e:
+            print(f"❌ Error exporting {table_name} for DynamoDB import: {e}")
+            raise
+
+    def _versioned_table_name(self, table_name):
+        return f"{table_name}-{self.run_id}"
+
+    def _sample_rows(self, df, n=50):
+        """A small random sample of rows (as dicts) used to validate a published version."""
+        return [row.asDict() for row in df.sample(fraction=0.01, seed=42).limit(n).collect()] or \
+               [row.asDict() for row in df.limit(n).collect()]
+
+    def _save_to_dynamodb_version(self, df, table_name, key_cols):
+        """Create <table>-<run_id> with the table's key schema and write every row into it."""
+        try:
+            versioned = self._versioned_table_name(table_name)
+            print(f" Saving to new DynamoDB table version: {versioned}")
+            types = {field.name: ("S" if field.dataType.simpleString() == "string" else "N")
+                     for field in df.schema.fields}
+            client = boto3.client('dynamodb')
+            client.create_table(
+                TableName=versioned,
+                KeySchema=[{"AttributeName": k, "KeyType": "HASH" if i == 0 else "RANGE"}
+                           for i, k in enumerate(key_cols)],
+                AttributeDefinitions=[{"AttributeName": k, "AttributeType": types[k]} for k in key_cols],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            client.get_waiter('table_exists').wait(TableName=versioned)
+
+            # Live readers stay on the current version, so the new table takes the full write rate
+            region = boto3.session.Session().region_name
+            parallelism = self.dynamodb_write_parallelism
+            max_rate = self.dynamodb_max_write_rate / parallelism
+            df = df.coalesce(parallelism).persist()
+            item_count = df.count()
+            df.foreachPartition(
+                lambda rows: _write_partition_to_dynamodb(rows, versioned, key_cols, region, max_rate / 4, max_rate)
+            )
+            df.unpersist()
+            print(f"✅ Saved {item_count} items to DynamoDB: {versioned}")
+            return item_count
+        except Exception as e:
+            print(f"❌ Error saving to DynamoDB version of {table_name}: {e}")
+            raise
+
+    def _publish_to_dynamodb(self, df, table_name, key_cols):
+        """Write a feature table to DynamoDB using the configured write mode."""
+        if self.dynamodb_versioning and not self.local:
+            version = {"table": self._versioned_table_name(table_name), "key_cols": key_cols,
+                       "sample": self._sample_rows(df)}
+            if self.dynamodb_write_mode == "import":
+                manifest = self._export_for_dynamodb_import(df, table_name, key_cols)
+                version.update(item_count=manifest["item_count"], import_arn=manifest["import_arn"])
+            else:
+                version["item_count"] = self._save_to_dynamodb_version(df, table_name, key_cols)
+            self.published_versions[table_name] = version
+        elif self.dynamodb_write_mode == "import":
+            self._export_for_dynamodb_import(df, table_name, key_cols)
+        elif self.local:
+            self._save_parquet(df, f"dynamodb/{table_name}")
+        elif self.dynamodb_write_mode == "incremental":
+            self._save_to_dynamodb_incremental(df, table_name, key_cols)
+        else:
+            self._save_to_dynamodb(df, table_name)
     
+    def _validate_version(self, table_name, version, poll_s=30):
+        """Check a published version before cutover: import finished cleanly and sampled rows match."""
+        client = boto3.client('dynamodb')
+        if "import_arn" in version:
+            while True:
+                status = client.describe_import(ImportArn=version["import_arn"])["ImportTableDescription"]
+                if status["ImportStatus"] not in ("IN_PROGRESS",):
+                    break
+                print(f"⏳ Waiting for import into {version['table']}...")
+                time.sleep(poll_s)
+            if status["ImportStatus"] != "COMPLETED" or status.get("ErrorCount", 0):
+                raise ValueError(f"Import into {version['table']} ended {status['ImportStatus']} "
+                                 f"with {status.get('ErrorCount', 0)} errors")
+            if status.get("ImportedItemCount") != version["item_count"]:
+                raise ValueError(f"Imported {status.get('ImportedItemCount')} items into {version['table']}, "
+                                 f"expected {version['item_count']}")
+
+        key_cols = version["key_cols"]
+        keys = [{k: _to_ddb_attr(row[k]) for k in key_cols} for row in version["sample"]]
+        found = {}
+        for start in range(0, len(keys), 100):
+            pending = keys[start:start + 100]
+            while pending:
+                response = client.batch_get_item(RequestItems={version["table"]: {"Keys": pending}})
+                for item in response["Responses"].get(version["table"], []):
+                    found[tuple(list(item[k].values())[0] for k in key_cols)] = item
+                pending = response.get("UnprocessedKeys", {}).get(version["table"], {}).get("Keys", [])
+        for row in version["sample"]:
+            item = found.get(tuple(str(row[k]) for k in key_cols))
+            if item is None:
+                raise ValueError(f"{version['table']} is missing key {[row[k] for k in key_cols]}")
+            for name, value in row.items():
+                # Attributes without a value (None/NaN) were never written
+                if _to_ddb_attr(value) is None:
+                    continue
+                stored = list(item[name].values())[0] if name in item else None
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    if stored is None or abs(float(stored) - value) > 1e-6 * max(1.0, abs(value)):
+                        raise ValueError(f"{version['table']} has {name}={stored} for a row with {value}")
+                elif stored != str(value) and stored != value:
+                    raise ValueError(f"{version['table']} has {name}={stored} for a row with {value}")
+        print(f"✅ Validated {version['table']}: {len(version['sample'])} sampled rows match")
+
+    def _cutover_versions(self):
+        """
+        Validate this run's table versions, then switch the pointer item readers use in one
+        conditional put, so they see either all old or all new tables. Old versions beyond
+        dynamodb_keep_versions are deleted afterwards.
+        """
+        try:
+            for table_name, version in self.published_versions.items():
+                self._validate_version(table_name, version)
+
+            pointers = boto3.resource('dynamodb').Table(self.dynamodb_version_table)
+            current = pointers.get_item(Key={"pointer": "current"}, ConsistentRead=True).get("Item")
+            tables = dict(current["tables"]) if current else {}
+            tables.update({name: version["table"] for name, version in self.published_versions.items()})
+            item = {"pointer": "current", "version": self.run_id, "tables": tables,
+                    "previous_version": current["version"] if current else "",
+                    "previous_tables": current["tables"] if current else {},
+                    "updated_at": datetime.utcnow().isoformat()}
+            # Fails if another run switched the pointer since we read it
+            if current:
+                pointers.put_item(Item=item, ConditionExpression="version = :previous",
+                                  ExpressionAttributeValues={":previous": current["version"]})
+            else:
+                pointers.put_item(Item=item, ConditionExpression="attribute_not_exists(pointer)")
+            print(f"🔀 Switched feature tables to version {self.run_id}: {tables}")
+
+            self._delete_old_versions(tables, current["tables"] if current else {})
+        except Exception as e:
+            print(f"❌ Error switching feature table versions: {e}")
+            raise
+
+    def _delete_old_versions(self, tables, previous_tables):
+        """Delete <table>-<run_id> versions beyond the newest dynamodb_keep_versions, never a live one."""
+        client = boto3.client('dynamodb')
+        live = set(tables.values()) | set(previous_tables.values())
+        names = [name for page in client.get_paginator('list_tables').paginate() for name in page["TableNames"]]
+        for table_name in self.published_versions:
+            versions = sorted((name for name in names
+                               if name.startswith(f"{table_name}-") and name[len(table_name) + 1:].isalnum()),
+                              reverse=True)
+            for name in versions[self.dynamodb_keep_versions:]:
+                if name in live:
+                    continue
+                client.delete_table(TableName=name)
+                print(f"🗑️ Deleted old table version: {name}")
+
+    def _write_report(self, name, payload):
+        """Write a JSON run report next to the Parquet outputs."""
+        try:
+            key = f"features/_reports/{name}/{self.run_id}.json"
+            body = json.dumps(payload, indent=2, default=str)
+            if self.local:
+                path = self._output_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(body)
+            else:
+                boto3.client('s3').put_object(Bucket=self.output_bucket, Key=key, Body=body.encode('utf-8'))
+            print(f"✅ Saved report: {self._output_path(key)}")
+        except Exception as e:
+            print(f"❌ Error saving report {name}: {e}")
+
+    def _put_bytes(self, key, data):
+        """Write bytes to key in the output bucket, or under the local output directory."""
+        if self.local:
+            path = self._output_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        else:
+            boto3.client('s3').put_object(Bucket=self.output_bucket, Key=key, Body=data)
+
+    def _write_profile(self, name, data):
+        """Write a compressed profile under features/_profiles/<job run>/."""
+        key = f"features/_profiles/{_job_arg('JOB_RUN_ID', self.run_id)}/{name}"
+        try:
+            self._put_bytes(key, data)
+            print(f"📈 Saved profile: {self._output_path(key)}")
+        except Exception as e:
+            print(f"❌ Error saving profile {name}: {e}")
+
+    def _time_action(self, df):
+        """Materialize a DataFrame without writing output and return the elapsed seconds."""
+        start = time.perf_counter()
+        df.write.format("noop").mode("overwrite").save()
+        return time.perf_counter() - start
+
+    def _detect_skewed_keys(self, df, key, top_n=20):
+        """Return the heaviest keys whose row count exceeds skew_factor x the median."""
+        counts = df.groupBy(key).count()
+        median = counts.agg(F.expr("percentile_approx(count, 0.5)").alias("median")).first()["median"] or 0
+        threshold = max(median * self.skew_factor, 1)
+        heavy = counts.filter(col("count") > threshold).orderBy(F.desc("count")).limit(top_n).collect()
+        return [(row[key], row["count"]) for row in heavy], median
+
+    def _salted_join(self, left, right, key, heavy_keys, how="left"):
+        """
+        Join on key, spreading rows of heavy keys over skew_salt_buckets partitions.
+        The (small) right side is replicated once per salt for heavy keys only.
+        """
+        if not heavy_keys:
+            return left.join(right, key, how)
+        n = self.skew_salt_buckets
+        is_heavy = col(key).isin(heavy_keys)
+        left_salted = left.withColumn("_salt", when(is_heavy, (F.rand() * n).cast("int")).otherwise(F.lit(0)))
+        right_salted = right.withColumn(
+            "_salt", F.explode(when(is_heavy, F.sequence(F.lit(0), F.lit(n - 1))).otherwise(F.array(F.lit(0))))
+        )
+        return left_salted.join(right_salted, [key, "_salt"], how).drop("_salt")
+
+    def _join_features(self, pairs, user_features, prd_features, stage):
+        """
+        Left-join user and product features onto (user_id, product_id) pairs.
+        Product features are small and broadcast; the user join is salted for the
+        few very active users that dominate the pairs.
+        """
+        heavy_users, user_median = self._detect_skewed_keys(pairs, "user_id")
+        heavy_products, product_median = self._detect_skewed_keys(pairs, "product_id")
+        heavy_user_ids = [k for k, _ in heavy_users]
+        print(f"🔍 {stage}: {len(heavy_users)} skewed users, {len(heavy_products)} skewed products")
+
+        joined = self._salted_join(pairs, user_features, "user_id", heavy_user_ids) \
+                     .join(F.broadcast(prd_features), "product_id", "left")
+
+        report = {
+            "skewed_user_ids": [{"user_id": k, "rows": c} for k, c in heavy_users],
+            "user_median_rows": user_median,
+            "skewed_product_ids": [{"product_id": k, "rows": c} for k, c in heavy_products],
+            "product_median_rows": product_median,
+        }
+        if self.join_benchmark:
+            baseline = pairs.join(user_features, "user_id", "left").join(prd_features, "product_id", "left")
+            report["default_join_seconds"] = self._time_action(baseline)
+            report["skew_aware_join_seconds"] = self._time_action(joined)
+            print(f"⏱️ {stage}: default {report['default_join_seconds']:.1f}s, "
+                  f"skew-aware {report['skew_aware_join_seconds']:.1f}s")
+        self.join_report[stage] = report
+        return joined
+
     def _apply_standard_scaler(self, df, id_cols):
         """
         Fit a StandardScaler on the given DataFrame (excluding id_cols), 
@@ -164,25 +1160,45 @@ class FeatureEngineering:
 
     # In your Glue job (features.py)
     def save_scaler_parameters(self, scaler_model, output_bucket):
-        """Extract PySpark scaler parameters and save as sklearn-compatible format"""
+        """Extract PySpark scaler parameters and save as plain JSON and sklearn-compatible format"""
         try:
             import numpy as np
-            from sklearn.preprocessing import StandardScaler
             
             # Extract parameters from PySpark scaler
             mean_values = scaler_model.mean.toArray()
             std_values = scaler_model.std.toArray()
+
+            # Plain mean/scale for the Lambda, the recommendation service and the endpoint
+            # handler, so serving needs neither joblib nor scikit-learn
+            scaler_params = json.dumps({"features": FEATURE_COLS, "mean": mean_values.tolist(),
+                                        "scale": np.where(std_values == 0, 1.0, std_values).tolist()})
+            if self.local:
+                os.makedirs(self._output_path("scale_models"), exist_ok=True)
+                with open(self._output_path("scale_models/scaler_params.json"), "w") as f:
+                    f.write(scaler_params)
+            else:
+                boto3.client('s3').put_object(Bucket=output_bucket, Key="scale_models/scaler_params.json",
+                                              Body=scaler_params.encode("utf-8"))
+            print("✅ Saved scaler parameters: scale_models/scaler_params.json")
+
+            from sklearn.preprocessing import StandardScaler
             
             # Create sklearn StandardScaler with same parameters
             sklearn_scaler = StandardScaler()
             sklearn_scaler.mean_ = mean_values
-            sklearn_scaler.scale_ = 1.0 / std_values  # sklearn uses scale (1/std)
+            # sklearn divides by scale_ (the std); zero-variance features keep scale 1 like sklearn
+            sklearn_scaler.scale_ = np.where(std_values == 0, 1.0, std_values)
             sklearn_scaler.var_ = std_values ** 2
             sklearn_scaler.n_features_in_ = len(mean_values)
             sklearn_scaler.feature_names_in_ = None  # Optional
             
             # Save sklearn-compatible scaler
             joblib.dump(sklearn_scaler, "sklearn_scaler.pkl")
+            if self.local:
+                os.makedirs(self._output_path("scale_models"), exist_ok=True)
+                joblib.dump(sklearn_scaler, self._output_path("scale_models/sklearn_scaler.pkl"))
+                print("✅ Saved sklearn-compatible scaler locally")
+                return
             boto3.client('s3').upload_file("sklearn_scaler.pkl", output_bucket, "scale_models/sklearn_scaler.pkl")
             print("✅ Saved sklearn-compatible scaler to S3")
             
@@ -193,10 +1209,10 @@ class FeatureEngineering:
         """Create and save product metadata."""
         try:
             print("🏭 Creating product metadata...")
-            products = self.products_df.join(self.aisles_df, "aisle_id") \
-                                      .join(self.departments_df, "department_id")                        
+            products = self.products_df.join(F.broadcast(self.aisles_df), "aisle_id") \
+                                      .join(F.broadcast(self.departments_df), "department_id")
             
-            self._save_to_dynamodb(products, "products")
+            self._publish_to_dynamodb(products, "products", ["product_id"])
             print("✅ Saved product metadata to DynamoDB: products")
             return products
         except Exception as e:
@@ -208,27 +1224,12 @@ class FeatureEngineering:
         try:
             print("🏭 Creating user features...")
             # User order patterns
-            user_features_1 = self.orders_prior_df.groupBy("user_id").agg(
-                F.max("order_number").alias("user_orders"),
-                F.sum("days_since_prior_order").alias("user_periods"),
-                F.mean("days_since_prior_order").alias("user_mean_days_since_prior")
-            )
-            
-            
+            user_features_1 = _aggregate(self.orders_prior_df, "user_id", USER_ORDER_AGGREGATES)
+
             # User product patterns
-            order_products_prior_flag = self.order_products_prior.withColumn(
-                "reordered_flag", when(col("reordered") == 1, 1).otherwise(0)
-            ).withColumn(
-                "repeat_order_flag", when(col("order_number") > 1, 1).otherwise(None)
-            )
-            
-            user_features_2 = order_products_prior_flag.groupBy("user_id").agg(
-                F.count("product_id").alias("user_products"),
-                F.countDistinct("product_id").alias("user_distinct_products"),
-                (F.sum("reordered_flag") / F.count("repeat_order_flag")).alias("user_reorder_ratio")
-            )
+            user_features_2 = _aggregate(self.order_products_prior, "user_id", USER_PRODUCT_AGGREGATES, USER_RATIOS)
 
-            user_features = user_features_1.join(user_features_2, "user_id")
+            user_features = user_features_1.join(user_features_2, "user_id").select("user_id", *USER_FEATURE_COLS)
 
             # self._save_parquet(user_features, "user_features")
             # print("✅ Saved user features to S3: user_features")
@@ -257,7 +1258,7 @@ class FeatureEngineering:
                 F.max("order_number").alias("up_last_order_number"),
                 F.avg("add_to_cart_order").alias("up_avg_cart_position")
             )
-            self._save_parquet(up_features, "up_features")
+            self._save_parquet(up_features, "up_features", bucket_by_user=True, sort_cols=["user_id", "product_id"])
             print("✅ Saved user-product interaction features to S3: up_features")
             return up_features
             
@@ -274,12 +1275,7 @@ class FeatureEngineering:
                 "product_seq_time", F.row_number().over(product_seq_window)
             )
             
-            prd_features = product_seq_df.groupBy("product_id").agg(
-                F.count("*").alias("prod_orders"),
-                F.sum(when(col("reordered") == 1, 1).otherwise(0)).alias("prod_reorders"),
-                F.sum(when(col("product_seq_time") == 1, 1).otherwise(0)).alias("prod_first_orders"),
-                F.sum(when(col("product_seq_time") == 2, 1).otherwise(0)).alias("prod_second_orders")
-            )
+            prd_features = _aggregate(product_seq_df, "product_id", PRODUCT_AGGREGATES)
             # self._save_parquet(prd_features, "prd_features")
             # print("✅ Saved product-level features to S3: prd_features")
             # self._save_to_dynamodb(prd_features, "product_features")
@@ -299,13 +1295,9 @@ class FeatureEngineering:
             train_labels = self.order_products_df.join(self.train_orders_df, "order_id") \
                                                .select("user_id", "product_id", "reordered")
             
-            train_df = train_labels.join(user_features, "user_id", "left") \
-                                     .join(prd_features, "product_id", "left") \
+            train_df = self._join_features(train_labels, user_features, prd_features, "create_training_data") \
                                      .fillna(0) \
-                                     .select('product_id', 'user_id', 'reordered', 'user_orders', 'user_periods',
-                                        'user_mean_days_since_prior', 'user_products', 'user_distinct_products',
-                                        'user_reorder_ratio', 'prod_orders', 'prod_reorders',
-                                        'prod_first_orders', 'prod_second_orders')
+                                     .select('product_id', 'user_id', 'reordered', *FEATURE_COLS)
 
             # self._save_parquet(train_df, "train")
             # print("✅ Saved training dataset to S3: train")
@@ -317,11 +1309,9 @@ class FeatureEngineering:
             # Save scaler_model in sklearn format to S3 
             self.save_scaler_parameters(scaler_model, self.output_bucket)
             
-            # Use label "reordered" and scaled features for training
-            train_df_scaled = train_df_scaled.select('reordered', 'user_orders_scaled', 'user_periods_scaled',
-                                        'user_mean_days_since_prior_scaled', 'user_products_scaled', 'user_distinct_products_scaled',
-                                        'user_reorder_ratio_scaled', 'prod_orders_scaled', 'prod_reorders_scaled',
-                                        'prod_first_orders_scaled', 'prod_second_orders_scaled')
+            # Label "reordered" and scaled features for training; user_id is kept so the
+            # training job can hold out whole users for validation (it is not a feature)
+            train_df_scaled = train_df_scaled.select(*output_columns("train_scaled"))
             
             self._save_parquet(train_df_scaled, "train_scaled")
             print("✅ Saved training dataset to S3: train_scaled")
@@ -341,24 +1331,17 @@ class FeatureEngineering:
             candidates = self.order_products_prior.select("user_id", "product_id").distinct()
             test_candidates = self.test_orders_df.join(candidates, "user_id")
             
-            test_features_df = test_candidates.join(user_features, "user_id", "left") \
-                                             .join(prd_features, "product_id", "left") \
+            test_features_df = self._join_features(test_candidates, user_features, prd_features, "create_test_data") \
                                              .fillna(0) \
-                                             .select('product_id', 'user_id', 'user_orders', 'user_periods',
-                                        'user_mean_days_since_prior', 'user_products', 'user_distinct_products',
-                                        'user_reorder_ratio', 'prod_orders', 'prod_reorders',
-                                        'prod_first_orders', 'prod_second_orders')
+                                             .select('product_id', 'user_id', *FEATURE_COLS)
             # Use scaler from train
             id_cols = ['product_id', 'user_id']
 
             
             test_df_scaled = self._transform_standard_scaler(test_features_df, id_cols, self._scaler_model)
-            test_df_scaled = test_df_scaled.select('user_orders_scaled', 'user_periods_scaled',
-                                        'user_mean_days_since_prior_scaled', 'user_products_scaled', 'user_distinct_products_scaled',
-                                        'user_reorder_ratio_scaled', 'prod_orders_scaled', 'prod_reorders_scaled',
-                                        'prod_first_orders_scaled', 'prod_second_orders_scaled')
+            test_df_scaled = test_df_scaled.select(*SCALED_FEATURE_COLS)
 
-            self._save_parquet(test_features_df, "test")
+            self._save_parquet(test_features_df, "test", bucket_by_user=True, sort_cols=["user_id", "product_id"])
             print("✅ Saved test dataset to S3: test")
             self._save_parquet(test_df_scaled, "test_scaled")
             print("✅ Saved test dataset to S3: test_scaled")
@@ -367,6 +1350,155 @@ class FeatureEngineering:
             print(f"❌ Error creating test dataset: {e}")
             raise
 
+    def _published_product_features(self, rows, prod_cols):
+        """
+        prod_* features of collected rows as a float32 matrix in the format published to
+        user_product_features, so serving can score products a user has never bought.
+        """
+        import numpy as np
+        values = np.array([[row[c] for c in prod_cols] for row in rows], dtype=np.float64).reshape(-1, len(prod_cols))
+        if self.dynamodb_feature_format != "raw":
+            # Same transform as the prod_*_scaled columns (the last four scaler inputs)
+            mean = self._scaler_model.mean.toArray()[-len(prod_cols):]
+            std = self._scaler_model.std.toArray()[-len(prod_cols):]
+            values = np.where(std > 0, (values - mean) / np.where(std > 0, std, 1.0), 0.0)
+        return values.astype(np.float32)
+
+    def create_product_embeddings(self, prd_features):
+        """
+        Learn product embeddings from order co-occurrence (Word2Vec over baskets) and
+        publish an IVF nearest-neighbour index for candidate expansion. The index also
+        carries each product's prod_* features, in the format of user_product_features,
+        so the Lambda can score products a user has never bought.
+        """
+        try:
+            import numpy as np
+            print("🧭 Learning product embeddings...")
+            # Every product in a basket is context for every other; huge baskets are sampled down
+            baskets = self.order_products_prior.groupBy("order_id") \
+                                               .agg(F.collect_list(col("product_id").cast("string")).alias("items")) \
+                                               .filter(F.size("items") >= 2) \
+                                               .withColumn("items", F.slice(F.shuffle("items"), 1, self.embedding_max_basket))
+            word2vec = Word2Vec(vectorSize=self.embedding_dim, windowSize=self.embedding_max_basket,
+                                minCount=self.embedding_min_count, seed=42,
+                                inputCol="items", outputCol="basket_vector")
+            embeddings = word2vec.fit(baskets).getVectors() \
+                                 .select(col("word").cast("int").alias("product_id"), "vector")
+            embeddings = Normalizer(inputCol="vector", outputCol="embedding", p=2.0).transform(embeddings) \
+                                   .select("product_id", "embedding").persist()
+            n_products = embeddings.count()
+
+            # Coarse quantizer: ~20+ products per inverted list
+            nlist = max(1, min(self.ann_lists, n_products // 20))
+            kmeans_model = KMeans(k=nlist, seed=42, maxIter=20, distanceMeasure="cosine",
+                                  featuresCol="embedding", predictionCol="list_id").fit(embeddings)
+            prod_cols = PRODUCT_FEATURE_COLS
+            indexed = kmeans_model.transform(embeddings) \
+                                  .join(prd_features.select("product_id", *prod_cols), "product_id", "left") \
+                                  .fillna(0, subset=prod_cols) \
+                                  .select("product_id", "list_id", vector_to_array("embedding").alias("embedding"),
+                                          *prod_cols)
+            self._save_parquet(indexed, "product_embeddings")
+            rows = indexed.orderBy("list_id", "product_id").collect()
+            embeddings.unpersist()
+
+            product_features = self._published_product_features(rows, prod_cols)
+            centroids = np.array(kmeans_model.clusterCenters(), dtype=np.float32)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            list_ids = np.array([row.list_id for row in rows], dtype=np.int64)
+
+            buffer = io.BytesIO()
+            np.savez(buffer,
+                     product_ids=np.array([row.product_id for row in rows], dtype=np.int64),
+                     vectors=np.array([row.embedding for row in rows], dtype=np.float32),
+                     centroids=centroids,
+                     offsets=np.concatenate([[0], np.cumsum(np.bincount(list_ids, minlength=nlist))]),
+                     product_features=product_features,
+                     feature_format=np.array(self.dynamodb_feature_format))
+            for key in (f"embeddings/product_ivf/{self.run_id}.npz", "embeddings/product_ivf/latest.npz"):
+                self._put_bytes(key, buffer.getvalue())
+            print(f"✅ Saved IVF index of {n_products} products in {nlist} lists: embeddings/product_ivf/latest.npz")
+        except Exception as e:
+            print(f"❌ Error creating product embeddings: {e}")
+            raise
+
+    def create_product_cooccurrence(self, prd_features):
+        """
+        Count how often product pairs are bought together and keep the top-k neighbours
+        of each product. Pairs are generated inside each basket rather than by a self-join
+        on order_id, so the shuffle is bounded by:
+
+        - cooc_max_basket: larger baskets are sampled down, capping pairs per order
+        - cooc_min_product_orders: rare products are dropped before pairing
+        - cooc_min_count: pairs bought together fewer times are pruned after counting
+        - cooc_top_k: neighbours kept per product, ranked by cosine similarity
+          pair_orders / sqrt(orders_a * orders_b) so best sellers don't dominate
+        """
+        try:
+            import numpy as np
+            print("🔗 Counting product co-occurrence...")
+            baskets = self.order_products_prior.select("order_id", "product_id").distinct()
+            product_orders = baskets.groupBy("product_id").agg(F.count("*").alias("orders")) \
+                                    .filter(col("orders") >= self.cooc_min_product_orders)
+            # Sorted baskets so each unordered pair is emitted once, as (a < b)
+            baskets = baskets.join(F.broadcast(product_orders.select("product_id")), "product_id") \
+                             .groupBy("order_id") \
+                             .agg(F.collect_list("product_id").alias("items")) \
+                             .filter(F.size("items") >= 2) \
+                             .withColumn("items", F.array_sort(F.slice(F.shuffle("items"), 1, self.cooc_max_basket)))
+            pairs = baskets.select(F.explode(F.expr(
+                "flatten(transform(items, (a, i) -> transform(slice(items, i + 2, size(items)), "
+                "b -> named_struct('a', a, 'b', b))))")).alias("pair"))
+            pair_counts = pairs.groupBy(col("pair.a").alias("product_a"), col("pair.b").alias("product_b")) \
+                               .agg(F.count("*").alias("pair_orders")) \
+                               .filter(col("pair_orders") >= self.cooc_min_count)
+
+            # Both directions, scored and cut to the top k per product
+            directed = pair_counts.select(col("product_a").alias("product_id"), col("product_b").alias("neighbor_id"),
+                                          "pair_orders") \
+                                  .unionByName(pair_counts.select(col("product_b").alias("product_id"),
+                                                                  col("product_a").alias("neighbor_id"),
+                                                                  "pair_orders"))
+            orders_a = product_orders.select("product_id", col("orders").alias("orders_a"))
+            orders_b = product_orders.select(col("product_id").alias("neighbor_id"), col("orders").alias("orders_b"))
+            rank_window = Window.partitionBy("product_id").orderBy(col("score").desc(), col("neighbor_id"))
+            neighbors = directed.join(F.broadcast(orders_a), "product_id") \
+                                .join(F.broadcast(orders_b), "neighbor_id") \
+                                .withColumn("score", col("pair_orders") / F.sqrt(col("orders_a") * col("orders_b"))) \
+                                .withColumn("rank", F.row_number().over(rank_window)) \
+                                .filter(col("rank") <= self.cooc_top_k) \
+                                .select("product_id", "neighbor_id", "rank", "pair_orders",
+                                        col("score").cast("float").alias("score")) \
+                                .persist()
+            self._save_parquet(neighbors, "product_cooccurrence", sort_cols=["product_id", "rank"])
+
+            # Compact CSR lists for serving: neighbours of row i are neighbors[offsets[i]:offsets[i + 1]]
+            prod_cols = PRODUCT_FEATURE_COLS
+            edges = neighbors.select("product_id", "neighbor_id", "score").orderBy("product_id", "rank").collect()
+            products = neighbors.select("product_id").union(neighbors.select("neighbor_id")).distinct() \
+                                .join(prd_features.select("product_id", *prod_cols), "product_id", "left") \
+                                .fillna(0, subset=prod_cols) \
+                                .orderBy("product_id").collect()
+            neighbors.unpersist()
+            product_ids = np.array([row.product_id for row in products], dtype=np.int64)
+            sources = np.searchsorted(product_ids, np.array([row.product_id for row in edges], dtype=np.int64))
+            buffer = io.BytesIO()
+            np.savez(buffer,
+                     product_ids=product_ids,
+                     offsets=np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(product_ids)))]),
+                     neighbors=np.searchsorted(product_ids, np.array([row.neighbor_id for row in edges],
+                                                                     dtype=np.int64)).astype(np.int32),
+                     scores=np.array([row.score for row in edges], dtype=np.float32),
+                     product_features=self._published_product_features(products, prod_cols),
+                     feature_format=np.array(self.dynamodb_feature_format))
+            for key in (f"cooccurrence/product_neighbors/{self.run_id}.npz", "cooccurrence/product_neighbors/latest.npz"):
+                self._put_bytes(key, buffer.getvalue())
+            print(f"✅ Saved {len(edges)} neighbour links for {len(product_ids)} products: "
+                  f"cooccurrence/product_neighbors/latest.npz ({len(buffer.getvalue()) / 1024:.0f} KB)")
+        except Exception as e:
+            print(f"❌ Error creating product co-occurrence: {e}")
+            raise
+
     def prepare_dynamodb_feature_table(self, user_features, prd_features):
         """Join user-product pairs with features and store in DynamoDB for real-time inference."""
         try:
@@ -374,27 +1506,32 @@ class FeatureEngineering:
             user_product_df = self.order_products_prior.select("user_id", "product_id").distinct()
 
             # Join features
-            feature_df = user_product_df.join(user_features, on="user_id", how="left") \
-                                        .join(prd_features, on="product_id", how="left") \
+            feature_df = self._join_features(user_product_df, user_features, prd_features,
+                                             "prepare_dynamodb_feature_table") \
                                         .fillna(0) \
-                                        .select('product_id', 'user_id', 'user_orders', 'user_periods',
-                                            'user_mean_days_since_prior', 'user_products', 'user_distinct_products',
-                                            'user_reorder_ratio', 'prod_orders', 'prod_reorders',
-                                            'prod_first_orders', 'prod_second_orders')
-
-            # Use the scaler fitted on training data
-            id_cols = ['user_id', 'product_id']
-            feature_df_scaled = self._transform_standard_scaler(feature_df, id_cols, self._scaler_model)
-            feature_df_scaled = feature_df_scaled.select("user_id", "product_id", 'user_orders_scaled', 'user_periods_scaled',
-                                        'user_mean_days_since_prior_scaled', 'user_products_scaled', 'user_distinct_products_scaled',
-                                        'user_reorder_ratio_scaled', 'prod_orders_scaled', 'prod_reorders_scaled',
-                                        'prod_first_orders_scaled', 'prod_second_orders_scaled')
-            
-            # self._save_parquet(feature_df_scaled, "user_product_features")
-            # print("✅ Saved prior features to S3: user_product_features")
+                                        .select('product_id', 'user_id', *FEATURE_COLS)
+
+            if self.dynamodb_feature_format == "raw":
+                # Raw counts only change with the user's orders, not with every scaler refit;
+                # the Lambda applies scale_models/scaler_params.json at serve time
+                published_df = feature_df
+            else:
+                # Use the scaler fitted on training data
+                id_cols = ['user_id', 'product_id']
+                published_df = self._transform_standard_scaler(feature_df, id_cols, self._scaler_model)
+            published_df = published_df.select(*output_columns("user_product_features", self.dynamodb_feature_format))
 
-            # Save to DynamoDB (limit for budget )
-            self._save_to_dynamodb(feature_df_scaled.filter(col("user_id") < 5000), "user_product_features")
+            self._save_parquet(published_df, "user_product_features", bucket_by_user=True,
+                               sort_cols=["user_id", "product_id"])
+            print("✅ Saved prior features to S3: user_product_features")
+
+            # Incremental mode only writes changed rows and import mode writes no items,
+            # so every user fits in budget; writing every row item by item (full mode, or
+            # a fresh versioned table) stays limited for budget
+            if self.dynamodb_write_mode == "full" or \
+                    (self.dynamodb_versioning and self.dynamodb_write_mode == "incremental"):
+                published_df = published_df.filter(col("user_id") < 5000)
+            self._publish_to_dynamodb(published_df, "user_product_features", ["user_id", "product_id"])
             print("✅ Saved prior user-product feature table to DynamoDB: user_product_features")
 
             return feature_df
@@ -407,26 +1544,80 @@ class FeatureEngineering:
         try:
             print("🎯 Starting feature engineering pipeline...")
             
-            self.load_data()
+            profiler = None
+            if self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate:
+                print("📈 Profiling this run")
+                profiler = PipelineProfiler(self._write_profile)
+                profiler.start()
+
+            # Stages declare their inputs; independent ones are submitted concurrently
+            scheduler = StageScheduler(self.spark, max_workers=self.max_concurrent_stages, profiler=profiler)
+            if self.source_format == "parquet":
+                scheduler.add("convert_source_tables", lambda r: self.convert_source_tables())
+                scheduler.add("load_data", lambda r: self.load_data(), deps=["convert_source_tables"])
+            else:
+                scheduler.add("load_data", lambda r: self.load_data())
 
             # self._save_parquet(self.order_products_prior, "order_products_prior")
-            
-            print("🏭 Creating features...")
+
             # Create features
-            # self.create_product_metadata()
-            user_features = self.create_user_features()
-            # self.create_user_product_features()
-            prd_features = self.create_product_features()
-            
-            print("📊 Creating datasets...")
+            # scheduler.add("create_product_metadata", lambda r: self.create_product_metadata(), deps=["load_data"])
+            scheduler.add("create_user_features", lambda r: self.create_user_features(),
+                          deps=["load_data"], materialize=True)
+            # scheduler.add("create_user_product_features", lambda r: self.create_user_product_features(), deps=["load_data"])
+            scheduler.add("create_product_features", lambda r: self.create_product_features(),
+                          deps=["load_data"], materialize=True)
+
             # Create datasets
-            self.create_training_data(user_features, prd_features)
-            # self.create_test_data(user_features, prd_features)
+            scheduler.add("create_training_data",
+                          lambda r: self.create_training_data(r["create_user_features"], r["create_product_features"]),
+                          deps=["create_user_features", "create_product_features"])
+            # scheduler.add("create_test_data",
+            #               lambda r: self.create_test_data(r["create_user_features"], r["create_product_features"]),
+            #               deps=["create_user_features", "create_product_features", "create_training_data"])
 
+            if self.build_embeddings:
+                scheduler.add("create_product_embeddings",
+                              lambda r: self.create_product_embeddings(r["create_product_features"]),
+                              deps=["create_product_features", "create_training_data"])
 
-            print("️ Creating DynamoDB lookup table...")
-            # Create real-time lookup table in DynamoDB
-            self.prepare_dynamodb_feature_table(user_features, prd_features)
+            if self.build_cooccurrence:
+                scheduler.add("create_product_cooccurrence",
+                              lambda r: self.create_product_cooccurrence(r["create_product_features"]),
+                              deps=["create_product_features", "create_training_data"])
+
+            # Create real-time lookup table in DynamoDB (uses the scaler fitted on training data)
+            scheduler.add("prepare_dynamodb_feature_table",
+                          lambda r: self.prepare_dynamodb_feature_table(r["create_user_features"],
+                                                                        r["create_product_features"]),
+                          deps=["create_user_features", "create_product_features", "create_training_data"])
+
+            print("🏭 Running pipeline stages...")
+            try:
+                scheduler.run()
+            finally:
+                if profiler is not None:
+                    profiler.stop()
+            self.stage_timeline = scheduler.timeline
+
+            scheduler.print_timeline()
+            path, seconds = scheduler.critical_path()
+            print(f"⏱️ Critical path ({seconds:.1f}s): {' -> '.join(path)}")
+            self._write_report("timeline", {"stages": scheduler.timeline,
+                                            "critical_path": path, "critical_path_s": seconds})
+            self._write_report("joins", self.join_report)
+            if self.measure_loads:
+                self._write_load_report()
+            if self.collect_spark_metrics:
+                metrics = SparkMetricsCollector(self.spark).collect(scheduler.timeline)
+                if metrics is not None:
+                    SparkMetricsCollector.print_summary(metrics)
+                    self._write_report("spark_metrics", {"run_id": self.run_id,
+                                                         "job_run_id": _job_arg('JOB_RUN_ID', self.run_id),
+                                                         "spark_version": self.spark.version, **metrics})
+
+            if self.published_versions:
+                self._cutover_versions()
 
             print("🎉 Feature engineering pipeline completed successfully!")
             
@@ -436,7 +1627,8 @@ class FeatureEngineering:
 
 if __name__ == "__main__":
     try:
-        pipeline = FeatureEngineering()
+        # --data_dir/--output_dir run the job on local files (e.g. from other_scripts/local_pipeline.py)
+        pipeline = FeatureEngineering(data_dir=_job_arg('data_dir'), output_dir=_job_arg('output_dir'))
         pipeline.run_pipeline()
     except Exception as e:
         print(f"❌ Job failed: {e}")
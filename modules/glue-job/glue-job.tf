@@ -102,6 +102,51 @@ resource "aws_iam_role_policy" "glue_dynamodb_policy" {
           var.product_features_table_arn,
           var.user_features_table_arn
         ]
+      },
+      {
+        # Bulk loads via import-from-S3 and blue/green versions live in new <table>-<run_id> tables
+        Effect = "Allow"
+        Action = [
+          "dynamodb:ImportTable",
+          "dynamodb:DescribeImport",
+          "dynamodb:CreateTable",
+          "dynamodb:DeleteTable",
+          "dynamodb:DescribeTable",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:BatchGetItem"
+        ]
+        Resource = [
+          "${var.products_table_arn}-*",
+          "${var.user_product_features_table_arn}-*",
+          "${var.product_features_table_arn}-*",
+          "${var.user_features_table_arn}-*"
+        ]
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["dynamodb:ListTables"]
+        Resource = "*"
+      },
+      {
+        # Pointer item naming the live version of each feature table
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ]
+        Resource = var.table_versions_table_arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:DescribeLogGroups",
+          "logs:DescribeLogStreams",
+          "logs:PutLogEvents",
+          "logs:PutRetentionPolicy"
+        ]
+        Resource = "arn:aws:logs:*:*:log-group:/aws-dynamodb/*"
       }
     ]
   })
@@ -152,6 +197,16 @@ resource "aws_s3_object" "glue_script" {
   depends_on = [var.glue_script_bucket_arn]
 }
 
+# Feature specs shared by features.py and local_features.py, imported by the job
+resource "aws_s3_object" "feature_definitions" {
+  bucket = var.scripts_bucket_name
+  key    = "feature_definitions.py"
+  source = "${path.module}/feature_definitions.py"
+  etag   = filemd5("${path.module}/feature_definitions.py")
+
+  depends_on = [var.glue_script_bucket_arn]
+}
+
 # Upload the wheel to S3
 resource "aws_s3_object" "joblib_wheel" {
   bucket = var.scripts_bucket_name
@@ -196,7 +251,34 @@ resource "aws_glue_job" "feature_engineering" {
     "--job-bookmark-option"              = "job-bookmark-enable"
     "--enable-continuous-cloudwatch-log" = "true"
     "--enable-metrics"                   = "true"
+    "--dynamodb_write_mode"              = var.dynamodb_write_mode
+    "--dynamodb_max_write_rate"          = tostring(var.dynamodb_max_write_rate)
+    "--dynamodb_write_parallelism"       = tostring(var.dynamodb_write_parallelism)
+    "--dynamodb_import_start"            = tostring(var.dynamodb_import_start)
+    "--dynamodb_versioning"              = tostring(var.dynamodb_versioning)
+    "--dynamodb_version_table"           = var.table_versions_table_name
+    "--dynamodb_keep_versions"           = tostring(var.dynamodb_keep_versions)
+    "--skew_factor"                      = tostring(var.skew_factor)
+    "--skew_salt_buckets"                = tostring(var.skew_salt_buckets)
+    "--join_benchmark"                   = tostring(var.join_benchmark)
+    "--parquet_user_buckets"             = tostring(var.parquet_user_buckets)
+    "--parquet_target_file_mb"           = tostring(var.parquet_target_file_mb)
+    "--parquet_row_group_mb"             = tostring(var.parquet_row_group_mb)
+    "--max_concurrent_stages"            = tostring(var.max_concurrent_stages)
+    "--profile_sample_rate"              = tostring(var.profile_sample_rate)
+    "--collect_spark_metrics"            = tostring(var.collect_spark_metrics)
+    "--dynamodb_feature_format"          = var.dynamodb_feature_format
+    "--source_format"                    = var.source_format
+    "--measure_loads"                    = tostring(var.measure_source_loads)
+    "--build_embeddings"                 = tostring(var.build_product_embeddings)
+    "--embedding_dim"                    = tostring(var.embedding_dim)
+    "--ann_lists"                        = tostring(var.ann_lists)
+    "--build_cooccurrence"               = tostring(var.build_product_cooccurrence)
+    "--cooc_min_count"                   = tostring(var.cooccurrence_min_count)
+    "--cooc_top_k"                       = tostring(var.cooccurrence_top_k)
+    "--conf"                             = "spark.scheduler.mode=FAIR"
     "--extra-py-files" = join(",", [
+      "s3://${aws_s3_object.feature_definitions.bucket}/${aws_s3_object.feature_definitions.key}",
       "s3://${aws_s3_object.joblib_wheel.bucket}/${aws_s3_object.joblib_wheel.key}",
       "s3://${aws_s3_object.sklearn_wheel.bucket}/${aws_s3_object.sklearn_wheel.key}"
     ])
@@ -0,0 +1,303 @@
+"""
+Single-node backend for the feature engineering job.
+
+Builds the features from the same specs as FeatureEngineering in features.py
+(feature_definitions.py: source schemas, flags, aggregates, output columns),
+but in-process on pandas instead of Glue/Spark. Source tables are read from a
+local directory of CSV or Parquet files named after the Glue Catalog tables
+(products.csv, orders.parquet, order_products__prior/, ...), and outputs are
+written under <output_dir>/features/ like the Spark backend.
+
+Spark-only execution strategies (broadcast and salted skew joins, user_bucket
+partitioning, DynamoDB publishing) have nothing to do in a single process and
+do not change the values, so they are not mirrored.
+
+Usage:
+    python local_features.py --data_dir ./data --output_dir ./features_local
+    python local_features.py --compare ./features_spark/features ./features_local/features
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_definitions import (
+    FEATURE_COLS, FLAGS, LABEL_COL, ORDER_COLUMNS, ORDER_FILLS, ORDER_PRODUCT_COLUMNS, PRODUCT_AGGREGATES,
+    REORDERED_VALUES, SOURCE_RENAMES, SOURCE_SCHEMAS, USER_FEATURE_COLS, USER_ORDER_AGGREGATES,
+    USER_PRODUCT_AGGREGATES, USER_RATIOS, output_columns,
+)
+
+# pandas translations of the comparisons, aggregate functions and source types in feature_definitions
+PANDAS_COMPARISONS = {"==": lambda s, v: s == v, ">": lambda s, v: s > v}
+PANDAS_AGGREGATES = {"max": "max", "sum": "sum", "mean": "mean", "count": "count", "count_distinct": "nunique"}
+PANDAS_TYPES = {"int": "Int32", "double": "float64", "string": "string"}
+
+
+def _with_flags(df, aggregates):
+    """Add the FLAGS columns the aggregates read: 1 where the comparison holds, else 0."""
+    df = df.copy()
+    for _, _, column in aggregates:
+        if column in FLAGS:
+            source, op, value = FLAGS[column]
+            holds = PANDAS_COMPARISONS[op](df[source], value)
+            df[column] = holds.astype("boolean").fillna(False).astype(np.int64)
+    return df
+
+
+def _aggregate(df, key, aggregates, ratios=None):
+    """Group by key and compute the aggregate specs (and ratios of them) from feature_definitions."""
+    out = _with_flags(df, aggregates).groupby(key).agg(
+        **{name: (column, PANDAS_AGGREGATES[fn]) for name, fn, column in aggregates}).reset_index()
+    for name, (numerator, denominator) in (ratios or {}).items():
+        out[name] = out[numerator].astype(np.float64) / out[denominator].where(out[denominator] != 0)
+    return out
+
+
+class LocalStandardScaler:
+    """Mirror of pyspark.ml StandardScaler(withMean=True, withStd=True)."""
+
+    def fit(self, df, feature_cols):
+        values = df[feature_cols].to_numpy(dtype=np.float64)
+        self.feature_cols = feature_cols
+        self.mean = values.mean(axis=0)
+        # Spark uses the unbiased (n - 1) standard deviation
+        self.std = values.std(axis=0, ddof=1) if len(values) > 1 else np.zeros(len(feature_cols))
+        return self
+
+    def transform(self, df, id_cols):
+        values = df[self.feature_cols].to_numpy(dtype=np.float64)
+        # Spark emits 0.0 for zero-variance features instead of dividing by zero
+        inv_std = np.divide(1.0, self.std, out=np.zeros_like(self.std), where=self.std != 0)
+        scaled = (values - self.mean) * inv_std
+        out = df[id_cols].reset_index(drop=True).copy()
+        for i, col_name in enumerate(self.feature_cols):
+            out[col_name + "_scaled"] = scaled[:, i]
+        return out
+
+
+class LocalFeatureEngineering:
+    def __init__(self, data_dir, output_dir, feature_format="scaled"):
+        """Initialize the local backend with input and output directories."""
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        # Same meaning as features.py --dynamodb_feature_format
+        self.feature_format = feature_format
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"✅ Local backend initialized. Data: {self.data_dir}, Output: {self.output_dir}")
+
+    def load_data(self):
+        """Load the columns and rows the features need from each source table."""
+        try:
+            print("📊 Loading data from local files...")
+            orders = self._load_table('orders')
+            self.orders_prior_df = self._order_set(orders, "prior").fillna(ORDER_FILLS)
+            self.train_orders_df = self._order_set(orders, "train")
+            self.test_orders_df = self._order_set(orders, "test")
+
+            self.order_products_df = pd.concat([self._load_table('order_products__prior', ORDER_PRODUCT_COLUMNS),
+                                                self._load_table('order_products__train', ORDER_PRODUCT_COLUMNS)],
+                                               ignore_index=True)
+            print(f"✅ Loaded order_products: {len(self.order_products_df)} rows")
+
+            # Join orders with products
+            self.order_products_prior = self.orders_prior_df.merge(self.order_products_df, on="order_id")[
+                ["user_id", "order_id", "order_number", "days_since_prior_order", "product_id",
+                 "add_to_cart_order", "reordered"]
+            ]
+            print(f"✅ Created order_products_prior: {len(self.order_products_prior)} rows")
+        except Exception as e:
+            print(f"❌ Error loading data: {e}")
+            raise
+
+    @staticmethod
+    def _order_set(orders, eval_set):
+        return orders.loc[orders["eval_set"] == eval_set, ORDER_COLUMNS[eval_set]].reset_index(drop=True)
+
+    def _read_raw_table(self, table):
+        """Read a table from CSV or Parquet (file or directory of shards)."""
+        base = os.path.join(self.data_dir, table)
+        if os.path.exists(base + ".parquet"):
+            return pd.read_parquet(base + ".parquet")
+        if os.path.exists(base + ".csv"):
+            return pd.read_csv(base + ".csv")
+        if glob.glob(os.path.join(base, "*.parquet")):
+            return pd.read_parquet(base)
+        shards = sorted(glob.glob(os.path.join(base, "*.csv")))
+        if shards:
+            return pd.concat([pd.read_csv(p) for p in shards], ignore_index=True)
+        raise FileNotFoundError(f"No CSV or Parquet data found for {table} in {self.data_dir}")
+
+    def _typed_source(self, table, df):
+        """Cast a raw source table to SOURCE_SCHEMAS, normalizing crawler column names and string flags."""
+        df = df.rename(columns=SOURCE_RENAMES)
+        typed = {}
+        for name, dtype in SOURCE_SCHEMAS[table].items():
+            if name == "reordered":
+                typed[name] = df[name].astype("string").str.lower().map(REORDERED_VALUES).astype("Int32")
+            else:
+                typed[name] = df[name].astype(PANDAS_TYPES[dtype])
+        return pd.DataFrame(typed)
+
+    def _load_table(self, table, columns=None):
+        """Load a typed source table, keeping only the given columns."""
+        try:
+            print(f"📖 Loading table: {table}")
+            df = self._typed_source(table, self._read_raw_table(table))
+            if columns:
+                df = df[columns]
+            print(f"✅ Successfully loaded {table}: {len(df)} rows")
+            return df
+        except Exception as e:
+            print(f"❌ Error loading table {table}: {e}")
+            raise
+
+    def _save_parquet(self, df, path_suffix):
+        """Save DataFrame as Parquet under <output_dir>/features/, like the Spark backend."""
+        path = os.path.join(self.output_dir, "features", path_suffix)
+        os.makedirs(path, exist_ok=True)
+        print(f"💾 Saving Parquet: {path}")
+        df.to_parquet(os.path.join(path, "part-00000.parquet"), index=False)
+        print(f"✅ Saved Parquet: {path}")
+
+    def create_user_features(self):
+        """Create user-level features."""
+        try:
+            print("🏭 Creating user features...")
+            user_features_1 = _aggregate(self.orders_prior_df, "user_id", USER_ORDER_AGGREGATES)
+            user_features_2 = _aggregate(self.order_products_prior, "user_id", USER_PRODUCT_AGGREGATES, USER_RATIOS)
+            return user_features_1.merge(user_features_2, on="user_id")[["user_id"] + USER_FEATURE_COLS]
+        except Exception as e:
+            print(f"❌ Error creating user features: {e}")
+            raise
+
+    def create_product_features(self):
+        """Create product-level features."""
+        try:
+            print("🏭 Creating product-level features...")
+            opp = self.order_products_prior.sort_values(["user_id", "product_id", "order_number"], kind="stable")
+            opp = opp.assign(product_seq_time=opp.groupby(["user_id", "product_id"]).cumcount() + 1)
+            return _aggregate(opp, "product_id", PRODUCT_AGGREGATES)
+        except Exception as e:
+            print(f"❌ Error creating product-level features: {e}")
+            raise
+
+    def _join_features(self, pairs, user_features, prd_features):
+        """Left-join user and product features onto pairs and fill gaps with 0, like Spark's fillna(0)."""
+        df = pairs.merge(user_features, on="user_id", how="left") \
+                  .merge(prd_features, on="product_id", how="left")
+        df[FEATURE_COLS] = df[FEATURE_COLS].astype(np.float64).fillna(0)
+        return df
+
+    def create_training_data(self, user_features, prd_features):
+        """Create and save the scaled training dataset."""
+        try:
+            print("📊 Creating training dataset...")
+            train_labels = self.order_products_df.merge(self.train_orders_df, on="order_id")[
+                ["user_id", "product_id", LABEL_COL]
+            ]
+            train_df = self._join_features(train_labels, user_features, prd_features)
+            train_df[LABEL_COL] = train_df[LABEL_COL].fillna(0).astype(np.int64)
+            train_df = train_df[['product_id', 'user_id', LABEL_COL] + FEATURE_COLS]
+
+            self._scaler = LocalStandardScaler().fit(train_df, FEATURE_COLS)
+            train_df_scaled = self._scaler.transform(train_df, ['product_id', 'user_id', LABEL_COL])
+            self._save_parquet(train_df_scaled[output_columns("train_scaled")], "train_scaled")
+            print("✅ Saved training dataset: train_scaled")
+            return train_df
+        except Exception as e:
+            print(f"❌ Error creating training dataset: {e}")
+            raise
+
+    def prepare_dynamodb_feature_table(self, user_features, prd_features):
+        """Build the user-product lookup table (saved as Parquet instead of DynamoDB)."""
+        try:
+            print("️ Creating user-product lookup table...")
+            user_product_df = self.order_products_prior[["user_id", "product_id"]].drop_duplicates()
+            feature_df = self._join_features(user_product_df, user_features, prd_features)
+            feature_df = feature_df[['product_id', 'user_id'] + FEATURE_COLS]
+            if self.feature_format == "raw":
+                published_df = feature_df
+            else:
+                published_df = self._scaler.transform(feature_df, ['user_id', 'product_id'])
+            self._save_parquet(published_df[output_columns("user_product_features", self.feature_format)],
+                               "user_product_features")
+            print("✅ Saved user-product feature table: user_product_features")
+            return feature_df
+        except Exception as e:
+            print(f"❌ Error preparing user-product lookup table: {e}")
+            raise
+
+    def run_pipeline(self):
+        """Execute the full feature engineering pipeline and return per-stage timings."""
+        timings = {}
+
+        def timed(name, fn, *args):
+            start = time.perf_counter()
+            result = fn(*args)
+            timings[name] = time.perf_counter() - start
+            print(f"⏱️ {name}: {timings[name]:.2f}s")
+            return result
+
+        print("🎯 Starting local feature engineering pipeline...")
+        timed("load_data", self.load_data)
+        user_features = timed("create_user_features", self.create_user_features)
+        prd_features = timed("create_product_features", self.create_product_features)
+        timed("create_training_data", self.create_training_data, user_features, prd_features)
+        timed("prepare_dynamodb_feature_table", self.prepare_dynamodb_feature_table, user_features, prd_features)
+        print("🎉 Local feature engineering pipeline completed successfully!")
+        return timings
+
+
+def compare_outputs(left_dir, right_dir, datasets=("train_scaled", "user_product_features"), feature_format="scaled",
+                    rtol=1e-9, atol=1e-12):
+    """
+    Compare the datasets two backends wrote under their features/ directories.
+    Only the columns output_columns() defines are read, so partition columns
+    (user_bucket) and extra columns are ignored. Rows are sorted on every
+    column since Spark does not guarantee output order; values are compared
+    with a tight tolerance to absorb summation-order differences.
+    """
+    ok = True
+    for name in datasets:
+        cols = output_columns(name, feature_format)
+        try:
+            left = pd.read_parquet(os.path.join(left_dir, name), columns=cols)
+            right = pd.read_parquet(os.path.join(right_dir, name), columns=cols)
+        except Exception as e:
+            print(f"❌ {name}: cannot read columns {cols}: {e}")
+            ok = False
+            continue
+        if len(left) != len(right):
+            print(f"❌ {name}: row count differs ({len(left)} vs {len(right)})")
+            ok = False
+            continue
+        left = left.astype(np.float64).sort_values(cols).to_numpy()
+        right = right.astype(np.float64).sort_values(cols).to_numpy()
+        if np.allclose(left, right, rtol=rtol, atol=atol, equal_nan=True):
+            print(f"✅ {name}: {len(left)} rows match")
+        else:
+            print(f"❌ {name}: values differ")
+            ok = False
+    return ok
+
+
+def parse_args():
+    # Flag names follow features.py's job arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', type=str, default='./data')
+    parser.add_argument('--output_dir', type=str, default='./features_local')
+    parser.add_argument('--dynamodb_feature_format', type=str, default='scaled', choices=['scaled', 'raw'])
+    parser.add_argument('--compare', nargs=2, metavar=('LEFT_FEATURES_DIR', 'RIGHT_FEATURES_DIR'))
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare:
+        sys.exit(0 if compare_outputs(*args.compare, feature_format=args.dynamodb_feature_format) else 1)
+    LocalFeatureEngineering(args.data_dir, args.output_dir, args.dynamodb_feature_format).run_pipeline()
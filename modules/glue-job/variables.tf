@@ -108,6 +108,17 @@ variable "user_features_table_arn" {
   type        = string
 }
 
+variable "table_versions_table_name" {
+  description = "Name of the DynamoDB table holding the live feature table versions"
+  type        = string
+  default     = "table_versions"
+}
+
+variable "table_versions_table_arn" {
+  description = "ARN of the table_versions DynamoDB table"
+  type        = string
+}
+
 variable "private_subnet_ids" {
   description = "The IDs of the private subnets"
   type        = list(string)
@@ -122,3 +133,162 @@ variable "sklearn_wheel_filename" {
   description = "The filename of the scikit-learn wheel"
   type        = string
 }
+
+variable "dynamodb_write_mode" {
+  description = "DynamoDB write mode: incremental (changed rows only), full (rewrite every row) or import (export for import-from-S3)"
+  type        = string
+  default     = "incremental"
+
+  validation {
+    condition     = contains(["incremental", "full", "import"], var.dynamodb_write_mode)
+    error_message = "dynamodb_write_mode must be incremental, full or import."
+  }
+}
+
+variable "dynamodb_import_start" {
+  description = "In import mode, also start DynamoDB import-from-S3 into a new <table>-<run_id> table"
+  type        = bool
+  default     = false
+}
+
+variable "dynamodb_versioning" {
+  description = "Publish each run to new <table>-<run_id> tables and switch the table_versions pointer after validation"
+  type        = bool
+  default     = false
+}
+
+variable "dynamodb_keep_versions" {
+  description = "Number of newest table versions kept per feature table when versioning"
+  type        = number
+  default     = 2
+}
+
+variable "dynamodb_max_write_rate" {
+  description = "Upper bound on DynamoDB items written per second across all writers"
+  type        = number
+  default     = 1000
+}
+
+variable "dynamodb_write_parallelism" {
+  description = "Number of concurrent DynamoDB writers (Spark partitions)"
+  type        = number
+  default     = 8
+}
+
+variable "skew_factor" {
+  description = "Join keys with more than this multiple of the median row count are treated as skewed"
+  type        = number
+  default     = 10
+}
+
+variable "skew_salt_buckets" {
+  description = "Number of salt buckets used to spread rows of skewed join keys"
+  type        = number
+  default     = 16
+}
+
+variable "join_benchmark" {
+  description = "Time default vs skew-aware joins and include the numbers in the join report"
+  type        = bool
+  default     = false
+}
+
+variable "parquet_user_buckets" {
+  description = "Number of user_id buckets (pmod(user_id, n)) for user-keyed Parquet outputs"
+  type        = number
+  default     = 64
+}
+
+variable "parquet_target_file_mb" {
+  description = "Approximate target size of each Parquet file in MB"
+  type        = number
+  default     = 128
+}
+
+variable "parquet_row_group_mb" {
+  description = "Parquet row group size in MB; smaller groups allow finer statistics-based pruning"
+  type        = number
+  default     = 16
+}
+
+variable "max_concurrent_stages" {
+  description = "Maximum number of independent pipeline stages submitted to Spark at once"
+  type        = number
+  default     = 4
+}
+
+variable "profile_sample_rate" {
+  description = "Fraction of job runs profiled per stage with cProfile/tracemalloc (0 disables profiling)"
+  type        = number
+  default     = 0
+}
+
+variable "dynamodb_feature_format" {
+  description = "Features published to user_product_features: scaled (pre-scaled) or raw (scaled by the Lambda at serve time)"
+  type        = string
+  default     = "scaled"
+
+  validation {
+    condition     = contains(["scaled", "raw"], var.dynamodb_feature_format)
+    error_message = "dynamodb_feature_format must be scaled or raw."
+  }
+}
+
+variable "build_product_embeddings" {
+  description = "Learn product embeddings from baskets and publish an IVF index for candidate expansion"
+  type        = bool
+  default     = false
+}
+
+variable "embedding_dim" {
+  description = "Dimension of the product embeddings"
+  type        = number
+  default     = 32
+}
+
+variable "ann_lists" {
+  description = "Maximum number of inverted lists in the product IVF index"
+  type        = number
+  default     = 256
+}
+
+variable "build_product_cooccurrence" {
+  description = "Count bought-together product pairs and publish per-product top-k neighbour lists"
+  type        = bool
+  default     = false
+}
+
+variable "cooccurrence_min_count" {
+  description = "Minimum number of orders a product pair must share to be kept"
+  type        = number
+  default     = 5
+}
+
+variable "cooccurrence_top_k" {
+  description = "Neighbours kept per product in the co-occurrence lists"
+  type        = number
+  default     = 50
+}
+
+variable "collect_spark_metrics" {
+  description = "Write a per-step Spark metrics report (shuffle, spill, GC, task skew) after each run"
+  type        = bool
+  default     = true
+}
+
+variable "source_format" {
+  description = "Read raw source tables from the Glue Catalog (catalog) or from typed Parquet copies converted once (parquet)"
+  type        = string
+  default     = "catalog"
+
+  validation {
+    condition     = contains(["catalog", "parquet"], var.source_format)
+    error_message = "source_format must be catalog or parquet."
+  }
+}
+
+variable "measure_source_loads" {
+  description = "Scan each source table load once more to report its rows, seconds and bytes scanned (doubles the source reads)"
+  type        = bool
+  default     = false
+}
@@ -0,0 +1,125 @@
+"""
+IVF nearest-neighbour index over product embeddings
+===================================================
+
+The Glue job learns product embeddings from order co-occurrence and writes
+an inverted-file (IVF) index as a single .npz:
+
+- product_ids (n,)       int64, grouped by list
+- vectors (n, d)         float32, L2-normalized, grouped by list
+- centroids (nlist, d)   float32, L2-normalized list centroids
+- offsets (nlist + 1,)   start of each list in product_ids/vectors
+- product_features (n, 4) prod_* model features of each product (optional)
+- feature_format ()      "scaled" or "raw", format of product_features
+
+A query scores the centroids, scans only the vectors of the nprobe closest
+lists and returns the top-k by cosine similarity, so search cost grows with
+n * nprobe / nlist instead of n.
+"""
+
+import io
+
+import numpy as np
+
+
+class IVFIndex:
+    def __init__(self, product_ids, vectors, centroids, offsets, product_features=None, feature_format=None):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.product_features = product_features
+        self.feature_format = feature_format
+        # Row of each product id, for looking up a user's products
+        order = np.argsort(self.product_ids)
+        self._sorted_ids = self.product_ids[order]
+        self._sorted_rows = order
+
+    @classmethod
+    def load(cls, data):
+        """Load an index from .npz bytes or a file path."""
+        arrays = np.load(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data)
+        features = arrays["product_features"] if "product_features" in arrays.files else None
+        feature_format = str(arrays["feature_format"]) if "feature_format" in arrays.files else None
+        return cls(arrays["product_ids"], arrays["vectors"], arrays["centroids"], arrays["offsets"],
+                   features, feature_format)
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        extra = {}
+        if self.product_features is not None:
+            extra = {"product_features": self.product_features, "feature_format": np.array(self.feature_format)}
+        np.savez(buffer, product_ids=self.product_ids, vectors=self.vectors, centroids=self.centroids,
+                 offsets=self.offsets, **extra)
+        return buffer.getvalue()
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def rows_for(self, product_ids):
+        """Index rows of the given product ids; -1 for products not in the index."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, product_ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == product_ids, self._sorted_rows[pos], -1)
+
+    def search(self, query, k=10, nprobe=8, exclude_rows=None):
+        """Return (rows, scores) of the k most similar vectors to a (d,) query, best first."""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        nprobe = min(nprobe, self.nlist)
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        if exclude_rows is not None and len(exclude_rows):
+            rows = rows[~np.isin(rows, exclude_rows)]
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+        scores = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def similar_to(self, product_ids, k=10, nprobe=8):
+        """
+        Products most similar to a set of products (their mean embedding), excluding
+        the set itself. Returns (rows, scores); empty if none of them is indexed.
+        """
+        rows = self.rows_for(product_ids)
+        rows = rows[rows >= 0]
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self.search(self.vectors[rows].mean(axis=0), k, nprobe, exclude_rows=rows)
+
+
+def exact_search(vectors, query, k=10):
+    """Brute-force top-k rows by inner product, for recall measurements."""
+    query = np.asarray(query, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def build_ivf(product_ids, vectors, nlist=256, iters=10, seed=42):
+    """
+    Build an IVFIndex with spherical k-means in NumPy, for offline rebuilds and
+    benchmarks (the Glue job uses Spark KMeans for the same layout).
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = vectors[assign == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+    return IVFIndex(np.asarray(product_ids)[order], vectors[order], centroids, offsets)
@@ -0,0 +1,140 @@
+"""
+Cross-request micro-batching for the recommendation service.
+
+Concurrent requests submit their feature matrices to a MicroBatcher, which
+collects them for at most `max_wait_ms` (or until `max_batch_rows` rows are
+queued), scores the whole batch with one call, and hands each caller back
+its own slice of the predictions. The request queue is bounded: when it is
+full, submit() raises Overloaded so the server can shed load with a 503
+instead of letting latency grow without limit. stop() rejects new requests,
+then scores every request already submitted before it returns.
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+
+class Overloaded(Exception):
+    """Raised when the batching queue is full or the batcher is stopping."""
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, max_batch_rows=2000, max_wait_ms=10, max_queue=256, max_inflight=2):
+        """
+        score_fn: blocking function mapping an (n, features) array to n scores;
+                  it runs in the default thread pool.
+        max_inflight: batches that may be scored concurrently while the next one fills.
+        """
+        self.score_fn = score_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._task = None
+        # Running _score tasks; the event loop only keeps weak references to tasks
+        self._scoring = set()
+        self._closed = False
+        self.stats = {"batches": 0, "requests": 0, "rows": 0, "rejected": 0}
+
+    def start(self):
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop accepting requests, score the ones already submitted and wait for every batch."""
+        self._closed = True
+        if self._task is not None:
+            if not self._task.done():
+                # The stop sentinel queues behind every pending request, so _run scores them all first
+                await self.queue.put(None)
+            await self._task
+            self._task = None
+        if self._scoring:
+            await asyncio.gather(*self._scoring, return_exceptions=True)
+        # Only reachable if _run died; never leave a caller waiting
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None and not item[1].done():
+                item[1].set_exception(Overloaded("Batcher stopped before scoring the request"))
+
+    async def submit(self, features):
+        """Queue a feature matrix and wait for its scores."""
+        if self._closed:
+            self.stats["rejected"] += 1
+            raise Overloaded("Batcher is shutting down")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((np.asarray(features, dtype=np.float32), future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise Overloaded(f"Batch queue is full ({self.queue.maxsize} pending requests)")
+        return await future
+
+    async def _collect(self):
+        """
+        Wait for one request, then keep adding until the window closes or the batch is full.
+        Returns (batch, stopped), stopped once the stop sentinel has been taken off the queue.
+        """
+        item = await self.queue.get()
+        if item is None:
+            return [], True
+        batch, rows = [item], len(item[0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while rows < self.max_batch_rows:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            rows += len(item[0])
+        return batch, False
+
+    async def _score(self, batch):
+        try:
+            features = np.vstack([x for x, _ in batch])
+            scores = await asyncio.get_running_loop().run_in_executor(None, self.score_fn, features)
+            offsets = np.cumsum([0] + [len(x) for x, _ in batch])
+            for (_, future), start, end in zip(batch, offsets[:-1], offsets[1:]):
+                if not future.done():
+                    future.set_result(scores[start:end])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._inflight.release()
+            # Cancelled mid-score: never leave a caller waiting
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(Overloaded("Batch was not scored before shutdown"))
+
+    async def _run(self):
+        while True:
+            batch, stopped = await self._collect()
+            if batch:
+                self.stats["batches"] += 1
+                self.stats["requests"] += len(batch)
+                self.stats["rows"] += sum(len(x) for x, _ in batch)
+                await self._inflight.acquire()
+                task = asyncio.get_running_loop().create_task(self._score(batch))
+                self._scoring.add(task)
+                task.add_done_callback(self._scoring.discard)
+            if stopped:
+                return
+
+
+def simulated_scorer(call_overhead_ms=20.0, per_row_us=5.0):
+    """A stand-in for the endpoint: fixed per-call overhead plus a per-row cost."""
+    def score(features):
+        time.sleep(call_overhead_ms / 1000.0 + len(features) * per_row_us / 1e6)
+        return features[:, 0].astype(np.float64)
+    return score
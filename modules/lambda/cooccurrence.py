@@ -0,0 +1,81 @@
+"""
+Bought-together neighbour lists for candidate expansion
+=======================================================
+
+The Glue job (create_product_cooccurrence) counts product pairs bought in the
+same order and keeps the top-k neighbours of each product, scored by cosine
+similarity of their order sets. The lists are written in CSR form as a
+single .npz:
+
+- product_ids (n,)        int64, sorted; every product with or in a list
+- offsets (n + 1,)        neighbours of row i are neighbors[offsets[i]:offsets[i + 1]]
+- neighbors (m,)          int32 rows of the neighbour products, best first
+- scores (m,)             float32 co-occurrence scores
+- product_features (n, 4) prod_* model features of each product
+- feature_format ()       "scaled" or "raw", format of product_features
+
+NeighborLists mirrors ann_index.IVFIndex (product_ids, product_features,
+similar_to) so the Lambda can use either as a candidate source.
+"""
+
+import io
+
+import numpy as np
+
+
+class NeighborLists:
+    def __init__(self, product_ids, offsets, neighbors, scores, product_features=None, feature_format=None):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.product_features = product_features
+        self.feature_format = feature_format
+
+    @classmethod
+    def load(cls, data):
+        """Load neighbour lists from .npz bytes or a file path."""
+        arrays = np.load(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data)
+        features = arrays["product_features"] if "product_features" in arrays.files else None
+        feature_format = str(arrays["feature_format"]) if "feature_format" in arrays.files else None
+        return cls(arrays["product_ids"], arrays["offsets"], arrays["neighbors"], arrays["scores"],
+                   features, feature_format)
+
+    @property
+    def nbytes(self):
+        return self.product_ids.nbytes + self.offsets.nbytes + self.neighbors.nbytes + self.scores.nbytes
+
+    def rows_for(self, product_ids):
+        """Rows of the given product ids; -1 for products without neighbours."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if len(self.product_ids) == 0:
+            return np.full(len(product_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.product_ids, product_ids), len(self.product_ids) - 1)
+        return np.where(self.product_ids[pos] == product_ids, pos, -1)
+
+    def neighbors_of(self, product_id):
+        """[(product_id, score)] of one product's neighbours, best first."""
+        row = self.rows_for([product_id])[0]
+        if row < 0:
+            return []
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        return [(int(self.product_ids[n]), float(s)) for n, s in zip(self.neighbors[lo:hi], self.scores[lo:hi])]
+
+    def similar_to(self, product_ids, k=10):
+        """
+        Products bought with a set of products, scored by the sum of their co-occurrence
+        scores with the set and excluding the set itself. Returns (rows, scores), best first.
+        """
+        rows = self.rows_for(product_ids)
+        rows = rows[rows >= 0]
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        lengths = self.offsets[rows + 1] - self.offsets[rows]
+        edges = np.repeat(self.offsets[rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        totals = np.bincount(self.neighbors[edges], weights=self.scores[edges], minlength=len(self.product_ids))
+        totals[rows] = 0
+        candidates = np.flatnonzero(totals > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-totals[candidates], k - 1)[:k]]
+        order = np.lexsort((candidates, -totals[candidates]))
+        return candidates[order].astype(np.int64), totals[candidates[order]].astype(np.float32)
@@ -48,6 +48,10 @@ cd ..
 
 # Add your Lambda function and scaler to the package directory (not root)
 cp lambda_function.py package/lambda_function.py
+cp profiling.py package/profiling.py
+cp trending.py package/trending.py
+cp ann_index.py package/ann_index.py
+cp cooccurrence.py package/cooccurrence.py
 # cp scaler.pkl package/scaler.pkl
 
 cd package
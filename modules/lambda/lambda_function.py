@@ -17,6 +17,21 @@ Features:
 
 Environment Variables:
 - KINESIS_STREAM: Name of the target Kinesis stream
+- PROFILE_SAMPLE_RATE / PROFILE_OUTPUT: opt-in sampled profiling (see profiling.py)
+- FEATURE_FORMAT: "scaled" (table holds scaled features) or "raw" (scale at serve time)
+- SCALER_BUCKET / SCALER_KEY: scaler mean/scale JSON exported by the Glue job, required when raw
+- TRENDING_BUCKET / TRENDING_PREFIX: trending snapshots published by trending.py
+- TRENDING_WEIGHT: blend weight of trending popularity into scores (default 0, off)
+- TRENDING_FALLBACK: serve trending products to users without features (default true)
+- TABLE_VERSION_TABLE: pointer table naming the live version of each feature table
+- CANDIDATE_EXPANSION: similar products added per request from the embedding index (default 0, off)
+- COOCCURRENCE_EXPANSION: bought-together products added per request (default 0, off)
+- CANDIDATE_INDEX_BUCKET: bucket of the candidate sources written by the Glue job
+- EMBEDDING_INDEX_KEY / ANN_NPROBE: IVF index and lists searched per query
+- COOCCURRENCE_INDEX_KEY: co-occurrence neighbour lists
+- ENDPOINT_MODE: "features" (send feature rows) or "user_ids" (endpoint runs inference.py
+  and reads features itself; candidate expansion is not applied)
+- ENDPOINT_TOP_K: candidates the endpoint returns per user in user_ids mode (default 50)
 
 Author: AWS Kinesis Pipeline Team
 """
@@ -27,13 +42,38 @@ import pandas as pd
 import numpy as np
 from decimal import Decimal
 import os
+import time
 from datetime import datetime
 
+from profiling import profile_handler
+
 dynamodb = boto3.resource('dynamodb', region_name='ap-southeast-2')
 dynamodb_client = boto3.client('dynamodb', region_name='ap-southeast-2')
 runtime = boto3.client('runtime.sagemaker')
 
-ENDPOINT_NAME = os.environ['ENDPOINT_NAME']
+ENDPOINT_NAME = os.environ.get('ENDPOINT_NAME')
+# Decode DynamoDB features straight into NumPy instead of Decimal -> DataFrame
+FAST_FEATURE_DECODE = os.environ.get('FAST_FEATURE_DECODE', 'true').lower() == 'true'
+# "raw" tables hold unscaled features; the exported scaler is applied here instead
+FEATURE_FORMAT = os.environ.get('FEATURE_FORMAT', 'scaled')
+SCALER_BUCKET = os.environ.get('SCALER_BUCKET')
+SCALER_KEY = os.environ.get('SCALER_KEY', 'scale_models/scaler_params.json')
+TRENDING_BUCKET = os.environ.get('TRENDING_BUCKET')
+TRENDING_PREFIX = os.environ.get('TRENDING_PREFIX', 'trending')
+TRENDING_WEIGHT = float(os.environ.get('TRENDING_WEIGHT', '0'))
+TRENDING_FALLBACK = os.environ.get('TRENDING_FALLBACK', 'true').lower() == 'true'
+TRENDING_TTL_S = float(os.environ.get('TRENDING_TTL_S', '60'))
+TABLE_VERSION_TABLE = os.environ.get('TABLE_VERSION_TABLE')
+TABLE_VERSION_TTL_S = float(os.environ.get('TABLE_VERSION_TTL_S', '30'))
+CANDIDATE_EXPANSION = int(os.environ.get('CANDIDATE_EXPANSION', '0'))
+CANDIDATE_INDEX_BUCKET = os.environ.get('CANDIDATE_INDEX_BUCKET')
+EMBEDDING_INDEX_KEY = os.environ.get('EMBEDDING_INDEX_KEY', 'embeddings/product_ivf/latest.npz')
+ANN_NPROBE = int(os.environ.get('ANN_NPROBE', '8'))
+COOCCURRENCE_EXPANSION = int(os.environ.get('COOCCURRENCE_EXPANSION', '0'))
+COOCCURRENCE_INDEX_KEY = os.environ.get('COOCCURRENCE_INDEX_KEY', 'cooccurrence/product_neighbors/latest.npz')
+# "user_ids": the endpoint fetches features and ranks (step-functions inference/inference.py)
+ENDPOINT_MODE = os.environ.get('ENDPOINT_MODE', 'features')
+ENDPOINT_TOP_K = int(os.environ.get('ENDPOINT_TOP_K', '50'))
 
 # def load_scaler_from_s3(bucket, key, local_path='scaler.pkl'):
 #     s3 = boto3.client('s3')
@@ -54,6 +94,29 @@ def convert_decimals(obj):
 def flatten_ddb_item(item):
     return {k: list(v.values())[0] for k, v in item.items()}
 
+# Live table versions from the pointer item, refreshed every TABLE_VERSION_TTL_S
+_table_versions = {'loaded_at': 0.0, 'tables': {}}
+
+
+def resolve_table(table_name):
+    """Return the live versioned table for a feature table, or the table itself without a pointer."""
+    if not TABLE_VERSION_TABLE:
+        return table_name
+    now = time.time()
+    if now - _table_versions['loaded_at'] >= TABLE_VERSION_TTL_S:
+        _table_versions['loaded_at'] = now
+        try:
+            item = dynamodb_client.get_item(TableName=TABLE_VERSION_TABLE,
+                                            Key={'pointer': {'S': 'current'}}).get('Item')
+            _table_versions['tables'] = {name: value['S'] for name, value in item['tables']['M'].items()} \
+                if item else {}
+            if item:
+                print(f"🔀 Feature tables at version {item['version']['S']}")
+        except Exception as e:
+            # Keep reading the last known versions
+            print(f"❌ Failed to read table versions: {e}")
+    return _table_versions['tables'].get(table_name, table_name)
+
 def batch_get_items(table_name, keys):
     results = []
     keys_to_get = list(keys)
@@ -66,133 +129,433 @@ def batch_get_items(table_name, keys):
         keys_to_get = unprocessed + keys_to_get[100:]
     return results
 
+FEATURE_COLUMNS = ['user_orders_scaled', 'user_periods_scaled', 'user_mean_days_since_prior_scaled',
+                   'user_products_scaled', 'user_distinct_products_scaled', 'user_reorder_ratio_scaled',
+                   'prod_orders_scaled', 'prod_reorders_scaled', 'prod_first_orders_scaled', 'prod_second_orders_scaled']
+RAW_FEATURE_COLUMNS = [c[:-len('_scaled')] for c in FEATURE_COLUMNS]
+# Attributes read from user_product_features, in model feature order
+STORED_FEATURE_COLUMNS = RAW_FEATURE_COLUMNS if FEATURE_FORMAT == 'raw' else FEATURE_COLUMNS
+# The Glue job omits NaN/inf feature attributes; read them as 0, like its fillna(0)
+MISSING_FEATURE = {'N': '0'}
+
+# (mean, 1 / scale) as float32, loaded once per container
+_scaler_params = None
+
+
+def load_scaler_params():
+    """Load the scaler mean/scale the Glue job exports to s3://SCALER_BUCKET/SCALER_KEY once."""
+    global _scaler_params
+    if _scaler_params is None:
+        if not SCALER_BUCKET:
+            raise ValueError("SCALER_BUCKET must be set when FEATURE_FORMAT is raw")
+        print(f"📥 Loading scaler from s3://{SCALER_BUCKET}/{SCALER_KEY}")
+        obj = boto3.client('s3').get_object(Bucket=SCALER_BUCKET, Key=SCALER_KEY)
+        params = json.loads(obj['Body'].read())
+        if params.get('features', RAW_FEATURE_COLUMNS) != RAW_FEATURE_COLUMNS:
+            raise ValueError(f"Scaler features {params['features']} do not match {RAW_FEATURE_COLUMNS}")
+        mean = np.asarray(params['mean'], dtype=np.float32)
+        scale = np.asarray(params['scale'], dtype=np.float64)
+        if mean.shape != (len(FEATURE_COLUMNS),) or scale.shape != mean.shape:
+            raise ValueError(f"Scaler has {mean.shape[0]} features, expected {len(FEATURE_COLUMNS)}")
+        _scaler_params = (mean, (1.0 / np.where(scale == 0, 1.0, scale)).astype(np.float32))
+        print("✅ Scaler parameters loaded")
+    return _scaler_params
+
+
+def prepare_features(X):
+    """Return model inputs: X unchanged for scaled tables, (X - mean) / scale for raw ones."""
+    if FEATURE_FORMAT != 'raw':
+        return X
+    mean, inv_scale = load_scaler_params()
+    X = np.array(X, dtype=np.float32)
+    X -= mean
+    X *= inv_scale
+    return X
+
+
+def fetch_user_features(user_id):
+    """Query the candidate products and their features for a user; returns None if there are none."""
+    # Query DynamoDB for user features
+    print("🔍 Querying DynamoDB for user features...")
+    user_product_features_db = dynamodb.Table(resolve_table('user_product_features'))
+    response = user_product_features_db.query(
+        KeyConditionExpression=boto3.dynamodb.conditions.Key('user_id').eq(user_id)
+    )
+    print(f"📥 DynamoDB response: {len(response['Items'])} items found")
+
+    if not response['Items']:
+        print(f"⚠️ No features found for user_id {user_id}")
+        return None
+
+    # Convert and validate data
+    user_product_features = convert_decimals(response['Items'])
+    user_product_features = pd.DataFrame(user_product_features)
+    print(f"📊 Features DataFrame shape: {user_product_features.shape}")
+    print(f"📊 Available columns: {list(user_product_features.columns)}")
+
+    # Validate required columns exist; feature attributes may be omitted from any item
+    missing_columns = [col for col in ['user_id', 'product_id'] if col not in user_product_features.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+    user_product_features = user_product_features.reindex(
+        columns=list(dict.fromkeys(list(user_product_features.columns) + STORED_FEATURE_COLUMNS)))
+    user_product_features[STORED_FEATURE_COLUMNS] = user_product_features[STORED_FEATURE_COLUMNS].fillna(0)
+
+    return user_product_features
+
+
+def decode_feature_items(items, columns=FEATURE_COLUMNS):
+    """
+    Parse low-level DynamoDB items ({'N': '...'} attributes) into product ids and a
+    float32 feature matrix in `columns` order, without Decimal or pandas. A feature
+    attribute missing from an item decodes as 0.
+    """
+    n = len(items)
+    if any('product_id' not in item for item in items):
+        raise ValueError("Missing required column: product_id")
+    product_ids = np.fromiter((item['product_id']['N'] for item in items), dtype=np.int64, count=n)
+    X = np.fromiter((item.get(c, MISSING_FEATURE)['N'] for item in items for c in columns),
+                    dtype=np.float32, count=n * len(columns)).reshape(n, len(columns))
+    return product_ids, X
+
+
+# Candidate sources (embedding index, co-occurrence lists), loaded once per container (False = unavailable)
+_candidate_sources = {}
+
+
+def load_candidate_source(name):
+    """
+    Load a candidate source from S3 on first use: "embedding" (ann_index.IVFIndex) or
+    "cooccurrence" (cooccurrence.NeighborLists). None if it is missing or unusable.
+    """
+    if name not in _candidate_sources:
+        key = EMBEDDING_INDEX_KEY if name == 'embedding' else COOCCURRENCE_INDEX_KEY
+        try:
+            if name == 'embedding':
+                from ann_index import IVFIndex as source_cls
+            else:
+                from cooccurrence import NeighborLists as source_cls
+            print(f"📥 Loading {name} candidates from s3://{CANDIDATE_INDEX_BUCKET}/{key}")
+            obj = boto3.client('s3').get_object(Bucket=CANDIDATE_INDEX_BUCKET, Key=key)
+            source = source_cls.load(obj['Body'].read())
+            if source.product_features is None or source.feature_format != FEATURE_FORMAT:
+                raise ValueError(f"product features are {source.feature_format}, table is {FEATURE_FORMAT}")
+            _candidate_sources[name] = source
+            print(f"✅ {name} candidates loaded: {len(source.product_ids)} products")
+        except Exception as e:
+            print(f"❌ {name} candidate expansion disabled: {e}")
+            _candidate_sources[name] = False
+    return _candidate_sources[name] or None
+
+
+def expand_candidates(product_ids, X):
+    """
+    Add products related to the user's own as new candidates: up to CANDIDATE_EXPANSION
+    nearest by embedding and up to COOCCURRENCE_EXPANSION most often bought with them.
+    Their rows reuse the user's user_* features with the product's prod_* features from
+    the source, in the stored feature format.
+    """
+    if not CANDIDATE_INDEX_BUCKET:
+        return product_ids, X
+    new_ids, new_features = [], []
+    seen = product_ids
+    for name, k in (('embedding', CANDIDATE_EXPANSION), ('cooccurrence', COOCCURRENCE_EXPANSION)):
+        if k <= 0:
+            continue
+        source = load_candidate_source(name)
+        if source is None:
+            continue
+        if name == 'embedding':
+            rows, _ = source.similar_to(product_ids, k=k, nprobe=ANN_NPROBE)
+        else:
+            rows, _ = source.similar_to(product_ids, k=k)
+        rows = rows[~np.isin(source.product_ids[rows], seen)]
+        if len(rows) == 0:
+            continue
+        new_ids.append(source.product_ids[rows])
+        new_features.append(source.product_features[rows])
+        seen = np.concatenate([seen, new_ids[-1]])
+        print(f"🧭 Added {len(rows)} candidates from {name}")
+    if not new_ids:
+        return product_ids, X
+    new_features = np.vstack(new_features)
+    n_user_cols = X.shape[1] - new_features.shape[1]
+    new_X = np.hstack([np.repeat(X[:1, :n_user_cols], len(new_features), axis=0), new_features])
+    return np.concatenate([product_ids] + new_ids), np.vstack([X, new_X.astype(X.dtype)])
+
+
+def fetch_user_feature_matrix(user_id):
+    """
+    Query only product_id and the feature columns for a user with the low-level client
+    and decode them into (product_ids, X) ready for scoring; returns (None, None) if there are none.
+    """
+    print("🔍 Querying DynamoDB for user features (fast path)...")
+    names = {f"#c{i}": c for i, c in enumerate(['product_id'] + STORED_FEATURE_COLUMNS)}
+    query_args = {
+        'TableName': resolve_table('user_product_features'),
+        'KeyConditionExpression': 'user_id = :uid',
+        'ExpressionAttributeValues': {':uid': {'N': str(user_id)}},
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+    }
+    items = []
+    while True:
+        response = dynamodb_client.query(**query_args)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"📥 DynamoDB response: {len(items)} items found")
+
+    if not items:
+        print(f"⚠️ No features found for user_id {user_id}")
+        return None, None
+
+    product_ids, X = expand_candidates(*decode_feature_items(items, STORED_FEATURE_COLUMNS))
+    return product_ids, prepare_features(X)
+
+
+def top_k(product_ids, probs, k=10):
+    """Return (product_ids, probs) of the k highest scores, best first, via partial selection."""
+    if len(probs) > k:
+        idx = np.argpartition(-probs, k - 1)[:k]
+    else:
+        idx = np.arange(len(probs))
+    idx = idx[np.argsort(-probs[idx], kind='stable')]
+    return product_ids[idx], probs[idx]
+
+
+def rank_top_k(product_ids, probs, k=10):
+    """Rank candidates with a partial top-k selection and attach product metadata."""
+    if len(probs) != len(product_ids):
+        raise ValueError(f"Prediction count ({len(probs)}) doesn't match feature count ({len(product_ids)})")
+
+    top_ids, top_probs = top_k(product_ids, np.asarray(probs, dtype=np.float64), k)
+    print(f"🎯 Top prediction probability: {top_probs[0]:.4f}")
+
+    print(f"🛍️ Fetching metadata for {len(top_ids)} products")
+    request_keys = [{'product_id': {'N': str(pid)}} for pid in top_ids.tolist()]
+    items = batch_get_items(resolve_table("products"), request_keys)
+
+    if not items:
+        print("⚠️ No product metadata found, returning predictions without names")
+        return [{'product_id': int(pid), 'probability': float(p)} for pid, p in zip(top_ids, top_probs)]
+
+    metadata = {item['product_id']['N']: flatten_ddb_item(item) for item in items}
+    print(f"📊 Retrieved metadata for {len(metadata)} products")
+    final_recommendations = []
+    for pid, prob in zip(top_ids.tolist(), top_probs.tolist()):
+        product = metadata.get(str(pid), {})
+        final_recommendations.append({
+            'product_id': str(pid),
+            'probability': prob,
+            'product_name': product.get('product_name', 'Unknown Product'),
+            'department': product.get('department', 'Unknown'),
+            'aisle': product.get('aisle', 'Unknown'),
+        })
+    print(f"✅ Returning {len(final_recommendations)} recommendations")
+    return final_recommendations
+
+
+# Merged trending snapshot (sorted product ids, counts), refreshed every TRENDING_TTL_S
+_trending_cache = {'loaded_at': 0.0, 'scores': None}
+
+
+def load_trending_scores():
+    """Merge the per-shard trending snapshots into (product_ids, counts); None if unavailable."""
+    if not TRENDING_BUCKET:
+        return None
+    now = time.time()
+    if now - _trending_cache['loaded_at'] < TRENDING_TTL_S:
+        return _trending_cache['scores']
+    _trending_cache['loaded_at'] = now
+    try:
+        s3 = boto3.client('s3')
+        counts = {}
+        listing = s3.list_objects_v2(Bucket=TRENDING_BUCKET, Prefix=f"{TRENDING_PREFIX}/snapshots/")
+        for obj in listing.get('Contents', []):
+            snapshot = json.loads(s3.get_object(Bucket=TRENDING_BUCKET, Key=obj['Key'])['Body'].read())
+            # Shards are disjoint, so counts add up; skip shards that stopped publishing
+            if now - snapshot['generated_at'] > snapshot['window_s']:
+                continue
+            for pid, count in snapshot['top']:
+                counts[pid] = counts.get(pid, 0) + count
+        if counts:
+            product_ids = np.array(sorted(counts), dtype=np.int64)
+            _trending_cache['scores'] = (product_ids, np.array([counts[p] for p in product_ids.tolist()],
+                                                                dtype=np.float64))
+        else:
+            _trending_cache['scores'] = None
+        print(f"📈 Loaded trending snapshot with {len(counts)} products")
+    except Exception as e:
+        # Keep serving the previous snapshot
+        print(f"❌ Failed to load trending snapshot: {e}")
+    return _trending_cache['scores']
+
+
+def blend_trending(product_ids, probs):
+    """Mix normalized trending popularity into the model scores with TRENDING_WEIGHT."""
+    probs = np.asarray(probs, dtype=np.float64)
+    trending = load_trending_scores() if TRENDING_WEIGHT > 0 else None
+    if trending is None:
+        return probs
+    trending_ids, trending_counts = trending
+    idx = np.minimum(np.searchsorted(trending_ids, product_ids), len(trending_ids) - 1)
+    popularity = np.where(trending_ids[idx] == product_ids, trending_counts[idx] / trending_counts.max(), 0.0)
+    return (1.0 - TRENDING_WEIGHT) * probs + TRENDING_WEIGHT * popularity
+
+
+def trending_recommendations(k=10):
+    """Recommend the currently trending products, e.g. for users without features."""
+    trending = load_trending_scores() if TRENDING_FALLBACK else None
+    if trending is None:
+        return []
+    print("📈 Falling back to trending products")
+    trending_ids, trending_counts = trending
+    return rank_top_k(trending_ids, trending_counts / trending_counts.max(), k)
+
+
+def score_features(X_test):
+    """Score a feature matrix (rows x FEATURE_COLUMNS) on the SageMaker endpoint."""
+    X_test = np.asarray(X_test)
+    print(f"🔢 Prepared {X_test.shape[0]} samples with {X_test.shape[1]} features")
+
+    # Convert features to CSV string for SageMaker endpoint
+    csv_rows = [','.join(str(x) for x in row) for row in X_test]
+    csv_str = '\n'.join(csv_rows)
+
+    print(f"📤 Sending {len(csv_rows)} rows to SageMaker endpoint")
+    # print(f"📤 Sample CSV (first 200 chars): {csv_str[:200]}...")
+
+    # Predict using boto3 SageMaker runtime
+    print(f"🤖 Invoking SageMaker endpoint: {ENDPOINT_NAME}")
+    response = runtime.invoke_endpoint(
+        EndpointName=ENDPOINT_NAME,
+        ContentType='text/csv',
+        Body=csv_str
+    )
+    response_body = response['Body'].read().decode('utf-8')
+    print(f"📥 SageMaker response length: {len(response_body)} chars")
+
+    # Validate and parse predictions
+    response_lines = [x.strip() for x in response_body.strip().split('\n') if x.strip()]
+    if len(response_lines) != len(csv_rows):
+        raise ValueError(f"SageMaker returned {len(response_lines)} predictions but expected {len(csv_rows)}")
+
+    try:
+        return np.array([float(x) for x in response_lines])
+    except ValueError as e:
+        raise ValueError(f"Failed to parse SageMaker predictions as floats: {e}")
+
+
+def rank_user_on_endpoint(user_id, k=ENDPOINT_TOP_K):
+    """(product_ids, scores) of a user's top-k ranked by the endpoint itself; (None, None) without features."""
+    print(f"🤖 Invoking SageMaker endpoint: {ENDPOINT_NAME} for user {user_id}")
+    response = runtime.invoke_endpoint(
+        EndpointName=ENDPOINT_NAME,
+        ContentType='application/json',
+        Accept='application/json',
+        Body=json.dumps({'user_ids': [int(user_id)], 'k': k})
+    )
+    result = json.loads(response['Body'].read())['results'][0]
+    if not result['product_ids']:
+        print(f"⚠️ No features found for user_id: {user_id}")
+        return None, None
+    print(f"📥 Endpoint ranked {len(result['product_ids'])} products")
+    return np.asarray(result['product_ids'], dtype=np.int64), np.asarray(result['scores'], dtype=np.float64)
+
+
+def rank_recommendations(user_product_features, probs):
+    """Rank candidates by predicted probability and attach product metadata to the top 10."""
+    # Create prediction DataFrame
+    if len(probs) != len(user_product_features):
+        raise ValueError(f"Prediction count ({len(probs)}) doesn't match feature count ({len(user_product_features)})")
+
+    df_pred = pd.DataFrame({
+        'product_id': user_product_features["product_id"].values,
+        'probability': probs
+    })
+    df_pred_sorted = df_pred.sort_values('probability', ascending=False).head(10)
+    print(f"🎯 Top prediction probability: {df_pred_sorted.iloc[0]['probability']:.4f}")
+
+    # Get product metadata
+    product_ids = df_pred_sorted["product_id"].astype(int).unique().tolist()
+    print(f"🛍️ Fetching metadata for {len(product_ids)} products")
+
+    request_keys = [{'product_id': {'N': str(pid)}} for pid in product_ids]
+    items = batch_get_items(resolve_table("products"), request_keys)
+
+    if not items:
+        print("⚠️ No product metadata found, returning predictions without names")
+        return df_pred_sorted[['product_id', 'probability']].to_dict(orient='records')
+
+    flat_items = [flatten_ddb_item(item) for item in items]
+    products_df = pd.DataFrame(flat_items)
+    print(f"📊 Retrieved metadata for {len(products_df)} products")
+
+    # Ensure consistent data types for merging
+    df_pred_sorted['product_id'] = df_pred_sorted['product_id'].astype(str)
+    products_df['product_id'] = products_df['product_id'].astype(str)
+
+    # Merge predictions with product metadata
+    df_recommend = pd.merge(
+        df_pred_sorted,
+        products_df[['product_id', 'product_name', 'department', 'aisle']],
+        on='product_id',
+        how='left'
+    )
+
+    # Fill missing product names
+    df_recommend['product_name'] = df_recommend['product_name'].fillna('Unknown Product')
+    df_recommend['department'] = df_recommend['department'].fillna('Unknown')
+    df_recommend['aisle'] = df_recommend['aisle'].fillna('Unknown')
+
+    final_recommendations = df_recommend[['product_id', 'probability', 'product_name', 'department', 'aisle']].to_dict(orient='records')
+    print(f"✅ Returning {len(final_recommendations)} recommendations")
+
+    return final_recommendations
+
+
+def validate_request(data):
+    """Validate the request body and return the user_id."""
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected dict, got {type(data)}")
+
+    if "user_id" not in data:
+        raise ValueError("Missing 'user_id' in request data")
+
+    return data["user_id"]
+
+
 def get_recommendations(data):
     print(f"🎯 get_recommendations called with data: {json.dumps(data) if isinstance(data, dict) else str(data)}")
     
     try:
         # Validate input data
-        if not isinstance(data, dict):
-            raise ValueError(f"Expected dict, got {type(data)}")
-        
-        if "user_id" not in data:
-            raise ValueError("Missing 'user_id' in request data")
-        
-        user_id = data["user_id"]
+        user_id = validate_request(data)
         print(f"🔍 Processing recommendations for user_id: {user_id}")
-        
-        # Query DynamoDB for user features
-        print("🔍 Querying DynamoDB for user features...")
-        user_product_features_db = dynamodb.Table('user_product_features')
-        response = user_product_features_db.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('user_id').eq(user_id)
-        )
-        print(f"📥 DynamoDB response: {len(response['Items'])} items found")
-        
-        if not response['Items']:
-            print(f"⚠️ No features found for user_id {user_id}")
-            return []
-        
-        # Convert and validate data
-        user_product_features = convert_decimals(response['Items'])
-        user_product_features = pd.DataFrame(user_product_features)
-        print(f"📊 Features DataFrame shape: {user_product_features.shape}")
-        print(f"📊 Available columns: {list(user_product_features.columns)}")
-        
-        # Validate required columns exist
-        required_columns = ['user_id', 'product_id', 'user_orders_scaled', 'user_periods_scaled', 
-                           'user_mean_days_since_prior_scaled', 'user_products_scaled', 
-                           'user_distinct_products_scaled', 'user_reorder_ratio_scaled', 
-                           'prod_orders_scaled', 'prod_reorders_scaled', 'prod_first_orders_scaled', 
-                           'prod_second_orders_scaled']
-        
-        missing_columns = [col for col in required_columns if col not in user_product_features.columns]
-        if missing_columns:
-            raise ValueError(f"Missing required columns: {missing_columns}")
-        
+
+        if ENDPOINT_MODE == 'user_ids':
+            product_ids, probs = rank_user_on_endpoint(user_id)
+            if product_ids is None:
+                return trending_recommendations()
+            return rank_top_k(product_ids, blend_trending(product_ids, probs))
+
+        if FAST_FEATURE_DECODE:
+            product_ids, X_test = fetch_user_feature_matrix(user_id)
+            if product_ids is None:
+                return trending_recommendations()
+            return rank_top_k(product_ids, blend_trending(product_ids, score_features(X_test)))
+
+        user_product_features = fetch_user_features(user_id)
+        if user_product_features is None:
+            return trending_recommendations()
+
         # Prepare test features for prediction
-        feature_columns = ['user_orders_scaled', 'user_periods_scaled', 'user_mean_days_since_prior_scaled', 
-                          'user_products_scaled', 'user_distinct_products_scaled', 'user_reorder_ratio_scaled', 
-                          'prod_orders_scaled', 'prod_reorders_scaled', 'prod_first_orders_scaled', 'prod_second_orders_scaled']
-        
-        X_test = user_product_features[feature_columns]
-        print(f"🔢 Prepared {X_test.shape[0]} samples with {X_test.shape[1]} features")
-        
-        # Convert DataFrame to CSV string for SageMaker endpoint
-        csv_rows = []
-        for _, row in X_test.iterrows():
-            csv_rows.append(','.join(str(x) for x in row.values))
-        csv_str = '\n'.join(csv_rows)
-        
-        print(f"📤 Sending {len(csv_rows)} rows to SageMaker endpoint")
-        # print(f"📤 Sample CSV (first 200 chars): {csv_str[:200]}...")
-
-        # Predict using boto3 SageMaker runtime
-        print(f"🤖 Invoking SageMaker endpoint: {ENDPOINT_NAME}")
-        response = runtime.invoke_endpoint(
-            EndpointName=ENDPOINT_NAME,
-            ContentType='text/csv',
-            Body=csv_str
-        )
-        response_body = response['Body'].read().decode('utf-8')
-        print(f"📥 SageMaker response length: {len(response_body)} chars")
-        
-        # Validate and parse predictions
-        response_lines = [x.strip() for x in response_body.strip().split('\n') if x.strip()]
-        if len(response_lines) != len(csv_rows):
-            raise ValueError(f"SageMaker returned {len(response_lines)} predictions but expected {len(csv_rows)}")
-        
-        try:
-            probs = np.array([float(x) for x in response_lines])
-        except ValueError as e:
-            raise ValueError(f"Failed to parse SageMaker predictions as floats: {e}")
-        
-        # Create prediction DataFrame
-        if len(probs) != len(user_product_features):
-            raise ValueError(f"Prediction count ({len(probs)}) doesn't match feature count ({len(user_product_features)})")
-            
-        df_pred = pd.DataFrame({
-            'product_id': user_product_features["product_id"].values,
-            'probability': probs
-        })
-        df_pred_sorted = df_pred.sort_values('probability', ascending=False).head(10)
-        print(f"🎯 Top prediction probability: {df_pred_sorted.iloc[0]['probability']:.4f}")
+        probs = score_features(prepare_features(user_product_features[STORED_FEATURE_COLUMNS].to_numpy()))
+        probs = blend_trending(user_product_features['product_id'].to_numpy(dtype=np.int64), probs)
 
-        # Get product metadata
-        product_ids = df_pred_sorted["product_id"].astype(int).unique().tolist()
-        print(f"🛍️ Fetching metadata for {len(product_ids)} products")
-        
-        request_keys = [{'product_id': {'N': str(pid)}} for pid in product_ids]
-        items = batch_get_items("products", request_keys)
-        
-        if not items:
-            print("⚠️ No product metadata found, returning predictions without names")
-            return df_pred_sorted[['product_id', 'probability']].to_dict(orient='records')
-        
-        flat_items = [flatten_ddb_item(item) for item in items]
-        products_df = pd.DataFrame(flat_items)
-        print(f"📊 Retrieved metadata for {len(products_df)} products")
-
-        # Ensure consistent data types for merging
-        df_pred_sorted['product_id'] = df_pred_sorted['product_id'].astype(str)
-        products_df['product_id'] = products_df['product_id'].astype(str)
-
-        # Merge predictions with product metadata
-        df_recommend = pd.merge(
-            df_pred_sorted,
-            products_df[['product_id', 'product_name', 'department', 'aisle']],
-            on='product_id',
-            how='left'
-        )
-
-        # Fill missing product names
-        df_recommend['product_name'] = df_recommend['product_name'].fillna('Unknown Product')
-        df_recommend['department'] = df_recommend['department'].fillna('Unknown')
-        df_recommend['aisle'] = df_recommend['aisle'].fillna('Unknown')
-
-        final_recommendations = df_recommend[['product_id', 'probability', 'product_name', 'department', 'aisle']].to_dict(orient='records')
-        print(f"✅ Returning {len(final_recommendations)} recommendations")
-        
-        return final_recommendations
+        return rank_recommendations(user_product_features, probs)
 
     except Exception as e:
         print(f"❌ Error in get_recommendations: {str(e)}")
@@ -203,6 +566,7 @@ def get_recommendations(data):
 
 
 
+@profile_handler("lambda_handler")
 def lambda_handler(event, context):
     print(f"🚀 Lambda function started. Event: {json.dumps(event)}")
     print(f"🔍 Context: {context}")
@@ -138,7 +138,13 @@ resource "aws_iam_policy" "lambda_sagemaker_dynamodb_policy" {
           "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/user_product_features",
           "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/product_features",
           "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/user_features",
-          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/products"
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/products",
+          # Blue/green versions (<table>-<run_id>) and the pointer naming the live one
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/user_product_features-*",
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/product_features-*",
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/user_features-*",
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/products-*",
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/${var.table_versions_table_name}"
         ]
       }
     ]
@@ -173,10 +179,10 @@ resource "aws_iam_role_policy_attachment" "lambda_sagemaker_dynamodb_attach" {
   policy_arn = aws_iam_policy.lambda_sagemaker_dynamodb_policy.arn
 }
 
-# IAM policy for S3 access to scaler.pkl
+# IAM policy for S3 access to the scaler parameters
 resource "aws_iam_policy" "lambda_s3_getobject_policy" {
   name        = "lambda-s3-getobject-policy"
-  description = "Allow Lambda to get scaler.pkl from S3 bucket for inference."
+  description = "Allow Lambda to get the scaler parameters from S3 bucket for inference."
 
   policy = jsonencode({
     Version = "2012-10-17",
@@ -186,7 +192,30 @@ resource "aws_iam_policy" "lambda_s3_getobject_policy" {
         Action = [
           "s3:GetObject"
         ],
-        Resource = "arn:aws:s3:::${var.lambda_bucket}/*"
+        Resource = [
+          "arn:aws:s3:::${var.lambda_bucket}/*",
+          "arn:aws:s3:::${var.scaler_bucket}/${var.scaler_key}"
+        ]
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "s3:PutObject"
+        ],
+        Resource = [
+          "arn:aws:s3:::${var.lambda_bucket}/profiles/*",
+          "arn:aws:s3:::${var.lambda_bucket}/trending/*"
+        ]
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "s3:ListBucket"
+        ],
+        Resource = "arn:aws:s3:::${var.lambda_bucket}",
+        Condition = {
+          StringLike = { "s3:prefix" = ["trending/*"] }
+        }
       }
     ]
   })
@@ -228,8 +257,24 @@ resource "aws_lambda_function" "api_lambda" {
     variables = {
       KINESIS_STREAM = var.kinesis_stream_name # Stream name for data delivery
       ENDPOINT_NAME  = var.endpoint_name
-      # SCALER_BUCKET  = var.scaler_bucket
-      # SCALER_KEY     = var.scaler_key
+      # Opt-in sampled profiling; 0 disables it with no per-request overhead
+      PROFILE_SAMPLE_RATE = var.profile_sample_rate
+      PROFILE_OUTPUT      = var.profile_output
+      SCALER_BUCKET  = var.scaler_bucket
+      SCALER_KEY     = var.scaler_key
+      # "raw" when the Glue job publishes unscaled features (dynamodb_feature_format)
+      FEATURE_FORMAT = var.feature_format
+      # Trending snapshots from the stream consumer below
+      TRENDING_BUCKET = var.trending_enabled ? var.lambda_bucket : ""
+      TRENDING_WEIGHT = var.trending_weight
+      # Pointer to the live feature table versions written by the Glue job
+      TABLE_VERSION_TABLE = var.table_versions_table_name
+      # Candidate expansion from the embedding index / co-occurrence lists (0 disables each)
+      CANDIDATE_EXPANSION    = var.candidate_expansion
+      COOCCURRENCE_EXPANSION = var.cooccurrence_expansion
+      CANDIDATE_INDEX_BUCKET = var.lambda_bucket
+      # "user_ids" when the endpoint runs the custom inference handler (custom_inference_enabled)
+      ENDPOINT_MODE = var.endpoint_mode
     }
   }
 
@@ -247,3 +292,77 @@ resource "aws_lambda_function" "api_lambda" {
 # These are used to construct the source ARN for Lambda permissions
 data "aws_region" "current" {}
 data "aws_caller_identity" "current" {}
+
+
+# =============================================================================
+# Trending counters: Kinesis consumer keeping sliding-window product counts
+# =============================================================================
+# Reads the records api_lambda publishes and writes per-shard snapshots to
+# s3://<lambda_bucket>/trending/snapshots/, which api_lambda blends into scores.
+
+data "aws_kinesis_stream" "api_stream" {
+  count = var.trending_enabled ? 1 : 0
+  name  = var.kinesis_stream_name
+}
+
+resource "aws_iam_role_policy" "lambda_kinesis_read" {
+  count = var.trending_enabled ? 1 : 0
+  name  = "${var.function_name}-kinesis-read-policy"
+  role  = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "kinesis:GetRecords",
+          "kinesis:GetShardIterator",
+          "kinesis:DescribeStream",
+          "kinesis:DescribeStreamSummary",
+          "kinesis:ListShards",
+          "kinesis:ListStreams"
+        ]
+        Resource = data.aws_kinesis_stream.api_stream[0].arn
+      }
+    ]
+  })
+}
+
+resource "aws_lambda_function" "trending" {
+  count            = var.trending_enabled ? 1 : 0
+  s3_bucket        = var.lambda_bucket
+  s3_key           = "lambda/lambda_function_payload.zip"
+  function_name    = "${var.function_name}-trending"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "trending.stream_handler"
+  runtime          = var.runtime
+  source_code_hash = filebase64sha256("${path.module}/lambda_function_payload.zip")
+  timeout          = 60
+  architectures    = ["${var.lambda_architecture}"]
+
+  environment {
+    variables = {
+      TRENDING_BUCKET   = var.lambda_bucket
+      TRENDING_WINDOW_S = var.trending_window_s
+      TRENDING_WIDTH    = var.trending_sketch_width
+    }
+  }
+
+  tags = {
+    Name        = "${var.function_name}-trending"
+    Environment = var.env
+    Purpose     = "Trending product counters"
+  }
+
+  depends_on = [aws_s3_object.lambda_zip]
+}
+
+resource "aws_lambda_event_source_mapping" "trending" {
+  count                              = var.trending_enabled ? 1 : 0
+  event_source_arn                   = data.aws_kinesis_stream.api_stream[0].arn
+  function_name                      = aws_lambda_function.trending[0].arn
+  starting_position                  = "LATEST"
+  batch_size                         = 500
+  maximum_batching_window_in_seconds = 10
+}
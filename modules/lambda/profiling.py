@@ -0,0 +1,116 @@
+"""
+Opt-in sampling profiler for the Lambda handler
+===============================================
+
+When PROFILE_SAMPLE_RATE > 0, that fraction of invocations runs under
+cProfile plus tracemalloc allocation tracing. Each sampled invocation writes
+two gzip-compressed files tagged with stage and request ID:
+
+    <PROFILE_OUTPUT>/<stage>/<timestamp>-<request_id>.prof.gz        (pstats)
+    <PROFILE_OUTPUT>/<stage>/<timestamp>-<request_id>.tracemalloc.gz (tracemalloc snapshot)
+
+PROFILE_OUTPUT is a local directory (default /tmp/profiles) or s3://bucket/prefix.
+With profiling off the decorator returns the handler unchanged, so there is
+no per-invocation overhead.
+
+Reading a profile:
+    gunzip x.prof.gz && python -m pstats x.prof
+    gunzip x.tracemalloc.gz && python -c "import tracemalloc; \
+        print(*tracemalloc.Snapshot.load('x.tracemalloc').statistics('lineno')[:20], sep='\\n')"
+
+Environment Variables:
+- PROFILE_SAMPLE_RATE: fraction of invocations to profile, 0 disables (default 0)
+- PROFILE_OUTPUT: local directory or s3://bucket/prefix for profiles
+- PROFILE_ALLOCATIONS: also trace allocations (default true)
+- PROFILE_TRACEMALLOC_FRAMES: stack depth recorded per allocation (default 10)
+"""
+
+import cProfile
+import functools
+import gzip
+import marshal
+import os
+import random
+import tempfile
+import tracemalloc
+import uuid
+from datetime import datetime
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_OUTPUT = os.environ.get('PROFILE_OUTPUT', '/tmp/profiles')
+PROFILE_ALLOCATIONS = os.environ.get('PROFILE_ALLOCATIONS', 'true').lower() == 'true'
+PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', '10'))
+
+
+def _write_profile(relative_path, data):
+    """Write compressed bytes to PROFILE_OUTPUT (local directory or S3 prefix)."""
+    compressed = gzip.compress(data)
+    if PROFILE_OUTPUT.startswith('s3://'):
+        import boto3
+        bucket, _, prefix = PROFILE_OUTPUT[len('s3://'):].partition('/')
+        key = f"{prefix.rstrip('/')}/{relative_path}" if prefix else relative_path
+        boto3.client('s3').put_object(Bucket=bucket, Key=key, Body=compressed)
+        return f"s3://{bucket}/{key}"
+    path = os.path.join(PROFILE_OUTPUT, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(compressed)
+    return path
+
+
+class Profile:
+    """Context manager profiling CPU (cProfile) and allocations (tracemalloc) for one sample."""
+
+    def __init__(self, stage, request_id):
+        self.stage = stage
+        self.request_id = request_id
+        self._profiler = cProfile.Profile()
+        self._owns_tracemalloc = False
+
+    def __enter__(self):
+        if PROFILE_ALLOCATIONS and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.disable()
+        snapshot = tracemalloc.take_snapshot() if self._owns_tracemalloc else None
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        try:
+            self._save(snapshot)
+        except Exception as e:
+            # Profiling must never break the request it observes
+            print(f"❌ Failed to save profile for {self.stage}/{self.request_id}: {e}")
+        return False
+
+    def _save(self, snapshot):
+        base = f"{self.stage}/{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{self.request_id}"
+        self._profiler.create_stats()
+        location = _write_profile(f"{base}.prof.gz", marshal.dumps(self._profiler.stats))
+        print(f"📈 Saved CPU profile: {location}")
+        if snapshot is not None:
+            with tempfile.NamedTemporaryFile(suffix='.tracemalloc') as tmp:
+                snapshot.dump(tmp.name)
+                tmp.seek(0)
+                location = _write_profile(f"{base}.tracemalloc.gz", tmp.read())
+            print(f"📈 Saved allocation snapshot: {location}")
+
+
+def profile_handler(stage):
+    """Decorate a Lambda handler so a sampled fraction of invocations is profiled."""
+    def decorator(handler):
+        if PROFILE_SAMPLE_RATE <= 0:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if random.random() >= PROFILE_SAMPLE_RATE:
+                return handler(event, context)
+            request_id = getattr(context, 'aws_request_id', None) or uuid.uuid4().hex
+            with Profile(stage, request_id):
+                return handler(event, context)
+        return wrapper
+    return decorator
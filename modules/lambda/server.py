@@ -0,0 +1,141 @@
+"""
+Long-running recommendation service for container deployment
+=============================================================
+
+Serves the same recommendations as the Lambda function, but as an asyncio
+HTTP service so concurrent users share endpoint calls: feature matrices from
+concurrent requests are micro-batched (see batching.py) into one SageMaker
+invocation, or one in-process XGBoost predict when MODEL_PATH is set.
+
+Routes:
+- POST /recommendations  body {"user_id": ...} -> {"recommendations": [...]}
+- GET  /ping             health check with batching stats
+
+Environment Variables:
+- ENDPOINT_NAME: SageMaker endpoint to score on (unless MODEL_PATH is set)
+- MODEL_PATH: local XGBoost model file for in-process scoring
+- KINESIS_STREAM: optional stream to publish requests to, like the Lambda
+- TRENDING_*: trending blend and fallback, as in lambda_function.py
+- MAX_BATCH_ROWS, MAX_WAIT_MS, MAX_QUEUE, MAX_INFLIGHT: batching settings
+- PORT: listen port (default 8080)
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import boto3
+from aiohttp import web
+
+import lambda_function
+from batching import MicroBatcher, Overloaded
+
+
+def make_scorer():
+    """Score in-process with a local XGBoost model if MODEL_PATH is set, else on the endpoint."""
+    model_path = os.environ.get('MODEL_PATH')
+    if not model_path:
+        return lambda_function.score_features
+
+    import xgboost as xgb
+    booster = xgb.Booster()
+    booster.load_model(model_path)
+    print(f"✅ Loaded in-process model from {model_path}")
+    return lambda features: booster.predict(xgb.DMatrix(features, feature_names=lambda_function.FEATURE_COLUMNS))
+
+
+def spawn(app, coro):
+    """Run coro in the background, holding a reference until it finishes so shutdown can await it."""
+    task = asyncio.get_running_loop().create_task(coro)
+    app['background_tasks'].add(task)
+    task.add_done_callback(app['background_tasks'].discard)
+
+
+async def publish_to_kinesis(app, body, recommendations):
+    stream_name = os.environ.get('KINESIS_STREAM')
+    if not stream_name:
+        return
+    record_json = json.dumps({
+        **body,
+        'timestamp': datetime.utcnow().isoformat(),
+        'source': 'recommendation-service',
+        "recommendations": recommendations
+    })
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, lambda: app['kinesis'].put_record(
+            StreamName=stream_name, Data=record_json, PartitionKey=str(hash(record_json) % 1000)))
+    except Exception as kinesis_error:
+        print(f"❌ Failed to send data to Kinesis: {str(kinesis_error)}")
+
+
+async def handle_recommendations(request):
+    loop = asyncio.get_running_loop()
+    try:
+        body = await request.json()
+        user_id = lambda_function.validate_request(body)
+    except (ValueError, json.JSONDecodeError) as e:
+        return web.json_response({'error': str(e), 'message': 'Invalid request'}, status=400)
+
+    try:
+        product_ids, features = await loop.run_in_executor(None, lambda_function.fetch_user_feature_matrix, user_id)
+        if product_ids is not None:
+            probs = await request.app['batcher'].submit(features)
+            recommendations = await loop.run_in_executor(
+                None, lambda: lambda_function.rank_top_k(product_ids, lambda_function.blend_trending(product_ids, probs)))
+        else:
+            recommendations = await loop.run_in_executor(None, lambda_function.trending_recommendations)
+    except Overloaded as e:
+        return web.json_response({'error': str(e), 'message': 'Service overloaded, retry later'},
+                                 status=503, headers={'Retry-After': '1'})
+    except Exception as e:
+        print(f"❌ Error in handle_recommendations: {str(e)}")
+        return web.json_response({'error': str(e), 'error_type': type(e).__name__,
+                                  'message': 'Failed to process request'}, status=500)
+
+    spawn(request.app, publish_to_kinesis(request.app, body, recommendations))
+    return web.json_response({'message': 'Recommendations generated successfully',
+                              'recommendations': recommendations})
+
+
+async def handle_ping(request):
+    return web.json_response({'status': 'ok', 'batching': request.app['batcher'].stats,
+                              'queue_depth': request.app['batcher'].queue.qsize()})
+
+
+async def on_startup(app):
+    app['batcher'] = MicroBatcher(
+        make_scorer(),
+        max_batch_rows=int(os.environ.get('MAX_BATCH_ROWS', '2000')),
+        max_wait_ms=float(os.environ.get('MAX_WAIT_MS', '10')),
+        max_queue=int(os.environ.get('MAX_QUEUE', '256')),
+        max_inflight=int(os.environ.get('MAX_INFLIGHT', '2')),
+    )
+    app['batcher'].start()
+    app['kinesis'] = boto3.client('kinesis')
+    app['background_tasks'] = set()
+
+
+async def on_shutdown(app):
+    # Still serving open requests here: score everything already submitted
+    await app['batcher'].stop()
+
+
+async def on_cleanup(app):
+    # Finish the Kinesis publishes of the requests answered before shutdown
+    if app['background_tasks']:
+        await asyncio.gather(*app['background_tasks'], return_exceptions=True)
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post('/recommendations', handle_recommendations)
+    app.router.add_get('/ping', handle_ping)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=int(os.environ.get('PORT', '8080')))
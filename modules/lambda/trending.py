@@ -0,0 +1,231 @@
+"""
+Real-time trending product counters over the Kinesis stream
+===========================================================
+
+Consumes the records lambda_handler publishes to Kinesis and keeps
+sliding-window product frequencies in bounded memory:
+
+- WindowedCountMin: a ring of count-min sketches, one per time slot, so a
+  window of n_slots x slot_s seconds costs n_slots x depth x width counters
+  regardless of how many products are seen, and old slots simply expire.
+- Heavy hitters: a candidate set of at most `capacity` products, re-ranked by
+  their windowed estimate after every batch; the top k form the snapshot.
+
+stream_handler is the Kinesis event source handler. Per shard it keeps its
+sketch state in S3 and publishes a compact JSON snapshot
+
+    s3://<TRENDING_BUCKET>/<TRENDING_PREFIX>/snapshots/<shard_id>.json
+    {"generated_at": ..., "window_s": ..., "events": ..., "top": [[product_id, count], ...]}
+
+which the recommendation Lambda merges across shards (see
+lambda_function.load_trending_scores) to blend into scores or to serve when
+a user has no features.
+
+Environment Variables:
+- TRENDING_BUCKET / TRENDING_PREFIX: where state and snapshots live (prefix default "trending")
+- TRENDING_WINDOW_S, TRENDING_SLOTS: window length and number of expiring slots (3600, 12)
+- TRENDING_WIDTH, TRENDING_DEPTH: count-min sketch size per slot (2048, 4)
+- TRENDING_TOP_K: products per snapshot (100)
+- TRENDING_COUNT_RECOMMENDATIONS: also count recommended products (default false)
+"""
+
+import base64
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+# Mersenne prime for the multiply-add hash family
+_PRIME = np.uint64((1 << 31) - 1)
+
+TRENDING_BUCKET = os.environ.get('TRENDING_BUCKET')
+TRENDING_PREFIX = os.environ.get('TRENDING_PREFIX', 'trending')
+TRENDING_WINDOW_S = float(os.environ.get('TRENDING_WINDOW_S', '3600'))
+TRENDING_SLOTS = int(os.environ.get('TRENDING_SLOTS', '12'))
+TRENDING_WIDTH = int(os.environ.get('TRENDING_WIDTH', '2048'))
+TRENDING_DEPTH = int(os.environ.get('TRENDING_DEPTH', '4'))
+TRENDING_TOP_K = int(os.environ.get('TRENDING_TOP_K', '100'))
+TRENDING_COUNT_RECOMMENDATIONS = os.environ.get('TRENDING_COUNT_RECOMMENDATIONS', 'false').lower() == 'true'
+
+
+class WindowedCountMin:
+    """Sliding-window count-min sketch with heavy-hitter tracking."""
+
+    def __init__(self, window_s=3600, n_slots=12, width=2048, depth=4, top_k=100, capacity=None, seed=7):
+        self.window_s = float(window_s)
+        self.n_slots = n_slots
+        self.slot_s = self.window_s / n_slots
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.capacity = capacity or 4 * top_k
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), depth, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), depth, dtype=np.uint64)
+        self.counts = np.zeros((n_slots, depth, width), dtype=np.int32)
+        # Absolute slot number held by each ring position (-1 = empty)
+        self.slot_ids = np.full(n_slots, -1, dtype=np.int64)
+        self.current_slot = -1
+        self.candidates = np.zeros(0, dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.slot_ids.nbytes + self.candidates.nbytes
+
+    def _hash(self, product_ids):
+        """Bucket index per (row, product) as a (depth, n) array."""
+        x = np.asarray(product_ids, dtype=np.int64).astype(np.uint64) & _PRIME
+        return (((self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME) % np.uint64(self.width)).astype(np.intp)
+
+    def _advance(self, slot):
+        """Move the window forward to `slot`, zeroing the ring positions that expire."""
+        if slot <= self.current_slot:
+            return
+        first = max(self.current_slot + 1, slot - self.n_slots + 1)
+        for s in range(first, slot + 1):
+            pos = s % self.n_slots
+            self.counts[pos] = 0
+            self.slot_ids[pos] = s
+        self.current_slot = slot
+
+    def update(self, product_ids, timestamps):
+        """Count one occurrence per (product_id, timestamp) pair; events older than the window are dropped."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if len(product_ids) == 0:
+            return
+        slots = (np.asarray(timestamps, dtype=np.float64) // self.slot_s).astype(np.int64)
+        self._advance(int(slots.max()))
+        live = slots > self.current_slot - self.n_slots
+        product_ids, slots = product_ids[live], slots[live]
+        buckets = self._hash(product_ids)
+        positions = slots % self.n_slots
+        for d in range(self.depth):
+            np.add.at(self.counts[:, d, :], (positions, buckets[d]), 1)
+        self._refresh_candidates(np.unique(product_ids))
+
+    def estimate(self, product_ids):
+        """Windowed count estimate per product (never an undercount)."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if len(product_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        window = self.counts.sum(axis=0, dtype=np.int64)
+        buckets = self._hash(product_ids)
+        return window[np.arange(self.depth)[:, None], buckets].min(axis=0)
+
+    def _refresh_candidates(self, new_ids):
+        ids = np.union1d(self.candidates, new_ids)
+        estimates = self.estimate(ids)
+        keep = estimates > 0
+        ids, estimates = ids[keep], estimates[keep]
+        if len(ids) > self.capacity:
+            top = np.argpartition(-estimates, self.capacity - 1)[:self.capacity]
+            ids = ids[top]
+        self.candidates = np.sort(ids)
+
+    def top(self, k=None, now=None):
+        """Return [(product_id, estimated_count)] of the k most frequent products, best first."""
+        if now is not None:
+            self._advance(int(now // self.slot_s))
+        k = k or self.top_k
+        estimates = self.estimate(self.candidates)
+        order = np.lexsort((self.candidates, -estimates))[:k]
+        return [(int(self.candidates[i]), int(estimates[i])) for i in order if estimates[i] > 0]
+
+    def total(self):
+        """Events counted in the current window."""
+        return int(self.counts[:, 0, :].sum(dtype=np.int64))
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        top = self.top(now=now)
+        return {"generated_at": now, "window_s": self.window_s, "events": self.total(),
+                "top": [[pid, count] for pid, count in top]}
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, counts=self.counts, slot_ids=self.slot_ids, candidates=self.candidates,
+                            params=np.array([self.window_s, self.n_slots, self.width, self.depth,
+                                             self.top_k, self.capacity, self.seed, self.current_slot],
+                                            dtype=np.float64))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        window_s, n_slots, width, depth, top_k, capacity, seed, current_slot = arrays["params"]
+        sketch = cls(window_s, int(n_slots), int(width), int(depth), int(top_k), int(capacity), int(seed))
+        sketch.counts = arrays["counts"]
+        sketch.slot_ids = arrays["slot_ids"]
+        sketch.candidates = arrays["candidates"]
+        sketch.current_slot = int(current_slot)
+        return sketch
+
+
+def extract_product_ids(record, count_recommendations=False):
+    """Product ids of one published request: its product_ids plus, optionally, what was recommended."""
+    product_ids = []
+    for pid in record.get('product_ids') or []:
+        try:
+            product_ids.append(int(pid))
+        except (TypeError, ValueError):
+            continue
+    if count_recommendations:
+        for rec in record.get('recommendations') or []:
+            try:
+                product_ids.append(int(rec['product_id']))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return product_ids
+
+
+def _new_sketch():
+    return WindowedCountMin(TRENDING_WINDOW_S, TRENDING_SLOTS, TRENDING_WIDTH, TRENDING_DEPTH, TRENDING_TOP_K)
+
+
+def _load_state(s3, shard_id):
+    """Load a shard's sketch from S3, starting fresh if there is none or its shape changed."""
+    try:
+        obj = s3.get_object(Bucket=TRENDING_BUCKET, Key=f"{TRENDING_PREFIX}/state/{shard_id}.npz")
+        sketch = WindowedCountMin.from_bytes(obj['Body'].read())
+        if (sketch.window_s, sketch.n_slots, sketch.width, sketch.depth) == \
+                (TRENDING_WINDOW_S, TRENDING_SLOTS, TRENDING_WIDTH, TRENDING_DEPTH):
+            return sketch
+        print(f"⚠️ Sketch settings changed, resetting state for {shard_id}")
+    except s3.exceptions.NoSuchKey:
+        print(f"⚠️ No trending state for {shard_id}, starting fresh")
+    return _new_sketch()
+
+
+def stream_handler(event, context):
+    """Kinesis event source handler: update each shard's sketch and publish its snapshot."""
+    import boto3
+    s3 = boto3.client('s3')
+
+    by_shard = {}
+    for record in event.get('Records', []):
+        shard_id = record['eventID'].split(':')[0]
+        try:
+            data = json.loads(base64.b64decode(record['kinesis']['data']))
+        except (ValueError, KeyError) as e:
+            print(f"❌ Skipping malformed record {record.get('eventID')}: {e}")
+            continue
+        product_ids = extract_product_ids(data, TRENDING_COUNT_RECOMMENDATIONS)
+        arrival = float(record['kinesis'].get('approximateArrivalTimestamp', time.time()))
+        ids, times = by_shard.setdefault(shard_id, ([], []))
+        ids.extend(product_ids)
+        times.extend([arrival] * len(product_ids))
+
+    for shard_id, (ids, times) in by_shard.items():
+        sketch = _load_state(s3, shard_id)
+        sketch.update(ids, times)
+        snapshot = sketch.snapshot()
+        s3.put_object(Bucket=TRENDING_BUCKET, Key=f"{TRENDING_PREFIX}/state/{shard_id}.npz", Body=sketch.to_bytes())
+        s3.put_object(Bucket=TRENDING_BUCKET, Key=f"{TRENDING_PREFIX}/snapshots/{shard_id}.json",
+                      Body=json.dumps(snapshot).encode('utf-8'), ContentType='application/json')
+        print(f"📈 {shard_id}: {len(ids)} product events, {snapshot['events']} in window, "
+              f"top {snapshot['top'][:3]}")
+
+    return {'shards': len(by_shard)}
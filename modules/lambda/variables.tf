@@ -41,14 +41,14 @@ variable "lambda_bucket" {
 
 variable "scaler_bucket" {
   type        = string
-  description = "Name of the S3 bucket for scaler.pkl"
+  description = "Name of the S3 bucket holding the scaler parameters exported by the Glue job"
   default     = "imba-chien-data-features-dev"
 }
 
 variable "scaler_key" {
   type        = string
-  description = "Key of the scaler.pkl in S3"
-  default     = "scale_models/scaler.pkl"
+  description = "Key of the scaler mean/scale JSON in S3"
+  default     = "scale_models/scaler_params.json"
 }
 
 variable "lambda_architecture" {
@@ -66,3 +66,74 @@ variable "glue_sagemaker_lambda_security_group_id" {
   type        = string
   description = "ID of the glue_sagemaker_lambda security group"
 }
+
+variable "profile_sample_rate" {
+  type        = number
+  description = "Fraction of invocations profiled with cProfile/tracemalloc (0 disables profiling)"
+  default     = 0
+}
+
+variable "profile_output" {
+  type        = string
+  description = "Local directory or s3://bucket/prefix for compressed profiles"
+  default     = "/tmp/profiles"
+}
+
+variable "feature_format" {
+  type        = string
+  description = "Feature format stored in user_product_features: scaled or raw (scaled at serve time)"
+  default     = "scaled"
+}
+
+variable "trending_enabled" {
+  type        = bool
+  description = "Deploy the Kinesis consumer that maintains trending product counters"
+  default     = false
+}
+
+variable "trending_weight" {
+  type        = number
+  description = "Weight of trending popularity blended into recommendation scores (0 disables blending)"
+  default     = 0
+}
+
+variable "trending_window_s" {
+  type        = number
+  description = "Sliding window of the trending counters in seconds"
+  default     = 3600
+}
+
+variable "trending_sketch_width" {
+  type        = number
+  description = "Count-min sketch width per time slot; memory is slots x depth x width x 4 bytes"
+  default     = 2048
+}
+
+variable "table_versions_table_name" {
+  type        = string
+  description = "DynamoDB table whose \"current\" item names the live feature table versions"
+  default     = "table_versions"
+}
+
+variable "candidate_expansion" {
+  type        = number
+  description = "Similar products added per request from the embedding index (0 disables expansion)"
+  default     = 0
+}
+
+variable "cooccurrence_expansion" {
+  type        = number
+  description = "Bought-together products added per request from the co-occurrence lists (0 disables expansion)"
+  default     = 0
+}
+
+variable "endpoint_mode" {
+  type        = string
+  description = "features: send feature rows to the endpoint; user_ids: the endpoint fetches features and ranks"
+  default     = "features"
+
+  validation {
+    condition     = contains(["features", "user_ids"], var.endpoint_mode)
+    error_message = "endpoint_mode must be features or user_ids."
+  }
+}
@@ -0,0 +1,232 @@
+"""
+Custom inference entry point for the XGBoost endpoint
+=====================================================
+
+Installed as SAGEMAKER_PROGRAM of the model created by the CreateModel step
+(custom_inference_enabled in the step-functions module). Callers send only
+user ids; features are read next to the model and the ranked top-k returned:
+
+    POST application/json {"user_ids": [1569, 42], "k": 10}
+    -> {"results": [{"user_id": 1569, "product_ids": [...], "scores": [...]}, ...]}
+
+Each serving process keeps user features in an LRU cache for
+FEATURE_CACHE_TTL_S, so it is shared by every Lambda container calling the
+endpoint instead of being rebuilt per container. Cache keys include the live
+feature table version, so a blue/green cutover never serves stale features
+past the pointer refresh.
+
+text/csv feature rows are still scored one probability per line, like the
+built-in handler, so callers that send features keep working.
+
+Environment Variables:
+- FEATURE_TABLE: DynamoDB feature table (default user_product_features)
+- TABLE_VERSION_TABLE: pointer table naming the live table versions (optional)
+- FEATURE_FORMAT: "scaled" or "raw" (scaled here with the exported scaler)
+- SCALER_BUCKET / SCALER_KEY: scaler mean/scale JSON exported by the Glue job, required when raw
+- FEATURE_CACHE_SIZE: users kept in the feature cache (default 100000)
+- FEATURE_CACHE_TTL_S: seconds a cached user stays valid (default 300)
+- DEFAULT_TOP_K: products returned per user when a request has no "k" (default 10)
+"""
+
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+import boto3
+import numpy as np
+import xgboost as xgb
+
+REGION = os.environ.get('AWS_REGION', 'ap-southeast-2')
+FEATURE_TABLE = os.environ.get('FEATURE_TABLE', 'user_product_features')
+TABLE_VERSION_TABLE = os.environ.get('TABLE_VERSION_TABLE')
+TABLE_VERSION_TTL_S = float(os.environ.get('TABLE_VERSION_TTL_S', '30'))
+FEATURE_FORMAT = os.environ.get('FEATURE_FORMAT', 'scaled')
+SCALER_BUCKET = os.environ.get('SCALER_BUCKET')
+SCALER_KEY = os.environ.get('SCALER_KEY', 'scale_models/scaler_params.json')
+FEATURE_CACHE_SIZE = int(os.environ.get('FEATURE_CACHE_SIZE', '100000'))
+FEATURE_CACHE_TTL_S = float(os.environ.get('FEATURE_CACHE_TTL_S', '300'))
+DEFAULT_TOP_K = int(os.environ.get('DEFAULT_TOP_K', '10'))
+MAX_USERS_PER_REQUEST = 100
+
+FEATURE_COLUMNS = ['user_orders_scaled', 'user_periods_scaled', 'user_mean_days_since_prior_scaled',
+                   'user_products_scaled', 'user_distinct_products_scaled', 'user_reorder_ratio_scaled',
+                   'prod_orders_scaled', 'prod_reorders_scaled', 'prod_first_orders_scaled', 'prod_second_orders_scaled']
+RAW_FEATURE_COLUMNS = [c[:-len('_scaled')] for c in FEATURE_COLUMNS]
+STORED_FEATURE_COLUMNS = RAW_FEATURE_COLUMNS if FEATURE_FORMAT == 'raw' else FEATURE_COLUMNS
+# The Glue job omits NaN/inf feature attributes; read them as 0, like its fillna(0)
+MISSING_FEATURE = {'N': '0'}
+
+dynamodb_client = boto3.client('dynamodb', region_name=REGION)
+
+
+class FeatureCache:
+    """Thread-safe LRU of per-user (product_ids, X) with a time-to-live."""
+
+    def __init__(self, max_users, ttl_s):
+        self.max_users = max_users
+        self.ttl_s = ttl_s
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or now - entry[0] > self.ttl_s:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_users:
+                self._items.popitem(last=False)
+
+
+_feature_cache = FeatureCache(FEATURE_CACHE_SIZE, FEATURE_CACHE_TTL_S)
+_table_versions = {'loaded_at': 0.0, 'tables': {}}
+_scaler_params = None
+
+
+def resolve_table(table_name):
+    """Return the live versioned table for a feature table, or the table itself without a pointer."""
+    if not TABLE_VERSION_TABLE:
+        return table_name
+    now = time.time()
+    if now - _table_versions['loaded_at'] >= TABLE_VERSION_TTL_S:
+        _table_versions['loaded_at'] = now
+        try:
+            item = dynamodb_client.get_item(TableName=TABLE_VERSION_TABLE,
+                                            Key={'pointer': {'S': 'current'}}).get('Item')
+            _table_versions['tables'] = {name: value['S'] for name, value in item['tables']['M'].items()} \
+                if item else {}
+        except Exception as e:
+            # Keep reading the last known versions
+            print(f"❌ Failed to read table versions: {e}")
+    return _table_versions['tables'].get(table_name, table_name)
+
+
+def load_scaler_params():
+    """(mean, 1 / scale) from the scaler JSON the Glue job exports, loaded once per process."""
+    global _scaler_params
+    if _scaler_params is None:
+        if not SCALER_BUCKET:
+            raise ValueError("SCALER_BUCKET must be set when FEATURE_FORMAT is raw")
+        obj = boto3.client('s3', region_name=REGION).get_object(Bucket=SCALER_BUCKET, Key=SCALER_KEY)
+        params = json.loads(obj['Body'].read())
+        scale = np.asarray(params['scale'], dtype=np.float64)
+        _scaler_params = (np.asarray(params['mean'], dtype=np.float32),
+                          (1.0 / np.where(scale == 0, 1.0, scale)).astype(np.float32))
+    return _scaler_params
+
+
+def query_user_features(table, user_id):
+    """(product_ids, X) of a user's candidates in model feature order; empty arrays if none."""
+    names = {f"#c{i}": c for i, c in enumerate(['product_id'] + STORED_FEATURE_COLUMNS)}
+    query_args = {
+        'TableName': table,
+        'KeyConditionExpression': 'user_id = :uid',
+        'ExpressionAttributeValues': {':uid': {'N': str(user_id)}},
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+    }
+    items = []
+    while True:
+        response = dynamodb_client.query(**query_args)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    n = len(items)
+    product_ids = np.fromiter((item['product_id']['N'] for item in items), dtype=np.int64, count=n)
+    X = np.fromiter((item.get(c, MISSING_FEATURE)['N'] for item in items for c in STORED_FEATURE_COLUMNS),
+                    dtype=np.float32, count=n * len(STORED_FEATURE_COLUMNS)).reshape(n, len(STORED_FEATURE_COLUMNS))
+    if FEATURE_FORMAT == 'raw' and n:
+        mean, inv_scale = load_scaler_params()
+        X -= mean
+        X *= inv_scale
+    return product_ids, X
+
+
+def user_features(user_ids):
+    """Features of each user, from the process cache or DynamoDB (misses are queried concurrently)."""
+    table = resolve_table(FEATURE_TABLE)
+    features = {user_id: _feature_cache.get((table, user_id)) for user_id in user_ids}
+    misses = [user_id for user_id, value in features.items() if value is None]
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(8, len(misses))) as executor:
+            for user_id, value in zip(misses, executor.map(lambda u: query_user_features(table, u), misses)):
+                _feature_cache.put((table, user_id), value)
+                features[user_id] = value
+    return features
+
+
+def model_fn(model_dir):
+    """Load the booster saved by the training job (native format, or pickled by older containers)."""
+    path = os.path.join(model_dir, "xgboost-model")
+    booster = xgb.Booster()
+    try:
+        booster.load_model(path)
+    except xgb.core.XGBoostError:
+        with open(path, "rb") as f:
+            booster = pickle.load(f)
+    print(f"✅ Model loaded from {path}")
+    return booster
+
+
+def input_fn(request_body, request_content_type):
+    """JSON user-id requests, or CSV feature rows as with the built-in handler."""
+    if isinstance(request_body, bytes):
+        request_body = request_body.decode('utf-8')
+    content_type = (request_content_type or '').split(';')[0].strip()
+    if content_type == 'application/json':
+        data = json.loads(request_body)
+        user_ids = data.get('user_ids', [data['user_id']] if 'user_id' in data else None)
+        if not user_ids:
+            raise ValueError("Request must contain 'user_ids' or 'user_id'")
+        if len(user_ids) > MAX_USERS_PER_REQUEST:
+            raise ValueError(f"At most {MAX_USERS_PER_REQUEST} user_ids per request")
+        return {'user_ids': [int(u) for u in user_ids], 'k': max(1, int(data.get('k', DEFAULT_TOP_K)))}
+    if content_type == 'text/csv':
+        return {'rows': np.atleast_2d(np.loadtxt(StringIO(request_body), delimiter=',', dtype=np.float32))}
+    raise ValueError(f"Unsupported content type: {request_content_type}")
+
+
+def predict_fn(input_data, model):
+    if 'rows' in input_data:
+        return {'probabilities': model.predict(xgb.DMatrix(input_data['rows']))}
+
+    user_ids, k = input_data['user_ids'], input_data['k']
+    features = user_features(user_ids)
+    # One DMatrix for every user's candidates, then a partial top-k per user
+    X = np.vstack([features[u][1] for u in user_ids])
+    scores = model.predict(xgb.DMatrix(X)) if len(X) else np.zeros(0, dtype=np.float32)
+    results, offset = [], 0
+    for user_id in user_ids:
+        product_ids = features[user_id][0]
+        user_scores = scores[offset:offset + len(product_ids)]
+        offset += len(product_ids)
+        top = np.argpartition(-user_scores, k - 1)[:k] if len(user_scores) > k else np.arange(len(user_scores))
+        top = top[np.argsort(-user_scores[top], kind='stable')]
+        results.append({'user_id': user_id, 'product_ids': product_ids[top].tolist(),
+                        'scores': user_scores[top].astype(float).tolist()})
+    print(f"🎯 Ranked {len(X)} candidates for {len(user_ids)} users "
+          f"(feature cache hits {_feature_cache.hits}, misses {_feature_cache.misses})")
+    return {'results': results}
+
+
+def output_fn(prediction, accept):
+    if 'probabilities' in prediction:
+        return '\n'.join(str(float(p)) for p in prediction['probabilities'])
+    return json.dumps(prediction)
@@ -66,6 +66,57 @@ resource "aws_iam_role_policy_attachment" "sfn_policy_attach" {
   policy_arn = aws_iam_policy.sfn_policy.arn
 }
 
+# Training script (other_scripts/training_job.py), run by the training step in
+# script mode on the sagemaker-xgboost:1.7-1 image (xgboost 1.7). The package is
+# rebuilt on every plan, so no manual build step is needed.
+data "external" "training_code" {
+  program = ["python3", "${path.module}/package_source.py"]
+  query = {
+    output = "${path.module}/build/training/sourcedir.tar.gz"
+    files  = jsonencode({ "training_job.py" = abspath("${path.module}/../../other_scripts/training_job.py") })
+  }
+}
+
+resource "aws_s3_object" "training_code" {
+  bucket = var.input_bucket
+  key    = "training/sourcedir.tar.gz"
+  source = data.external.training_code.result.path
+  etag   = data.external.training_code.result.md5
+}
+
+# Custom inference handler (inference/inference.py): the endpoint takes user ids,
+# reads their features from DynamoDB through a per-process cache and returns the
+# ranked top-k. Packaged on plan like the training script.
+data "external" "inference_code" {
+  count   = var.custom_inference_enabled ? 1 : 0
+  program = ["python3", "${path.module}/package_source.py"]
+  query = {
+    output = "${path.module}/build/inference/sourcedir.tar.gz"
+    files  = jsonencode({ "inference.py" = abspath("${path.module}/inference/inference.py") })
+  }
+}
+
+resource "aws_s3_object" "inference_code" {
+  count  = var.custom_inference_enabled ? 1 : 0
+  bucket = var.input_bucket
+  key    = "inference/sourcedir.tar.gz"
+  source = data.external.inference_code[0].result.path
+  etag   = data.external.inference_code[0].result.md5
+}
+
+locals {
+  # Container environment of the CreateModel step; empty keeps the built-in CSV handler
+  inference_environment = var.custom_inference_enabled ? {
+    SAGEMAKER_PROGRAM          = "inference.py"
+    SAGEMAKER_SUBMIT_DIRECTORY = "s3://${var.input_bucket}/inference/sourcedir.tar.gz"
+    FEATURE_FORMAT             = var.feature_format
+    SCALER_BUCKET              = var.input_bucket
+    TABLE_VERSION_TABLE        = var.table_versions_table_name
+    FEATURE_CACHE_SIZE         = tostring(var.feature_cache_size)
+    FEATURE_CACHE_TTL_S        = tostring(var.feature_cache_ttl_s)
+  } : {}
+}
+
 resource "aws_sfn_state_machine" "sagemaker_workflow" {
   name     = "sagemaker-workflow-${var.env}"
   role_arn = aws_iam_role.sfn_role.arn
@@ -80,7 +131,10 @@ resource "aws_sfn_state_machine" "sagemaker_workflow" {
     endpoint_config_name                    = var.endpoint_config_name,
     sagemaker_execution_role_arn            = aws_iam_role.sagemaker_execution_role.arn,
     private_subnet_ids                      = jsonencode(var.private_subnet_ids),
-    glue_sagemaker_lambda_security_group_id = var.glue_sagemaker_lambda_security_group_id
+    glue_sagemaker_lambda_security_group_id = var.glue_sagemaker_lambda_security_group_id,
+    training_instance_count                 = var.training_instance_count,
+    training_code_uri                       = "s3://${var.input_bucket}/${aws_s3_object.training_code.key}",
+    inference_environment                   = jsonencode(local.inference_environment)
   })
 
   tags = {
@@ -139,3 +193,32 @@ resource "aws_iam_role_policy" "sagemaker_s3_policy" {
     ]
   })
 }
+
+# Feature reads of the custom inference handler
+resource "aws_iam_role_policy" "sagemaker_dynamodb_policy" {
+  count = var.custom_inference_enabled ? 1 : 0
+  name  = "sagemaker-dynamodb-policy-${var.env}"
+  role  = aws_iam_role.sagemaker_execution_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:Query"
+        ]
+        Resource = [
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/user_product_features",
+          # Blue/green versions (<table>-<run_id>) and the pointer naming the live one
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/user_product_features-*",
+          "arn:aws:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/${var.table_versions_table_name}"
+        ]
+      }
+    ]
+  })
+}
+
+data "aws_region" "current" {}
+data "aws_caller_identity" "current" {}
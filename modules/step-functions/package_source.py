@@ -0,0 +1,43 @@
+"""
+Build a SageMaker source package (sourcedir.tar.gz) for a Terraform "external"
+data source, so `terraform plan` works from a clean checkout.
+
+Reads the query JSON on stdin:
+    {"output": "<path>.tar.gz", "files": "{\"<name in archive>\": \"<source path>\", ...}"}
+and prints {"path": ..., "md5": ...}. Timestamps and owners are fixed, so the
+archive (and its md5) only changes when the files do.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+
+
+def build(output, files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name in sorted(files):
+            with open(files[name], "rb") as f:
+                data = f.read()
+            info = tarfile.TarInfo(name)
+            info.size, info.mode, info.mtime = len(data), 0o644, 0
+            tar.addfile(info, io.BytesIO(data))
+    archive = gzip.compress(buffer.getvalue(), mtime=0)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(archive)
+    return hashlib.md5(archive).hexdigest()
+
+
+def main():
+    query = json.load(sys.stdin)
+    md5 = build(query["output"], json.loads(query["files"]))
+    json.dump({"path": query["output"], "md5": md5}, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -49,3 +49,39 @@ variable "glue_sagemaker_lambda_security_group_id" {
   description = "The ID of the glue_sagemaker_lambda security group"
   type        = string
 }
+
+variable "training_instance_count" {
+  description = "Number of SageMaker training instances; above 1 each instance trains on its own S3 shard"
+  type        = number
+  default     = 1
+}
+
+variable "custom_inference_enabled" {
+  description = "Deploy the model with inference/inference.py, which takes user ids and returns the ranked top-k"
+  type        = bool
+  default     = false
+}
+
+variable "feature_format" {
+  description = "Feature format stored in user_product_features: scaled or raw (scaled by the inference handler)"
+  type        = string
+  default     = "scaled"
+}
+
+variable "table_versions_table_name" {
+  description = "DynamoDB table whose \"current\" item names the live feature table versions"
+  type        = string
+  default     = "table_versions"
+}
+
+variable "feature_cache_size" {
+  description = "Users whose features each inference worker keeps cached"
+  type        = number
+  default     = 100000
+}
+
+variable "feature_cache_ttl_s" {
+  description = "Seconds a user's cached features stay valid in the inference handler"
+  type        = number
+  default     = 300
+}
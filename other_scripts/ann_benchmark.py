@@ -0,0 +1,101 @@
+"""
+Recall vs. latency of the product embedding index in modules/lambda/ann_index.py.
+
+Loads an IVF index written by the Glue job (--build_embeddings true), or builds
+one over synthetic clustered embeddings, and for each nprobe compares the
+approximate top-k of sampled queries with brute-force search:
+
+- recall@k: share of the exact top-k the index also returns
+- single-query latency p50/p99 in milliseconds
+- share of the vectors scanned per query
+
+Usage:
+    python ann_benchmark.py --products 50000 --dim 32 --lists 256
+    python ann_benchmark.py --index ./features_local/embeddings/product_ivf/latest.npz
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules", "lambda"))
+from ann_index import IVFIndex, build_ivf, exact_search  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', type=str, default=None, help="IVF index .npz written by the Glue job")
+    parser.add_argument('--products', type=int, default=49_688)
+    parser.add_argument('--dim', type=int, default=32)
+    parser.add_argument('--lists', type=int, default=256)
+    parser.add_argument('--clusters', type=int, default=500, help="Topics in the synthetic embeddings")
+    parser.add_argument('--nprobes', type=str, default='1,2,4,8,16,32')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=str, default='ann_benchmark.json')
+    return parser.parse_args()
+
+
+def synthetic_embeddings(n_products, dim, n_clusters, seed):
+    """Unit vectors scattered around random topic directions, like item2vec output."""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_clusters, dim))
+    vectors = topics[rng.integers(0, n_clusters, n_products)] + 0.6 * rng.normal(size=(n_products, dim))
+    return np.arange(1, n_products + 1), vectors.astype(np.float32)
+
+
+def evaluate(index, queries, exact, nprobe, k):
+    recalls, latencies, scanned = [], [], []
+    for query, truth in zip(queries, exact):
+        t0 = time.perf_counter()
+        rows, _ = index.search(query, k=k, nprobe=nprobe)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        recalls.append(len(np.intersect1d(rows, truth)) / k)
+        lists = np.argsort(-(index.centroids @ query))[:nprobe]
+        scanned.append(int(sum(index.offsets[i + 1] - index.offsets[i] for i in lists)))
+    return {"nprobe": nprobe, f"recall_at_{k}": round(float(np.mean(recalls)), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "scanned_share": round(float(np.mean(scanned)) / len(index.vectors), 4)}
+
+
+def main():
+    args = parse_args()
+    if args.index:
+        with open(args.index, "rb") as f:
+            index = IVFIndex.load(f.read())
+        print(f"📥 Loaded index of {len(index.product_ids)} products in {index.nlist} lists from {args.index}")
+    else:
+        product_ids, vectors = synthetic_embeddings(args.products, args.dim, args.clusters, args.seed)
+        t0 = time.perf_counter()
+        index = build_ivf(product_ids, vectors, nlist=args.lists, seed=args.seed)
+        print(f"🧪 Built index of {len(product_ids)} synthetic products in {index.nlist} lists "
+              f"({time.perf_counter() - t0:.1f}s)")
+
+    rng = np.random.default_rng(args.seed)
+    # Query with indexed products, as candidate expansion does
+    queries = index.vectors[rng.choice(len(index.vectors), min(args.queries, len(index.vectors)), replace=False)]
+    t0 = time.perf_counter()
+    exact = [exact_search(index.vectors, query, args.k) for query in queries]
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    results = [evaluate(index, queries, exact, int(nprobe), args.k) for nprobe in args.nprobes.split(',')]
+    print(f"{'nprobe':>7}{f'recall@{args.k}':>11}{'p50 ms':>9}{'p99 ms':>9}{'scanned':>9}")
+    for r in results:
+        print(f"{r['nprobe']:>7}{r[f'recall_at_{args.k}']:>11.3f}{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+              f"{r['scanned_share']:>9.1%}")
+    print(f"Brute force: {exact_ms:.3f} ms per query")
+
+    with open(args.output, "w") as f:
+        json.dump({"products": len(index.vectors), "dim": int(index.vectors.shape[1]), "lists": index.nlist,
+                   "k": args.k, "exact_ms": round(exact_ms, 3), "results": results}, f, indent=2)
+    print(f"✅ Saved benchmark results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
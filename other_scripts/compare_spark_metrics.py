@@ -0,0 +1,95 @@
+"""
+Compare the per-step Spark metrics reports of Glue feature engineering runs.
+
+Each run writes features/_reports/spark_metrics/<run_id>.json (see
+SparkMetricsCollector in modules/glue-job/features.py). This prints one table
+per metric with a row per pipeline step and a column per run, oldest first,
+and flags steps whose value grew by more than --threshold between the last
+two runs.
+
+Usage:
+    python compare_spark_metrics.py ./features_local/features/_reports/spark_metrics
+    python compare_spark_metrics.py s3://bucket/features/_reports/spark_metrics --runs 5
+"""
+
+import argparse
+import json
+import os
+import sys
+
+METRICS = {
+    "duration_s": ("time s", 1),
+    "shuffle_bytes": ("shuffle MB", 2**20),
+    "spill_bytes": ("spill MB", 2**20),
+    "gc_share": ("GC share", 1),
+    "max_skew_ratio": ("skew max/median", 1),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('reports', type=str, help="Report directory (local or s3://)")
+    parser.add_argument('--runs', type=int, default=5, help="Most recent runs to compare")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative growth flagged as a regression")
+    return parser.parse_args()
+
+
+def load_reports(path, n_runs):
+    """The n most recent reports, oldest first (report names sort by run id)."""
+    if path.startswith("s3://"):
+        import boto3
+        s3 = boto3.client('s3')
+        bucket, _, prefix = path[len("s3://"):].partition("/")
+        keys = []
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix.rstrip("/") + "/"):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []) if obj["Key"].endswith(".json"))
+        return [json.load(s3.get_object(Bucket=bucket, Key=key)["Body"]) for key in sorted(keys)[-n_runs:]]
+    names = sorted(name for name in os.listdir(path) if name.endswith(".json"))[-n_runs:]
+    reports = []
+    for name in names:
+        with open(os.path.join(path, name)) as f:
+            reports.append(json.load(f))
+    return reports
+
+
+def step_values(step):
+    return {
+        "duration_s": step["duration_s"],
+        "shuffle_bytes": step["shuffle_read_bytes"] + step["shuffle_write_bytes"],
+        "spill_bytes": step["memory_spill_bytes"] + step["disk_spill_bytes"],
+        "gc_share": step["gc_share"],
+        "max_skew_ratio": step["max_skew_ratio"],
+    }
+
+
+def main():
+    args = parse_args()
+    reports = load_reports(args.reports, args.runs)
+    if not reports:
+        print(f"❌ No reports found in {args.reports}")
+        sys.exit(1)
+    runs = [r["run_id"] for r in reports]
+    values = [{s["step"]: step_values(s) for s in r["steps"]} for r in reports]
+    steps = list(dict.fromkeys(step for run in values for step in run))
+    print(f"📊 Comparing {len(runs)} runs: {', '.join(runs)}")
+
+    regressions = []
+    for metric, (label, unit) in METRICS.items():
+        print(f"\n{label}")
+        print(f"{'step':<32}" + "".join(f"{run:>18}" for run in runs))
+        for step in steps:
+            cells = [run.get(step, {}).get(metric) for run in values]
+            print(f"{step:<32}" + "".join(f"{'-' if v is None else f'{v / unit:.2f}':>18}" for v in cells))
+            if len(cells) >= 2 and cells[-2] and cells[-1] is not None \
+                    and cells[-1] > cells[-2] * (1 + args.threshold):
+                regressions.append(f"{step}: {label} {cells[-2] / unit:.2f} -> {cells[-1] / unit:.2f}")
+
+    print()
+    for message in regressions:
+        print(f"⚠️ {message}")
+    if not regressions:
+        print("✅ No step regressed beyond the threshold in the latest run")
+
+
+if __name__ == "__main__":
+    main()
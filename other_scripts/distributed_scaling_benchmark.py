@@ -0,0 +1,60 @@
+"""
+Measure scaling efficiency of training_job.py's distributed mode on one
+machine: the same dataset is trained with 1, 2, 4, ... local workers (each
+reading its own Parquet shards, threads split evenly) and the speedup and
+efficiency relative to one worker are reported.
+
+Usage:
+    python distributed_scaling_benchmark.py --rows 4000000 --workers 1,2,4
+"""
+
+import argparse
+import os
+import tempfile
+
+import training_benchmark
+import training_job
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--train_dir', type=str, default=None)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--files', type=int, default=16)
+    parser.add_argument('--workers', type=str, default='1,2,4')
+    parser.add_argument('--num_round', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix="dist_bench_")
+    train_dir = args.train_dir
+    if train_dir is None:
+        train_dir = os.path.join(work_dir, "train_scaled")
+        print(f"📊 Generating {args.rows} synthetic rows in {args.files} shards")
+        training_benchmark.make_dataset(train_dir, args.rows, args.users, args.seed, n_files=args.files)
+
+    timings = {}
+    for n_workers in [int(n) for n in args.workers.split(',')]:
+        # Fixed round count (no early stopping) so every run does the same work
+        job_args = training_job.parse_args(["--num_round", str(args.num_round), "--early_stopping_rounds", "0",
+                                            "--validation_fraction", "0", "--local_workers", str(n_workers),
+                                            "--seed", str(args.seed)])
+        model_dir = os.path.join(work_dir, f"model-{n_workers}")
+        os.makedirs(model_dir, exist_ok=True)
+        print(f"⏱️ Training with {n_workers} worker(s)...")
+        timings[n_workers] = training_job.run_local_cluster(job_args, train_dir, model_dir)
+
+    base_workers = min(timings)
+    base = timings[base_workers] * base_workers
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}{'efficiency':>12}")
+    for n_workers, seconds in sorted(timings.items()):
+        speedup = base / seconds
+        print(f"{n_workers:>8}{seconds:>10.1f}{speedup:>10.2f}{speedup / n_workers:>12.1%}")
+
+
+if __name__ == "__main__":
+    main()
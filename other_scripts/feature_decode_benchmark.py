@@ -0,0 +1,95 @@
+"""
+Benchmark the Lambda's feature decoding and ranking paths on synthetic
+DynamoDB query results:
+
+- current: Table resource items (Decimal) -> convert_decimals -> DataFrame
+           -> feature columns -> sort_values().head(10)
+- fast:    low-level client items ({'N': '...'}) -> float32 matrix via
+           decode_feature_items -> argpartition top-k
+
+Reports median latency and peak traced memory at several candidate counts.
+
+Usage:
+    python feature_decode_benchmark.py --candidates 100,1000,10000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-southeast-2')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules", "lambda"))
+import lambda_function  # noqa: E402
+from lambda_function import FEATURE_COLUMNS  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=str, default='100,1000,10000')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def make_items(n, rng):
+    """The same rows as the resource API (Decimal) and the low-level client ({'N': str}) return them."""
+    values = rng.standard_normal((n, len(FEATURE_COLUMNS)))
+    product_ids = rng.choice(50_000, n, replace=False) + 1
+    resource_items, client_items = [], []
+    for pid, row in zip(product_ids.tolist(), values.tolist()):
+        resource_items.append({'user_id': Decimal(1), 'product_id': Decimal(pid),
+                               **{c: Decimal(repr(v)) for c, v in zip(FEATURE_COLUMNS, row)}})
+        client_items.append({'product_id': {'N': str(pid)},
+                             **{c: {'N': repr(v)} for c, v in zip(FEATURE_COLUMNS, row)}})
+    return resource_items, client_items, rng.random(n)
+
+
+def current_path(items, probs):
+    df = pd.DataFrame(lambda_function.convert_decimals(items))
+    X = df[FEATURE_COLUMNS].to_numpy()
+    df_pred = pd.DataFrame({'product_id': df["product_id"].values, 'probability': probs})
+    return X, df_pred.sort_values('probability', ascending=False).head(10)
+
+
+def fast_path(items, probs):
+    product_ids, X = lambda_function.decode_feature_items(items)
+    return X, lambda_function.top_k(product_ids, probs, 10)
+
+
+def measure(fn, items, probs, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(items, probs)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(items, probs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return np.median(times) * 1000, peak / 1e6
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    print(f"{'candidates':>10}{'current ms':>12}{'fast ms':>10}{'speedup':>9}{'current MB':>12}{'fast MB':>10}")
+    for n in [int(c) for c in args.candidates.split(',')]:
+        resource_items, client_items, probs = make_items(n, rng)
+        # Both paths must rank the same products
+        _, old_top = current_path(resource_items, probs)
+        _, (new_ids, _) = fast_path(client_items, probs)
+        assert old_top['product_id'].astype(int).tolist() == new_ids.tolist()
+
+        old_ms, old_mb = measure(current_path, resource_items, probs, args.repeats)
+        new_ms, new_mb = measure(fast_path, client_items, probs, args.repeats)
+        print(f"{n:>10}{old_ms:>12.2f}{new_ms:>10.2f}{old_ms / new_ms:>8.1f}x{old_mb:>12.2f}{new_mb:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
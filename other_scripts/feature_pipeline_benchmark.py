@@ -0,0 +1,97 @@
+"""
+End-to-end benchmark of FeatureEngineering.run_pipeline on a local Spark
+session over synthetic Instacart-style data at several scales.
+
+For every scale the data is generated once (and reused on later runs), the
+full pipeline runs with local inputs/outputs, and per-stage wall time plus
+shuffle read/write bytes are recorded. Shuffle volume comes from the Spark
+UI REST API, grouped by the fair scheduler pool each pipeline stage runs in.
+
+Usage:
+    python feature_pipeline_benchmark.py --scales 1,10,100 --work_dir ./bench
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+from pyspark.sql import SparkSession
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules", "glue-job"))
+from features import FeatureEngineering  # noqa: E402
+from synthetic_instacart import generate  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=str, default='1,10')
+    parser.add_argument('--work_dir', type=str, default='./pipeline_bench')
+    parser.add_argument('--master', type=str, default='local[*]')
+    parser.add_argument('--driver_memory', type=str, default='8g')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def shuffle_bytes_by_pool(spark):
+    """Sum shuffle read/write bytes of completed Spark stages per scheduler pool."""
+    ui = spark.sparkContext.uiWebUrl
+    app_id = spark.sparkContext.applicationId
+    with urllib.request.urlopen(f"{ui}/api/v1/applications/{app_id}/stages?status=complete") as response:
+        stages = json.load(response)
+    totals = defaultdict(lambda: {"shuffle_read_bytes": 0, "shuffle_write_bytes": 0})
+    for stage in stages:
+        pool = stage.get("schedulingPool", "default")
+        totals[pool]["shuffle_read_bytes"] += stage.get("shuffleReadBytes", 0)
+        totals[pool]["shuffle_write_bytes"] += stage.get("shuffleWriteBytes", 0)
+    return totals
+
+
+def run_scale(args, scale):
+    data_dir = os.path.join(args.work_dir, f"data_scale_{scale:g}")
+    if not os.path.exists(os.path.join(data_dir, "order_products__train.csv")):
+        generate(data_dir, scale, args.seed)
+
+    spark = SparkSession.builder.master(args.master) \
+                        .appName(f"feature-pipeline-bench-{scale:g}") \
+                        .config("spark.driver.memory", args.driver_memory) \
+                        .config("spark.scheduler.mode", "FAIR") \
+                        .config("spark.ui.enabled", "true") \
+                        .getOrCreate()
+    try:
+        pipeline = FeatureEngineering(spark=spark, data_dir=data_dir,
+                                      output_dir=os.path.join(args.work_dir, f"output_scale_{scale:g}"))
+        start = time.perf_counter()
+        pipeline.run_pipeline()
+        total_s = time.perf_counter() - start
+        shuffle = shuffle_bytes_by_pool(spark)
+        stages = [{**t, **shuffle.get(t["stage"], {"shuffle_read_bytes": 0, "shuffle_write_bytes": 0})}
+                  for t in pipeline.stage_timeline]
+        return {"scale": scale, "total_s": round(total_s, 2), "stages": stages}
+    finally:
+        spark.stop()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = [run_scale(args, float(scale)) for scale in args.scales.split(',')]
+
+    print(f"{'scale':>6} {'stage':<32}{'seconds':>9}{'shuffle read MB':>17}{'shuffle write MB':>18}")
+    for result in results:
+        for stage in sorted(result["stages"], key=lambda s: s["start_s"]):
+            print(f"{result['scale']:>6g} {stage['stage']:<32}{stage['duration_s']:>9.1f}"
+                  f"{stage['shuffle_read_bytes'] / 1e6:>17.1f}{stage['shuffle_write_bytes'] / 1e6:>18.1f}")
+        print(f"{result['scale']:>6g} {'total':<32}{result['total_s']:>9.1f}")
+
+    report_path = os.path.join(args.work_dir, "pipeline_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Saved benchmark results to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Parallel hyperparameter sweep for the XGBoost recommendation model.
+
+The Parquet training data is parsed once and saved as XGBoost binary DMatrix
+buffers; every trial then loads those buffers instead of re-reading Parquet.
+Trials run concurrently in a process pool sharing a fixed core budget, and a
+median-stopping rule prunes trials whose validation score at a checkpoint is
+worse than the median of earlier trials at the same checkpoint.
+
+Usage:
+    python hyperparameter_sweep.py --train_dir ./features/train_scaled --trials 32 --cores 16 --parallel 4
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+import numpy as np
+import xgboost as xgb
+
+import training_job
+
+MAXIMIZE_METRICS = ("auc", "aucpr", "map", "ndcg")
+
+SEARCH_SPACE = {
+    "max_depth": lambda rng: int(rng.integers(3, 11)),
+    "eta": lambda rng: float(10 ** rng.uniform(-2, -0.5)),
+    "min_child_weight": lambda rng: float(10 ** rng.uniform(0, 2)),
+    "subsample": lambda rng: float(rng.uniform(0.5, 1.0)),
+    "colsample_bytree": lambda rng: float(rng.uniform(0.5, 1.0)),
+    "lambda": lambda rng: float(10 ** rng.uniform(-1, 1)),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--train_dir', type=str, default=os.environ.get('SM_CHANNEL_TRAIN', '/opt/ml/input/data/train'))
+    parser.add_argument('--output_dir', type=str, default='./sweep')
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--cores', type=int, default=os.cpu_count(), help="Total core budget for the sweep")
+    parser.add_argument('--parallel', type=int, default=4, help="Trials running at once")
+    parser.add_argument('--num_round', type=int, default=500)
+    parser.add_argument('--early_stopping_rounds', type=int, default=20)
+    parser.add_argument('--eval_metric', type=str, default='logloss,auc')
+    parser.add_argument('--prune_every', type=int, default=25, help="Rounds between pruning checkpoints")
+    parser.add_argument('--prune_min_trials', type=int, default=3)
+    parser.add_argument('--validation_fraction', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+class MedianPruner(xgb.callback.TrainingCallback):
+    """Stop a trial whose checkpoint score is worse than the median of other trials there."""
+
+    def __init__(self, metric, every, min_trials, shared_scores, lock):
+        self.metric = metric
+        self.maximize = metric.split("@")[0] in MAXIMIZE_METRICS
+        self.every = every
+        self.min_trials = min_trials
+        self.shared_scores = shared_scores
+        self.lock = lock
+        self.pruned_at = None
+
+    def after_iteration(self, model, epoch, evals_log):
+        if (epoch + 1) % self.every:
+            return False
+        score = evals_log["validation"][self.metric][-1]
+        with self.lock:
+            previous = self.shared_scores.get(epoch, [])
+            self.shared_scores[epoch] = previous + [score]
+        if len(previous) < self.min_trials:
+            return False
+        median = float(np.median(previous))
+        if (score < median) if self.maximize else (score > median):
+            self.pruned_at = epoch
+            return True
+        return False
+
+
+def cache_matrices(args, cache_dir):
+    """Parse Parquet once and store train/validation as XGBoost binary buffers."""
+    job_args = training_job.parse_args(["--validation_fraction", str(args.validation_fraction),
+                                        "--seed", str(args.seed)])
+    start = time.perf_counter()
+    dtrain, dvalid = training_job.build_matrices(job_args, args.train_dir, quantile=False)
+    if dvalid is None:
+        raise ValueError("The sweep needs a validation split; set --validation_fraction > 0")
+    paths = {"train": os.path.join(cache_dir, "train.buffer"), "valid": os.path.join(cache_dir, "valid.buffer")}
+    dtrain.save_binary(paths["train"])
+    dvalid.save_binary(paths["valid"])
+    print(f"💾 Cached {dtrain.num_row()} train / {dvalid.num_row()} validation rows "
+          f"in {time.perf_counter() - start:.1f}s")
+    return paths
+
+
+def run_trial(trial_id, params, paths, args, nthread, shared_scores, lock):
+    """Train one configuration from the binary cache; returns its leaderboard row."""
+    start = time.perf_counter()
+    dtrain = xgb.DMatrix(paths["train"], nthread=nthread)
+    dvalid = xgb.DMatrix(paths["valid"], nthread=nthread)
+    load_s = time.perf_counter() - start
+
+    eval_metrics = args.eval_metric.split(',')
+    pruner = MedianPruner(eval_metrics[-1], args.prune_every, args.prune_min_trials, shared_scores, lock)
+    model = xgb.train(
+        {"objective": "binary:logistic", "eval_metric": eval_metrics, "tree_method": "hist",
+         "nthread": nthread, "seed": args.seed, **params},
+        dtrain,
+        num_boost_round=args.num_round,
+        evals=[(dtrain, "train"), (dvalid, "validation")],
+        early_stopping_rounds=args.early_stopping_rounds,
+        verbose_eval=False,
+        callbacks=[pruner]
+    )
+    return {
+        "trial": trial_id,
+        "params": params,
+        "metric": eval_metrics[-1],
+        "best_score": float(model.best_score),
+        "best_iteration": int(model.best_iteration),
+        "rounds": int(model.num_boosted_rounds()),
+        "pruned_at": pruner.pruned_at,
+        "load_seconds": round(load_s, 3),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    args = parse_args()
+    cache_dir = os.path.join(args.output_dir, "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = cache_matrices(args, cache_dir)
+
+    rng = np.random.default_rng(args.seed)
+    trials = [{name: sample(rng) for name, sample in SEARCH_SPACE.items()} for _ in range(args.trials)]
+    nthread = max(1, args.cores // args.parallel)
+    print(f"🚀 Running {args.trials} trials, {args.parallel} at a time x {nthread} threads")
+
+    results = []
+    start = time.perf_counter()
+    with Manager() as manager:
+        shared_scores, lock = manager.dict(), manager.Lock()
+        with ProcessPoolExecutor(max_workers=args.parallel) as executor:
+            futures = [executor.submit(run_trial, i, params, paths, args, nthread, shared_scores, lock)
+                       for i, params in enumerate(trials)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                status = f"pruned at {result['pruned_at']}" if result['pruned_at'] is not None else "completed"
+                print(f"✅ Trial {result['trial']}: {result['metric']}={result['best_score']:.5f} "
+                      f"({result['rounds']} rounds, {result['seconds']:.1f}s, {status})")
+    total_s = time.perf_counter() - start
+
+    maximize = results[0]["metric"].split("@")[0] in MAXIMIZE_METRICS
+    leaderboard = sorted(results, key=lambda r: r["best_score"], reverse=maximize)
+    with open(os.path.join(args.output_dir, "leaderboard.json"), "w") as f:
+        json.dump({"total_seconds": round(total_s, 3), "trials": leaderboard}, f, indent=2)
+
+    print(f"{'rank':>4} {'trial':>5} {'score':>10} {'rounds':>7} {'seconds':>8}  params")
+    for rank, r in enumerate(leaderboard[:10], start=1):
+        params = ", ".join(f"{k}={v:.3g}" for k, v in r["params"].items())
+        print(f"{rank:>4} {r['trial']:>5} {r['best_score']:>10.5f} {r['rounds']:>7} {r['seconds']:>8.1f}  {params}")
+    print(f"🎉 Sweep finished in {total_s:.1f}s; leaderboard saved to {args.output_dir}/leaderboard.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Run the Step Functions pipeline locally with content-addressed stage caching.
+
+The stage graph is read from modules/step-functions/state-machine.json (Task
+states in order, Parallel branches as independent chains), and every Task
+resource is mapped to a local stand-in:
+
+- glue:startJobRun.sync            features.py on a local Spark session over --data_dir
+- sagemaker:createTrainingJob.sync training_job.py with the state's HyperParameters,
+                                   laid out as SageMaker would (SM_CHANNEL_TRAIN / SM_MODEL_DIR)
+- sagemaker:createModel            model.tar.gz of the trained model, the ModelDataUrl artifact
+- sagemaker:createEndpointConfig   endpoint_config.json with the state's ProductionVariants
+- sagemaker:createEndpoint         loads the packaged model and times a smoke-test prediction
+
+Each stage's fingerprint hashes its resource, parameters, the code it runs,
+its external inputs (file contents of --data_dir) and the output hashes of
+the stages it depends on. Outputs live in <work_dir>/cache/<stage>/<fingerprint>/
+and a stage whose fingerprint already has outputs is skipped, so editing one
+stage re-runs only it and what depends on its (changed) output. Stages whose
+dependencies are done run concurrently, so Parallel branches overlap.
+
+Usage:
+    python local_pipeline.py --data_dir ./data
+    python local_pipeline.py --data_dir ./data --stages StartSageMakerTrainingJob --force StartSageMakerTrainingJob
+    python local_pipeline.py --data_dir ./data --features_args "--build_embeddings true" --dry_run
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+STATE_MACHINE = os.path.join(REPO, "modules", "step-functions", "state-machine.json")
+FEATURES_SCRIPT = os.path.join(REPO, "modules", "glue-job", "features.py")
+FEATURE_DEFINITIONS = os.path.join(REPO, "modules", "glue-job", "feature_definitions.py")
+TRAINING_SCRIPT = os.path.join(REPO, "other_scripts", "training_job.py")
+MANIFEST = "_stage.json"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', type=str, required=True, help="Instacart CSV/Parquet tables")
+    parser.add_argument('--work_dir', type=str, default='./pipeline_local')
+    parser.add_argument('--state_machine', type=str, default=STATE_MACHINE)
+    parser.add_argument('--features_args', type=str, default='', help="Extra Glue job arguments, e.g. \"--cooc_top_k 20\"")
+    parser.add_argument('--train_input', type=str, default='features/train_scaled',
+                        help="Feature output used for training (the state machine's input_key)")
+    parser.add_argument('--training_workers', type=int, default=1, help="Local stand-in for InstanceCount")
+    parser.add_argument('--stages', type=str, default='', help="Run only these stages (and what they need)")
+    parser.add_argument('--force', type=str, default='', help="Re-run these stages even if cached")
+    parser.add_argument('--max_workers', type=int, default=4)
+    parser.add_argument('--dry_run', action='store_true', help="Print the plan and cache hits without running")
+    return parser.parse_args()
+
+
+def load_state_machine(path):
+    """Parse the Terraform-templated definition, replacing template expressions with placeholders."""
+    with open(path) as f:
+        text = f.read()
+    text = re.sub(r'\$\{[^{}]*\}', '@tf', text)
+    # Unquoted template values (numbers, lists) become null
+    text = re.sub(r':\s*@tf', ': null', text)
+    return json.loads(text)
+
+
+def build_graph(definition):
+    """
+    Return {state: {"resource", "parameters", "deps"}} for every Task state, each
+    depending on the Task(s) that must finish before it (all branch ends after a Parallel).
+    """
+    nodes = {}
+
+    def walk(states, start, deps):
+        name = start
+        while name:
+            state = states[name]
+            if state["Type"] == "Task":
+                nodes[name] = {"resource": state["Resource"].split(":::")[-1],
+                               "parameters": state.get("Parameters", {}), "deps": list(deps)}
+                deps = [name]
+            elif state["Type"] == "Parallel":
+                deps = [end for branch in state["Branches"]
+                        for end in walk(branch["States"], branch["StartAt"], deps)]
+            name = None if state.get("End") else state.get("Next")
+        return deps
+
+    walk(definition["States"], definition["StartAt"], [])
+    return nodes
+
+
+class FileHasher:
+    """sha256 of file contents, memoized by (size, mtime) in a JSON file so big inputs are hashed once."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._memo = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._memo = json.load(f)
+
+    def file(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            memo = self._memo.get(path)
+        if memo and memo[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return memo[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._memo[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def tree(self, root, skip=()):
+        """Hash of every file under root by relative path and content."""
+        digest = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name in skip:
+                    continue
+                path = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(path, root).encode())
+                digest.update(self.file(path).encode())
+        return digest.hexdigest()
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump(self._memo, f)
+
+
+def run_features(ctx):
+    cmd = [sys.executable, FEATURES_SCRIPT, "--data_dir", os.path.abspath(ctx["args"].data_dir),
+           "--output_dir", ctx["out"], *shlex.split(ctx["args"].features_args)]
+    subprocess.run(cmd, check=True)
+
+
+def run_training(ctx):
+    features_out = next(iter(ctx["inputs"].values()))
+    env = dict(os.environ, SM_CHANNEL_TRAIN=os.path.join(features_out, ctx["args"].train_input),
+               SM_MODEL_DIR=ctx["out"])
+    cmd = [sys.executable, TRAINING_SCRIPT]
+    for name, value in ctx["parameters"].get("HyperParameters", {}).items():
+        # Script-mode settings are read by the SageMaker toolkit, not passed to the script
+        if not name.startswith("sagemaker_"):
+            cmd += [f"--{name}", str(value)]
+    if ctx["args"].training_workers > 1:
+        cmd += ["--local_workers", str(ctx["args"].training_workers)]
+    subprocess.run(cmd, check=True, env=env)
+
+
+def create_model(ctx):
+    model_dir = next(iter(ctx["inputs"].values()))
+    with tarfile.open(os.path.join(ctx["out"], "model.tar.gz"), "w:gz") as tar:
+        tar.add(os.path.join(model_dir, "xgboost-model"), arcname="xgboost-model")
+
+
+def create_endpoint_config(ctx):
+    model_out = next(iter(ctx["inputs"].values()))
+    config = {"ProductionVariants": ctx["parameters"].get("ProductionVariants", []),
+              "ModelDataUrl": os.path.join(model_out, "model.tar.gz")}
+    with open(os.path.join(ctx["out"], "endpoint_config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+
+
+def create_endpoint(ctx):
+    import numpy as np
+    import xgboost as xgb
+    config_out = next(iter(ctx["inputs"].values()))
+    with open(os.path.join(config_out, "endpoint_config.json")) as f:
+        config = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp:
+        with tarfile.open(config["ModelDataUrl"]) as tar:
+            tar.extractall(tmp)
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(tmp, "xgboost-model"))
+    X = np.random.default_rng(0).normal(size=(100, booster.num_features())).astype(np.float32)
+    start = time.perf_counter()
+    scores = booster.predict(xgb.DMatrix(X))
+    latency_ms = (time.perf_counter() - start) * 1000
+    with open(os.path.join(ctx["out"], "endpoint.json"), "w") as f:
+        json.dump({"model_data": config["ModelDataUrl"], "num_features": booster.num_features(),
+                   "smoke_test_rows": len(scores), "smoke_test_ms": round(latency_ms, 2)}, f, indent=2)
+    print(f"Endpoint stand-in scored {len(scores)} rows in {latency_ms:.1f} ms")
+
+
+# resource -> (stand-in, code files it runs)
+STAND_INS = {
+    "glue:startJobRun.sync": (run_features, [FEATURES_SCRIPT, FEATURE_DEFINITIONS]),
+    "sagemaker:createTrainingJob.sync": (run_training, [TRAINING_SCRIPT]),
+    "sagemaker:createModel": (create_model, []),
+    "sagemaker:createEndpointConfig": (create_endpoint_config, []),
+    "sagemaker:createEndpoint": (create_endpoint, []),
+}
+
+
+class LocalPipeline:
+    def __init__(self, args, nodes):
+        self.args = args
+        self.nodes = nodes
+        self.cache_dir = os.path.join(args.work_dir, "cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hasher = FileHasher(os.path.join(args.work_dir, "file_hashes.json"))
+        self.force = set(filter(None, args.force.split(',')))
+        self.results = {}
+        self.report = []
+
+    def fingerprint(self, name):
+        """Content address of a stage; None if an upstream output is not known yet."""
+        node = self.nodes[name]
+        if any(dep not in self.results for dep in node["deps"]):
+            return None
+        _, code_files = STAND_INS[node["resource"]]
+        payload = {
+            "resource": node["resource"],
+            "parameters": node["parameters"],
+            "code": {os.path.basename(p): self.hasher.file(p) for p in code_files + [os.path.abspath(__file__)]},
+            "inputs": {dep: self.results[dep]["output_hash"] for dep in node["deps"]},
+        }
+        if node["resource"] == "glue:startJobRun.sync":
+            payload["external"] = {"data_dir": self.hasher.tree(self.args.data_dir),
+                                   "features_args": self.args.features_args}
+        elif node["resource"] == "sagemaker:createTrainingJob.sync":
+            payload["external"] = {"train_input": self.args.train_input, "workers": self.args.training_workers}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:20]
+
+    def cached(self, name, fingerprint):
+        manifest = os.path.join(self.cache_dir, name, fingerprint, MANIFEST)
+        if name in self.force or not os.path.exists(manifest):
+            return None
+        with open(manifest) as f:
+            return json.load(f)
+
+    def run_stage(self, name):
+        node = self.nodes[name]
+        fingerprint = self.fingerprint(name)
+        out = os.path.join(self.cache_dir, name, fingerprint)
+        hit = self.cached(name, fingerprint)
+        if hit is not None:
+            print(f"♻️ {name}: cached ({fingerprint})")
+            return {**hit, "out": out, "cached": True}
+
+        print(f"▶️ {name}: running ({fingerprint})")
+        tmp = tempfile.mkdtemp(prefix=f".{fingerprint}-", dir=self.cache_dir)
+        start = time.perf_counter()
+        try:
+            stand_in, _ = STAND_INS[node["resource"]]
+            stand_in({"args": self.args, "parameters": node["parameters"], "out": tmp,
+                      "inputs": {dep: self.results[dep]["out"] for dep in node["deps"]}})
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        manifest = {"stage": name, "fingerprint": fingerprint, "output_hash": self.hasher.tree(tmp),
+                    "seconds": round(time.perf_counter() - start, 2), "deps": node["deps"]}
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(out, ignore_errors=True)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        os.replace(tmp, out)
+        print(f"⏹️ {name}: done in {manifest['seconds']:.1f}s")
+        return {**manifest, "out": out, "cached": False}
+
+    def run(self, targets):
+        pending = {name: node for name, node in self.nodes.items() if name in targets}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.args.max_workers) as executor:
+            while pending or running:
+                ready = [name for name, node in pending.items() if all(d in self.results for d in node["deps"])]
+                for name in ready:
+                    del pending[name]
+                    running[executor.submit(self.run_stage, name)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self.results[name] = future.result()
+                    self.report.append({"stage": name, **{k: v for k, v in self.results[name].items()
+                                                          if k in ("fingerprint", "seconds", "cached", "out")}})
+        self.hasher.save()
+
+    def plan(self, targets):
+        """Print each stage with its cache status, resolving fingerprints from cached upstream outputs."""
+        for name in self.nodes:
+            if name not in targets:
+                continue
+            fingerprint = self.fingerprint(name)
+            hit = self.cached(name, fingerprint) if fingerprint else None
+            if hit is not None:
+                self.results[name] = {**hit, "out": os.path.join(self.cache_dir, name, fingerprint)}
+            status = "cached" if hit else ("run" if fingerprint else "run (after upstream)")
+            print(f"{name:<32}{self.nodes[name]['resource']:<36}{status}")
+        self.hasher.save()
+
+
+def with_ancestors(nodes, names):
+    selected, stack = set(), list(names)
+    while stack:
+        name = stack.pop()
+        if name not in nodes:
+            raise ValueError(f"Unknown stage {name!r}; stages: {list(nodes)}")
+        if name not in selected:
+            selected.add(name)
+            stack.extend(nodes[name]["deps"])
+    return selected
+
+
+def main():
+    args = parse_args()
+    nodes = build_graph(load_state_machine(args.state_machine))
+    unsupported = [n for n, node in nodes.items() if node["resource"] not in STAND_INS]
+    if unsupported:
+        missing = ', '.join(f"{name} ({nodes[name]['resource']})" for name in unsupported)
+        print(f"❌ No local stand-in for: {missing}")
+        sys.exit(1)
+    targets = with_ancestors(nodes, [s for s in args.stages.split(',') if s]) if args.stages else set(nodes)
+
+    pipeline = LocalPipeline(args, nodes)
+    if args.dry_run:
+        pipeline.plan(targets)
+        return
+    start = time.perf_counter()
+    pipeline.run(targets)
+    total_s = time.perf_counter() - start
+    for entry in pipeline.report:
+        status = "cached" if entry["cached"] else f"{entry['seconds']:.1f}s"
+        print(f"{entry['stage']:<32}{status:>10}  {entry['out']}")
+    with open(os.path.join(args.work_dir, "last_run.json"), "w") as f:
+        json.dump({"total_s": round(total_s, 2), "stages": pipeline.report}, f, indent=2)
+    print(f"✅ Pipeline finished in {total_s:.1f}s ({sum(e['cached'] for e in pipeline.report)} stages cached)")
+
+
+if __name__ == "__main__":
+    main()
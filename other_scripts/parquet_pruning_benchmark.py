@@ -0,0 +1,121 @@
+"""
+Local benchmark for the user-bucketed Parquet layout written by
+FeatureEngineering._save_parquet(bucket_by_user=True).
+
+Writes the same synthetic user-product feature table twice - plain (unsorted,
+unpartitioned) and bucketed (user_bucket=pmod(user_id, n) directories, sorted
+by user_id) - then looks up single users and reports how many files, row
+groups and bytes each layout has to read.
+
+Usage:
+    python parquet_pruning_benchmark.py --rows 5000000 --users 200000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--buckets', type=int, default=64)
+    parser.add_argument('--row_group_rows', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work_dir', type=str, default=None)
+    return parser.parse_args()
+
+
+def make_table(rows, users, seed):
+    """User-product features with heavy-tailed activity per user."""
+    rng = np.random.default_rng(seed)
+    weights = rng.pareto(1.5, users) + 1
+    user_id = rng.choice(np.arange(1, users + 1), size=rows, p=weights / weights.sum())
+    columns = {
+        "user_id": user_id.astype(np.int64),
+        "product_id": rng.integers(1, 50_000, rows).astype(np.int64),
+    }
+    for name in ['user_orders_scaled', 'user_periods_scaled', 'user_mean_days_since_prior_scaled',
+                 'user_products_scaled', 'user_distinct_products_scaled', 'user_reorder_ratio_scaled',
+                 'prod_orders_scaled', 'prod_reorders_scaled', 'prod_first_orders_scaled',
+                 'prod_second_orders_scaled']:
+        columns[name] = rng.standard_normal(rows)
+    return pa.table(columns)
+
+
+def write_plain(table, path, row_group_rows):
+    os.makedirs(path)
+    pq.write_table(table, os.path.join(path, "part-00000.parquet"), row_group_size=row_group_rows)
+
+
+def write_bucketed(table, path, buckets, row_group_rows):
+    bucket = table["user_id"].to_numpy() % buckets
+    table = table.append_column("user_bucket", pa.array(bucket))
+    table = table.sort_by([("user_bucket", "ascending"), ("user_id", "ascending"), ("product_id", "ascending")])
+    pq.write_to_dataset(table, path, partition_cols=["user_bucket"], row_group_size=row_group_rows)
+
+
+def lookup(path, user_id, buckets=None):
+    """Read one user's rows and count files, row groups and bytes the reader could not skip."""
+    dataset = ds.dataset(path, format="parquet", partitioning="hive" if buckets else None)
+    expr = ds.field("user_id") == user_id
+    if buckets:
+        expr = expr & (ds.field("user_bucket") == user_id % buckets)
+
+    start = time.perf_counter()
+    files = row_groups = scanned_bytes = 0
+    for fragment in dataset.get_fragments(filter=expr):
+        files += 1
+        metadata = fragment.metadata
+        for piece in fragment.split_by_row_group(filter=expr):
+            for rg in piece.row_groups:
+                row_groups += 1
+                scanned_bytes += metadata.row_group(rg.id).total_byte_size
+    rows = dataset.to_table(filter=expr).num_rows
+    return time.perf_counter() - start, files, row_groups, scanned_bytes, rows
+
+
+def main():
+    args = parse_args()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="parquet_pruning_")
+    plain_path = os.path.join(work_dir, "plain")
+    bucketed_path = os.path.join(work_dir, "bucketed")
+    for path in (plain_path, bucketed_path):
+        shutil.rmtree(path, ignore_errors=True)
+
+    print(f"📊 Generating {args.rows} rows for {args.users} users...")
+    table = make_table(args.rows, args.users, args.seed)
+    shuffled = table.take(np.random.default_rng(args.seed).permutation(table.num_rows))
+
+    print("💾 Writing plain and bucketed layouts...")
+    write_plain(shuffled, plain_path, args.row_group_rows)
+    write_bucketed(table, bucketed_path, args.buckets, args.row_group_rows)
+
+    total_row_groups = sum(pq.ParquetFile(os.path.join(root, f)).num_row_groups
+                           for root, _, names in os.walk(plain_path) for f in names)
+    users = np.random.default_rng(args.seed + 1).choice(table["user_id"].to_numpy(), args.lookups)
+
+    print(f"🔍 Looking up {args.lookups} users (plain layout has {total_row_groups} row groups)...")
+    results = {}
+    for name, path, buckets in (("plain", plain_path, None), ("bucketed", bucketed_path, args.buckets)):
+        stats = np.array([lookup(path, int(u), buckets)[:4] for u in users], dtype=np.float64)
+        results[name] = stats.mean(axis=0)
+
+    print(f"{'layout':<10}{'ms/lookup':>12}{'files':>8}{'row groups':>12}{'MB scanned':>12}")
+    for name, (seconds, files, row_groups, scanned_bytes) in results.items():
+        print(f"{name:<10}{seconds * 1000:>12.1f}{files:>8.1f}{row_groups:>12.1f}{scanned_bytes / 1e6:>12.2f}")
+    pruned = 1 - results["bucketed"][3] / max(results["plain"][3], 1)
+    print(f"✅ Bucketed layout skips {pruned:.1%} of the bytes per single-user lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Throughput-versus-latency benchmark for cross-request micro-batching
+(modules/lambda/batching.py).
+
+Simulates concurrent users against a scorer with a fixed per-call overhead
+plus a per-row cost (the shape of a SageMaker endpoint call), once scoring
+each request on its own and then with several batching windows.
+
+Usage:
+    python serving_batching_benchmark.py --clients 64 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules", "lambda"))
+from batching import MicroBatcher, Overloaded, simulated_scorer  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--rows_per_request', type=int, default=60)
+    parser.add_argument('--call_overhead_ms', type=float, default=20.0)
+    parser.add_argument('--per_row_us', type=float, default=5.0)
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent endpoint calls")
+    parser.add_argument('--wait_ms', type=str, default='1,5,10,20')
+    return parser.parse_args()
+
+
+async def run_clients(args, score):
+    """Run closed-loop clients for args.duration; returns latencies and rejected count."""
+    latencies, rejected = [], 0
+    features = np.random.default_rng(0).standard_normal((args.rows_per_request, 10)).astype(np.float32)
+    stop_at = time.perf_counter() + args.duration
+
+    async def client():
+        nonlocal rejected
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                await score(features)
+                latencies.append(time.perf_counter() - start)
+            except Overloaded:
+                rejected += 1
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    return np.array(latencies), rejected
+
+
+async def benchmark(args):
+    scorer = simulated_scorer(args.call_overhead_ms, args.per_row_us)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+    results = []
+
+    async def unbatched(features):
+        return await loop.run_in_executor(None, scorer, features)
+
+    latencies, rejected = await run_clients(args, unbatched)
+    results.append(("unbatched", latencies, rejected, len(latencies)))
+
+    for wait_ms in [float(w) for w in args.wait_ms.split(',')]:
+        batcher = MicroBatcher(scorer, max_wait_ms=wait_ms, max_inflight=args.workers)
+        batcher.start()
+        latencies, rejected = await run_clients(args, batcher.submit)
+        await batcher.stop()
+        avg_batch = batcher.stats["requests"] / max(batcher.stats["batches"], 1)
+        results.append((f"wait {wait_ms:g}ms (avg {avg_batch:.1f} req/batch)", latencies, rejected, len(latencies)))
+
+    print(f"{'mode':<36}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'rejected':>10}")
+    for name, latencies, rejected, count in results:
+        p50, p99 = np.percentile(latencies * 1000, [50, 99]) if count else (float('nan'), float('nan'))
+        print(f"{name:<36}{count / args.duration:>10.1f}{p50:>10.1f}{p99:>10.1f}{rejected:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark(parse_args()))
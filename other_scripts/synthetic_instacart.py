@@ -0,0 +1,123 @@
+"""
+Seeded generator for synthetic Instacart-style data.
+
+Writes the same tables and columns as the Glue Catalog source (products,
+aisles, departments, orders, order_products__prior, order_products__train)
+as CSV files, with the shapes that matter for the feature pipeline:
+
+- Zipfian product popularity (a few products appear in most baskets)
+- heavy-tailed user activity (4-100 orders per user, most users near 4)
+- per-user repertoires, so products are genuinely reordered
+- each user's last order is "train" or "test", the rest are "prior"
+
+Scale 1 is 2,000 users (~35k orders, ~350k order lines); data grows
+linearly with --scale, e.g. --scale 100 is 200,000 users, close to the real
+dataset.
+
+Usage:
+    python synthetic_instacart.py --scale 10 --output_dir ./data/scale_10
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_USERS = 2000
+N_AISLES = 134
+N_DEPARTMENTS = 21
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--output_dir', type=str, default='./data')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def zipf_probabilities(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate(output_dir, scale=1, seed=42, zipf_exponent=1.0, repeat_prob=0.6):
+    """Generate all tables into output_dir as CSV; returns a dict of row counts."""
+    rng = np.random.default_rng(seed)
+    n_users = max(1, int(BASE_USERS * scale))
+    n_products = int(min(49688, 5000 + 450 * scale))
+    os.makedirs(output_dir, exist_ok=True)
+
+    departments = pd.DataFrame({"department_id": np.arange(1, N_DEPARTMENTS + 1),
+                                "department": [f"department_{i}" for i in range(1, N_DEPARTMENTS + 1)]})
+    aisles = pd.DataFrame({"aisle_id": np.arange(1, N_AISLES + 1),
+                           "aisle": [f"aisle_{i}" for i in range(1, N_AISLES + 1)]})
+    aisle_department = rng.integers(1, N_DEPARTMENTS + 1, N_AISLES)
+    product_aisle = rng.integers(1, N_AISLES + 1, n_products)
+    products = pd.DataFrame({"product_id": np.arange(1, n_products + 1),
+                             "product_name": [f"product_{i}" for i in range(1, n_products + 1)],
+                             "aisle_id": product_aisle,
+                             "department_id": aisle_department[product_aisle - 1]})
+
+    # Popularity rank is shuffled so product_id does not encode popularity
+    popularity = zipf_probabilities(n_products, zipf_exponent)
+    product_by_rank = rng.permutation(n_products) + 1
+
+    # Heavy-tailed activity: Pareto orders per user, clipped to Instacart's 4..100 range
+    orders_per_user = np.clip((4 * (1 + rng.pareto(1.2, n_users))).astype(np.int64), 4, 100)
+    order_user = np.repeat(np.arange(1, n_users + 1), orders_per_user)
+    order_number = np.concatenate([np.arange(1, n + 1) for n in orders_per_user])
+    n_orders = len(order_user)
+    is_last = np.zeros(n_orders, dtype=bool)
+    is_last[np.cumsum(orders_per_user) - 1] = True
+    last_set = np.where(rng.random(n_users) < 0.65, "train", "test")
+    eval_set = np.full(n_orders, "prior", dtype=object)
+    eval_set[is_last] = last_set
+
+    days = np.minimum(rng.geometric(0.09, n_orders), 30).astype(float)
+    days[order_number == 1] = np.nan
+    orders = pd.DataFrame({"order_id": rng.permutation(n_orders) + 1, "user_id": order_user,
+                           "eval_set": eval_set, "order_number": order_number,
+                           "order_dow": rng.integers(0, 7, n_orders),
+                           "order_hour_of_day": rng.integers(0, 24, n_orders),
+                           "days_since_prior_order": days})
+
+    # Basket lines: each item comes from the user's repertoire or the global Zipf distribution
+    basket_sizes = np.clip(rng.negative_binomial(2, 0.17, n_orders), 1, 80)
+    line_order = np.repeat(np.arange(n_orders), basket_sizes)
+    line_user = order_user[line_order]
+    global_pick = product_by_rank[rng.choice(n_products, size=len(line_order), p=popularity)]
+    repertoire_size = 20
+    repertoires = product_by_rank[rng.choice(n_products, size=(n_users, repertoire_size), p=popularity)]
+    repertoire_pick = repertoires[line_user - 1, rng.choice(repertoire_size, size=len(line_order),
+                                                            p=zipf_probabilities(repertoire_size, 1.0))]
+    line_product = np.where(rng.random(len(line_order)) < repeat_prob, repertoire_pick, global_pick)
+
+    # Drop duplicate products within an order, keeping cart order
+    lines = pd.DataFrame({"order_idx": line_order, "user_id": line_user, "product_id": line_product})
+    lines = lines.drop_duplicates(["order_idx", "product_id"])
+    lines["add_to_cart_order"] = lines.groupby("order_idx").cumcount() + 1
+
+    # A line is a reorder if the user bought the product in an earlier order
+    first_order = lines.groupby(["user_id", "product_id"])["order_idx"].transform("min")
+    lines["reordered"] = (lines["order_idx"] > first_order).astype(np.int64)
+    lines["order_id"] = orders["order_id"].to_numpy()[lines["order_idx"].to_numpy()]
+    line_eval_set = eval_set[lines["order_idx"].to_numpy()]
+
+    columns = ["order_id", "product_id", "add_to_cart_order", "reordered"]
+    order_products_prior = lines.loc[line_eval_set == "prior", columns]
+    order_products_train = lines.loc[line_eval_set == "train", columns]
+
+    tables = {"departments": departments, "aisles": aisles, "products": products, "orders": orders,
+              "order_products__prior": order_products_prior, "order_products__train": order_products_train}
+    for name, df in tables.items():
+        df.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+    counts = {name: len(df) for name, df in tables.items()}
+    print(f"✅ Generated scale {scale:g} in {output_dir}: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    generate(args.output_dir, args.scale, args.seed)
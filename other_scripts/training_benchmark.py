@@ -0,0 +1,93 @@
+"""
+Benchmark training_job.py's high-throughput configuration against the
+original behaviour (plain DMatrix, default tree method and threads, no eval
+set so all num_round rounds run).
+
+Uses an existing Parquet training directory, or generates a synthetic one
+with the same columns as features/train_scaled plus user_id.
+
+Usage:
+    python training_benchmark.py --rows 2000000
+    python training_benchmark.py --train_dir ./features/train_scaled
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+import training_job
+
+FEATURE_COLS = ['user_orders_scaled', 'user_periods_scaled', 'user_mean_days_since_prior_scaled',
+                'user_products_scaled', 'user_distinct_products_scaled', 'user_reorder_ratio_scaled',
+                'prod_orders_scaled', 'prod_reorders_scaled', 'prod_first_orders_scaled',
+                'prod_second_orders_scaled']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--train_dir', type=str, default=None)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--num_round', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def make_dataset(path, rows, users, seed, n_files=1):
+    """Synthetic train_scaled-like data with a learnable, noisy label, split into n_files shards."""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, len(FEATURE_COLS))).astype(np.float32)
+    weights = rng.standard_normal(len(FEATURE_COLS))
+    logits = X @ weights * 0.5 - 0.5 + rng.standard_normal(rows)
+    df = pd.DataFrame(X, columns=FEATURE_COLS)
+    df.insert(0, "reordered", (logits > 0).astype(np.int32))
+    df.insert(0, "user_id", rng.integers(1, users + 1, rows))
+    os.makedirs(path, exist_ok=True)
+    for i, part in enumerate(np.array_split(np.arange(rows), n_files)):
+        df.iloc[part].to_parquet(os.path.join(path, f"part-{i:05d}.parquet"), index=False)
+
+
+def run_baseline(train_dir, num_round):
+    """The original training_job.py behaviour."""
+    train_df = pd.read_parquet(train_dir)
+    X = train_df.drop(columns=[c for c in ["user_id", "product_id", "reordered"] if c in train_df.columns])
+    dtrain = xgb.DMatrix(X, label=train_df["reordered"])
+    params = {"objective": "binary:logistic", "max_depth": 7, "eta": 0.2, "eval_metric": ["logloss", "auc"]}
+    return xgb.train(params, dtrain, num_boost_round=num_round)
+
+
+def main():
+    args = parse_args()
+    train_dir = args.train_dir
+    if train_dir is None:
+        train_dir = os.path.join(tempfile.mkdtemp(prefix="train_bench_"), "train_scaled")
+        print(f"📊 Generating {args.rows} synthetic rows in {train_dir}")
+        make_dataset(train_dir, args.rows, args.users, args.seed)
+
+    print("⏱️ Baseline: DMatrix, default tree method/threads, no eval set...")
+    start = time.perf_counter()
+    baseline = run_baseline(train_dir, args.num_round)
+    baseline_s = time.perf_counter() - start
+    baseline_rounds = baseline.num_boosted_rounds()
+
+    print("⏱️ Tuned: QuantileDMatrix + hist, all cores, user-split early stopping...")
+    job_args = training_job.parse_args(["--num_round", str(args.num_round), "--seed", str(args.seed)])
+    start = time.perf_counter()
+    dtrain, dvalid = training_job.build_matrices(job_args, train_dir)
+    model, timer = training_job.train_model(job_args, dtrain, dvalid)
+    tuned_s = time.perf_counter() - start
+
+    print(f"{'config':<10}{'seconds':>10}{'rounds':>8}{'ms/round':>10}")
+    print(f"{'baseline':<10}{baseline_s:>10.1f}{baseline_rounds:>8}{baseline_s / baseline_rounds * 1000:>10.1f}")
+    print(f"{'tuned':<10}{tuned_s:>10.1f}{model.num_boosted_rounds():>8}{np.mean(timer.round_times) * 1000:>10.1f}")
+    print(f"✅ Speedup: {baseline_s / tuned_s:.1f}x (best iteration {model.best_iteration}, "
+          f"validation {model.best_score})")
+
+
+if __name__ == "__main__":
+    main()
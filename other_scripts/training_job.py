@@ -1,60 +1,440 @@
+"""
+XGBoost training script, run by the state machine's training step in script
+mode (sagemaker_program / sagemaker_submit_directory hyperparameters) on the
+sagemaker-xgboost:1.7-1 image, which provides xgboost 1.7, pandas and pyarrow.
+The remaining hyperparameters arrive as --name value arguments.
+
+With several instances every host joins an XGBoost collective (the Rabit
+tracker runs on the first host) and trains on its own Parquet shards.
+"""
+
 import argparse
+import glob
+import json
+import multiprocessing
 import os
+import resource
+import socket
+import tempfile
+import time
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 import xgboost as xgb
+from xgboost.tracker import RabitTracker
+
+LABEL_COL = "reordered"
+ID_COLS = ["user_id", "product_id"]
+USER_SPLIT_MISSING = ("A user validation split needs a user_id column in the training data "
+                      "(features/train_scaled keeps it); use --split_by row to split rows instead")
+
+
+def validation_mask(user_ids, n_rows, fraction, seed, salt=(), split_by="user"):
+    """
+    Return a boolean mask of rows held out for validation. With split_by "user"
+    the split is by user (a multiplicative hash of user_id), so no user appears
+    on both sides; "row" is a seeded row split.
+    """
+    if fraction <= 0:
+        return np.zeros(n_rows, dtype=bool)
+    if split_by == "user":
+        if user_ids is None:
+            raise ValueError(USER_SPLIT_MISSING)
+        hashed = (user_ids.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+        return hashed < np.uint64(fraction * 2 ** 32)
+    return np.random.default_rng([seed, *salt]).random(n_rows) < fraction
+
+
+class ParquetBatchIter(xgb.DataIter):
+    """
+    Stream Parquet shards in bounded-size record batches as float32 arrays,
+    so XGBoost never needs the whole training set in memory at once.
+    subset selects the "train" or "valid" side of the validation split.
+    """
+
+    def __init__(self, files, chunk_rows, cache_prefix=None, subset=None, validation_fraction=0.0, seed=0,
+                 split_by="user"):
+        self._files = files
+        self._chunk_rows = chunk_rows
+        self._subset = subset
+        self._validation_fraction = validation_fraction
+        self._seed = seed
+        self._split_by = split_by
+        self._batches = None
+        schema = pq.ParquetFile(files[0]).schema_arrow
+        self.feature_cols = [c for c in schema.names if c not in ID_COLS + [LABEL_COL]]
+        self._has_user_id = "user_id" in schema.names
+        super().__init__(cache_prefix=cache_prefix)
+        if subset is not None and split_by == "user" and validation_fraction > 0 and not self._has_user_id:
+            # Fail before XGBoost starts pulling batches
+            raise ValueError(USER_SPLIT_MISSING)
+
+    def _iter_batches(self, columns=None):
+        if columns is None:
+            columns = self.feature_cols + [LABEL_COL] + (["user_id"] if self._has_user_id else [])
+        for file_idx, path in enumerate(self._files):
+            parquet_file = pq.ParquetFile(path)
+            for batch_idx, batch in enumerate(parquet_file.iter_batches(batch_size=self._chunk_rows,
+                                                                        columns=columns)):
+                yield (file_idx, batch_idx), batch
+
+    def _keep(self, salt, batch):
+        """Rows of a batch on this iterator's side of the validation split."""
+        if self._subset is None:
+            return np.ones(batch.num_rows, dtype=bool)
+        user_ids = batch.column("user_id").to_numpy(zero_copy_only=False) if self._has_user_id else None
+        mask = validation_mask(user_ids, batch.num_rows, self._validation_fraction, self._seed, salt, self._split_by)
+        return mask if self._subset == "valid" else ~mask
+
+    def has_rows(self):
+        """True if the iterator yields any row; reads only the label and user_id columns."""
+        columns = [LABEL_COL] + (["user_id"] if self._has_user_id else [])
+        return any(self._keep(salt, batch).any() for salt, batch in self._iter_batches(columns))
+
+    def next(self, input_data):
+        if self._batches is None:
+            self._batches = self._iter_batches()
+        for salt, batch in self._batches:
+            keep = self._keep(salt, batch)
+            if not keep.any():
+                continue
+            X = np.column_stack([batch.column(c).to_numpy(zero_copy_only=False).astype(np.float32, copy=False)
+                                 for c in self.feature_cols])[keep]
+            y = batch.column(LABEL_COL).to_numpy(zero_copy_only=False).astype(np.float32, copy=False)[keep]
+            input_data(data=X, label=y, feature_names=self.feature_cols)
+            return 1
+        return 0
+
+    def reset(self):
+        self._batches = None
+
+
+class RoundTimer(xgb.callback.TrainingCallback):
+    """Record and periodically log the wall time of each boosting round."""
+
+    def __init__(self, log_every=10):
+        self.log_every = log_every
+        self.round_times = []
+        self._start = None
+
+    def before_iteration(self, model, epoch, evals_log):
+        self._start = time.perf_counter()
+        return False
+
+    def after_iteration(self, model, epoch, evals_log):
+        self.round_times.append(time.perf_counter() - self._start)
+        if epoch % self.log_every == 0:
+            print(f"Round {epoch}: {self.round_times[-1] * 1000:.1f} ms")
+        return False
+
 
-def parse_args():
+def list_parquet_files(data_dir):
+    """Return the Parquet shards under a directory written by Spark (skipping _SUCCESS etc)."""
+    files = sorted(glob.glob(os.path.join(data_dir, "**", "*.parquet"), recursive=True))
+    if not files:
+        raise FileNotFoundError(f"No Parquet files found under {data_dir}")
+    return files
+
+
+def shard_files(files, rank, world_size):
+    """Assign Parquet shards round-robin so each worker reads a disjoint subset."""
+    shard = files[rank::world_size]
+    if not shard:
+        raise ValueError(f"Worker {rank} has no input: {len(files)} Parquet files for {world_size} workers")
+    return shard
+
+
+def sagemaker_hosts():
+    """Return (hosts, current_host) of a SageMaker training cluster."""
+    hosts = json.loads(os.environ.get('SM_HOSTS', '[]'))
+    return hosts, os.environ.get('SM_CURRENT_HOST')
+
+
+def input_is_presharded(channel="train"):
+    """True when SageMaker already gives each host its own shard (ShardedByS3Key)."""
+    config = json.loads(os.environ.get('SM_INPUT_DATA_CONFIG', '{}'))
+    return config.get(channel, {}).get('S3DistributionType') == 'ShardedByS3Key'
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--max_depth', type=int, default=7)
     parser.add_argument('--eta', type=float, default=0.2)
     parser.add_argument('--eval_metric', type=str, default='logloss,auc')
     parser.add_argument('--num_round', type=int, default=1000)
     parser.add_argument('--early_stopping_rounds', type=int, default=20)
+    # Throughput settings: histogram method on quantile-sketched matrices, all cores
+    parser.add_argument('--tree_method', type=str, default='hist')
+    parser.add_argument('--max_bin', type=int, default=256)
+    parser.add_argument('--nthread', type=int, default=0, help="0 uses every core")
+    # Held-out fraction for early stopping, split by user (needs user_id) or by row
+    parser.add_argument('--validation_fraction', type=float, default=0.1)
+    parser.add_argument('--split_by', type=str, default='user', choices=['user', 'row'])
+    parser.add_argument('--eval_train', type=lambda v: str(v).lower() == 'true', default=False,
+                        help="Also log metrics on the training set every round")
+    parser.add_argument('--seed', type=int, default=42)
+    # Streaming mode: iterate Parquet shards in chunks through XGBoost external memory
+    parser.add_argument('--streaming', type=lambda v: str(v).lower() == 'true', default=False)
+    parser.add_argument('--chunk_rows', type=int, default=500_000)
+    parser.add_argument('--cache_dir', type=str, default=None)
+    # Distributed data-parallel training
+    parser.add_argument('--local_workers', type=int, default=1,
+                        help="Run N worker processes on this machine as a local cluster")
+    parser.add_argument('--tracker_port', type=int, default=9091)
+    parser.add_argument('--worker_timeout_s', type=float, default=6 * 3600,
+                        help="Stop a local cluster that has not finished after this many seconds")
     # Add more hyperparameters as needed
-    return parser.parse_args()
+    args, unknown = parser.parse_known_args(argv)
+    if unknown:
+        # e.g. the built-in algorithm's "objective", which this script fixes to binary:logistic
+        print(f"Ignoring unsupported hyperparameters: {' '.join(unknown)}")
+    return args
 
-def main():
-    args = parse_args()
 
-    # SageMaker sets these environment variables
-    train_dir = os.environ.get('SM_CHANNEL_TRAIN', '/opt/ml/input/data/train')
-    model_dir = os.environ.get('SM_MODEL_DIR', '/opt/ml/model')
+def require_validation_on_every_rank(args, has_valid, rank):
+    """
+    Every worker of a collective must build the same matrices and train with the same
+    evals and early stopping, or the collective deadlocks. The validation split is made
+    per shard, so check that every rank has held-out rows before building any matrix,
+    and fail on all of them if one does not.
+    """
+    has_valid = np.array([has_valid], dtype=np.int32)
+    all_have_valid = int(xgb.collective.allreduce(has_valid, xgb.collective.Op.MIN)[0])
+    if args.validation_fraction > 0 and not all_have_valid:
+        raise ValueError(f"Worker {rank}: a worker's shard has no validation rows at validation_fraction "
+                         f"{args.validation_fraction}; raise it, use fewer workers or set it to 0")
+
+
+def build_matrices(args, train_dir, rank=0, world_size=1, shard=False, quantile=None):
+    """
+    Build the training and (optional) validation matrices from the Parquet input.
+    With shard, only this worker's subset of the Parquet files is read. quantile
+    (default: tree_method == "hist") builds QuantileDMatrix instead of DMatrix.
+    """
+    nthread = args.nthread or os.cpu_count()
+    files = list_parquet_files(train_dir)
+    if shard:
+        files = shard_files(files, rank, world_size)
+        print(f"Worker {rank}/{world_size} reading {len(files)} Parquet shards")
+    if args.streaming:
+        # External memory: batches are paged to a local cache instead of held in RAM
+        cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="xgb_cache_")
+        print(f"Streaming {len(files)} Parquet shards from {train_dir} in chunks of {args.chunk_rows} rows")
+        split = args.validation_fraction > 0
+
+        def make_iter(subset):
+            return ParquetBatchIter(files, args.chunk_rows, cache_prefix=os.path.join(cache_dir, f"{subset or 'train'}-{rank}"),
+                                    subset=subset, validation_fraction=args.validation_fraction, seed=args.seed,
+                                    split_by=args.split_by)
+
+        dtrain = xgb.DMatrix(make_iter("train" if split else None), nthread=nthread)
+        valid_iter = make_iter("valid") if split else None
+        if world_size > 1:
+            require_validation_on_every_rank(args, valid_iter is not None and valid_iter.has_rows(), rank)
+        dvalid = xgb.DMatrix(valid_iter, nthread=nthread) if split else None
+        return dtrain, dvalid
 
     # Read all Parquet files in the input directory
     print(f"Loading training data from: {train_dir}")
-    train_df = pd.read_parquet(train_dir)
+    train_df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True) if shard else pd.read_parquet(train_dir)
     print("Loaded data shape:", train_df.shape)
 
     # Prepare data: label as first column, no header
-    X = train_df.drop(columns=["user_id", "product_id", "reordered"])
-    y = train_df["reordered"]
+    X = train_df.drop(columns=[c for c in ID_COLS + [LABEL_COL] if c in train_df.columns]).astype(np.float32)
+    y = train_df[LABEL_COL].to_numpy(dtype=np.float32)
+    user_ids = train_df["user_id"].to_numpy() if "user_id" in train_df.columns else None
+    valid = validation_mask(user_ids, len(train_df), args.validation_fraction, args.seed, split_by=args.split_by)
+    print(f"Validation split: {int(valid.sum())} rows (by {args.split_by})")
+    if world_size > 1:
+        require_validation_on_every_rank(args, bool(valid.any()), rank)
+
+    if quantile is None:
+        quantile = args.tree_method == "hist"
+    if quantile:
+        dtrain = xgb.QuantileDMatrix(X[~valid], label=y[~valid], max_bin=args.max_bin, nthread=nthread)
+        dvalid = xgb.QuantileDMatrix(X[valid], label=y[valid], ref=dtrain, nthread=nthread) if valid.any() else None
+    else:
+        dtrain = xgb.DMatrix(X[~valid], label=y[~valid], nthread=nthread)
+        dvalid = xgb.DMatrix(X[valid], label=y[valid], nthread=nthread) if valid.any() else None
+    return dtrain, dvalid
 
-    dtrain = xgb.DMatrix(X, label=y)
 
+def train_model(args, dtrain, dvalid):
+    """Train with early stopping on the validation set; returns the booster and round timer."""
     # Parse eval_metric (can be comma-separated)
     eval_metrics = args.eval_metric.split(',')
-
-    # Train model
-    print("Training XGBoost model...")
     params = {
         "objective": "binary:logistic",
         "max_depth": args.max_depth,
         "eta": args.eta,
         "eval_metric": eval_metrics,
+        # External memory requires the histogram method
+        "tree_method": "hist" if args.streaming else args.tree_method,
+        "max_bin": args.max_bin,
+        "nthread": args.nthread or os.cpu_count(),
+        "seed": args.seed,
     }
+    # Metrics on the training set cost a full pass per round and do not drive early stopping
+    evals = ([(dtrain, "train")] if args.eval_train or dvalid is None else []) + \
+        ([(dvalid, "validation")] if dvalid is not None else [])
+    timer = RoundTimer()
     model = xgb.train(
         params,
         dtrain,
         num_boost_round=args.num_round,
-        early_stopping_rounds=args.early_stopping_rounds
+        evals=evals,
+        # Early stopping watches the last eval set, so it only applies with a validation split
+        early_stopping_rounds=args.early_stopping_rounds if dvalid is not None else None,
+        verbose_eval=50,
+        callbacks=[timer]
     )
-    print("Training complete.")
+    return model, timer
+
+
+def run_training(args, train_dir, model_dir, rank=0, world_size=1, shard=False):
+    """Build matrices, train and (on rank 0) save the model; returns the training seconds."""
+    dtrain, dvalid = build_matrices(args, train_dir, rank, world_size, shard)
+    print(f"Training matrix: {dtrain.num_row()} rows x {dtrain.num_col()} features, peak RSS {peak_rss_mb():.0f} MB")
+
+    # Train model
+    print("Training XGBoost model...")
+    start = time.perf_counter()
+    model, timer = train_model(args, dtrain, dvalid)
+    elapsed = time.perf_counter() - start
+    print(f"Training complete in {elapsed:.1f}s: {len(timer.round_times)} rounds, "
+          f"{np.mean(timer.round_times) * 1000:.1f} ms/round, peak RSS {peak_rss_mb():.0f} MB")
+    if dvalid is not None:
+        print(f"Best iteration: {model.best_iteration}, best score: {model.best_score}")
+
+    # Every worker holds the same model; only rank 0 writes it
+    if rank == 0:
+        model_path = os.path.join(model_dir, "xgboost-model")
+        model.save_model(model_path)
+        print(f"Model saved to: {model_path}")
+    return elapsed
+
+
+# xgboost 1.7 (the SageMaker image) takes host_ip first, is started with the worker
+# count and hands out DMLC_* arguments; 2.1+ renamed these (worker_args / wait_for)
+_NEW_TRACKER_API = hasattr(RabitTracker, "worker_args")
+
+
+def start_tracker(host_ip, n_workers, port=0):
+    """Start a Rabit tracker and return it with its (uri, port)."""
+    if _NEW_TRACKER_API:
+        tracker = RabitTracker(n_workers=n_workers, host_ip=host_ip, port=port)
+        tracker.start()
+        envs = tracker.worker_args()
+    else:
+        tracker = RabitTracker(host_ip=host_ip, n_workers=n_workers, port=port)
+        tracker.start(n_workers)
+        envs = tracker.worker_envs()
+    envs = {k.upper(): v for k, v in envs.items()}
+    return tracker, (envs["DMLC_TRACKER_URI"], int(envs["DMLC_TRACKER_PORT"]))
+
+
+def wait_tracker(tracker):
+    if _NEW_TRACKER_API:
+        tracker.wait_for()
+    else:
+        tracker.join()
+
+
+def communicator_args(tracker_uri, tracker_port, rank):
+    """CommunicatorContext arguments of one worker, in the installed xgboost's naming."""
+    args = {"DMLC_TRACKER_URI": tracker_uri, "DMLC_TRACKER_PORT": tracker_port, "DMLC_TASK_ID": str(rank)}
+    return {k.lower(): v for k, v in args.items()} if _NEW_TRACKER_API else args
+
+
+def _local_worker(args, train_dir, model_dir, rank, world_size, tracker_address):
+    with xgb.collective.CommunicatorContext(**communicator_args(*tracker_address, rank)):
+        run_training(args, train_dir, model_dir, rank, world_size, shard=True)
+
+
+def run_local_cluster(args, train_dir, model_dir):
+    """
+    Run args.local_workers worker processes on this machine, connected through
+    a local Rabit tracker, each reading its own shard. Returns wall seconds.
+    A failed worker would leave the others blocked in the collective, so the
+    rest are terminated as soon as one fails or --worker_timeout_s passes.
+    """
+    n_workers = args.local_workers
+    if not args.nthread:
+        args.nthread = max(1, os.cpu_count() // n_workers)
+    tracker, tracker_address = start_tracker("127.0.0.1", n_workers)
+
+    print(f"Starting local cluster: {n_workers} workers x {args.nthread} threads")
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_local_worker, args=(args, train_dir, model_dir, rank, n_workers, tracker_address))
+               for rank in range(n_workers)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    failed, timed_out = [], False
+    while any(worker.is_alive() for worker in workers):
+        failed = [rank for rank, worker in enumerate(workers) if worker.exitcode not in (None, 0)]
+        timed_out = time.perf_counter() - start > args.worker_timeout_s
+        if failed or timed_out:
+            break
+        time.sleep(0.5)
+    failed = [rank for rank, worker in enumerate(workers) if worker.exitcode not in (None, 0)]
+    if failed or timed_out:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        # The tracker thread is a daemon and goes down with this process
+        reason = f"workers {failed} failed" if failed else f"timed out after {args.worker_timeout_s}s"
+        raise RuntimeError(f"Local cluster stopped: {reason}")
+
+    for worker in workers:
+        worker.join()
+    wait_tracker(tracker)
+    elapsed = time.perf_counter() - start
+    print(f"Local cluster finished in {elapsed:.1f}s")
+    return elapsed
+
+
+def main():
+    args = parse_args()
+
+    # SageMaker sets these environment variables
+    train_dir = os.environ.get('SM_CHANNEL_TRAIN', '/opt/ml/input/data/train')
+    model_dir = os.environ.get('SM_MODEL_DIR', '/opt/ml/model')
+
+    if args.local_workers > 1:
+        run_local_cluster(args, train_dir, model_dir)
+        return
+
+    hosts, current_host = sagemaker_hosts()
+    if len(hosts) <= 1:
+        run_training(args, train_dir, model_dir)
+        return
+
+    # Multi-instance SageMaker job: the first host runs the tracker, all hosts train
+    rank, world_size = hosts.index(current_host), len(hosts)
+    tracker_ip = socket.gethostbyname(hosts[0])
+    tracker, tracker_address = None, (tracker_ip, args.tracker_port)
+    if rank == 0:
+        # The other hosts can only dial --tracker_port, so the tracker must listen exactly there
+        try:
+            tracker, tracker_address = start_tracker(tracker_ip, world_size, args.tracker_port)
+        except Exception as e:
+            raise RuntimeError(f"Rabit tracker cannot listen on {tracker_ip}:{args.tracker_port}: {e}") from e
+        if tracker_address[1] != args.tracker_port:
+            raise RuntimeError(f"Rabit tracker listens on port {tracker_address[1]} instead of "
+                               f"--tracker_port {args.tracker_port}, which the other hosts connect to")
+    with xgb.collective.CommunicatorContext(**communicator_args(*tracker_address, rank)):
+        run_training(args, train_dir, model_dir, rank, world_size, shard=not input_is_presharded())
+    if tracker is not None:
+        wait_tracker(tracker)
 
-    # Save model artifact
-    model_path = os.path.join(model_dir, "xgboost-model")
-    model.save_model(model_path)
-    print(f"Model saved to: {model_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,173 @@
+"""
+Accuracy vs. memory of the trending counters in modules/lambda/trending.py.
+
+Replays a stream of product events - either request records captured by
+Firehose (JSON lines, optionally gzipped, as published by lambda_handler) or
+synthetic traffic with Zipf popularity plus products that burst for a while -
+through WindowedCountMin at several sketch sizes. At regular checkpoints the
+sketch's top-k is compared with exact sliding-window counts:
+
+- recall@k: share of the exact top-k the sketch also reports
+- relative error of the estimated counts for the exact top-k products
+- memory of the counters and update throughput
+
+Usage:
+    python trending_benchmark.py --events 500000 --widths 256,1024,4096 --depths 2,4
+    python trending_benchmark.py --replay ./firehose_dump --widths 1024,4096
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules", "lambda"))
+from trending import WindowedCountMin, extract_product_ids  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replay', type=str, default=None,
+                        help="File or directory of captured stream records (JSON lines, .gz allowed)")
+    parser.add_argument('--events', type=int, default=300_000)
+    parser.add_argument('--products', type=int, default=49_688)
+    parser.add_argument('--duration_s', type=float, default=6 * 3600)
+    parser.add_argument('--window_s', type=float, default=3600)
+    parser.add_argument('--slots', type=int, default=12)
+    parser.add_argument('--widths', type=str, default='256,1024,4096,16384')
+    parser.add_argument('--depths', type=str, default='2,4')
+    parser.add_argument('--top_k', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--checkpoints', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=str, default='trending_benchmark.json')
+    return parser.parse_args()
+
+
+def synthetic_events(n_events, n_products, duration_s, seed, n_bursts=30, burst_share=0.01):
+    """Zipf background traffic plus bursts: a long-tail product takes burst_share of traffic for 20-90 minutes."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_products + 1)
+    product_by_rank = rng.permutation(n_products) + 1
+    times = np.sort(rng.uniform(0, duration_s, n_events))
+    products = product_by_rank[rng.choice(n_products, n_events, p=weights / weights.sum())]
+
+    burst_products = product_by_rank[rng.integers(100, n_products, n_bursts)]
+    starts = rng.uniform(0, duration_s, n_bursts)
+    lengths = rng.uniform(1200, 5400, n_bursts)
+    for product, start, length in zip(burst_products, starts, lengths):
+        in_burst = (times >= start) & (times < start + length)
+        products[in_burst & (rng.random(n_events) < burst_share)] = product
+    return products.astype(np.int64), times
+
+
+def replay_events(path):
+    """Product events from captured stream records, timed by their 'timestamp' field."""
+    files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)] \
+        if os.path.isdir(path) else [path]
+    products, times = [], []
+    for file in files:
+        opener = gzip.open if file.endswith(".gz") else open
+        with opener(file, "rt") as f:
+            for line in f:
+                # Firehose concatenates records; split "}{" boundaries onto separate lines
+                for chunk in line.replace("}{", "}\n{").splitlines():
+                    if not chunk.strip():
+                        continue
+                    try:
+                        record = json.loads(chunk)
+                        ts = np.datetime64(record["timestamp"]).astype("datetime64[ms]").astype(np.int64) / 1000.0
+                    except (ValueError, KeyError):
+                        continue
+                    for pid in extract_product_ids(record, count_recommendations=True):
+                        products.append(pid)
+                        times.append(ts)
+    order = np.argsort(times, kind="stable")
+    return np.asarray(products, dtype=np.int64)[order], np.asarray(times)[order]
+
+
+def exact_checkpoints(products, times, window_s, n_checkpoints, top_k):
+    """
+    Exact top-k and counts of the sliding window at evenly spaced event positions,
+    plus the largest number of events the exact window had to hold.
+    """
+    positions = np.linspace(len(products) // n_checkpoints, len(products), n_checkpoints).astype(int)
+    counts, window = Counter(), deque()
+    results, i, max_window = [], 0, 0
+    for position in positions:
+        while i < position:
+            window.append((times[i], products[i]))
+            counts[products[i]] += 1
+            i += 1
+        now = times[position - 1]
+        while window and window[0][0] <= now - window_s:
+            _, product = window.popleft()
+            counts[product] -= 1
+            if counts[product] == 0:
+                del counts[product]
+        max_window = max(max_window, len(window))
+        results.append((position, now, counts.most_common(top_k)))
+    return results, max_window
+
+
+def evaluate(products, times, checkpoints, args, width, depth):
+    sketch = WindowedCountMin(args.window_s, args.slots, width, depth, top_k=args.top_k)
+    recalls, errors, update_s = [], [], 0.0
+    start = 0
+    for position, now, exact_top in checkpoints:
+        t0 = time.perf_counter()
+        for lo in range(start, position, args.batch):
+            hi = min(lo + args.batch, position)
+            sketch.update(products[lo:hi], times[lo:hi])
+        update_s += time.perf_counter() - t0
+        start = position
+
+        exact_ids = [pid for pid, _ in exact_top]
+        reported = {pid for pid, _ in sketch.top(args.top_k, now=now)}
+        recalls.append(len(reported.intersection(exact_ids)) / max(len(exact_ids), 1))
+        estimates = sketch.estimate(exact_ids)
+        exact_counts = np.array([count for _, count in exact_top], dtype=np.float64)
+        errors.append(float(np.mean(np.abs(estimates - exact_counts) / exact_counts)))
+    return {"width": width, "depth": depth, "memory_kb": round(sketch.nbytes / 1024, 1),
+            f"recall_at_{args.top_k}": round(float(np.mean(recalls)), 4),
+            "mean_relative_error": round(float(np.mean(errors)), 4),
+            "events_per_s": round(len(products) / update_s)}
+
+
+def main():
+    args = parse_args()
+    if args.replay:
+        products, times = replay_events(args.replay)
+        print(f"📥 Replaying {len(products)} product events from {args.replay}")
+    else:
+        products, times = synthetic_events(args.events, args.products, args.duration_s, args.seed)
+        print(f"🧪 Generated {len(products)} synthetic product events")
+    if len(products) == 0:
+        print("❌ No product events to replay")
+        sys.exit(1)
+
+    checkpoints, max_window = exact_checkpoints(products, times, args.window_s, args.checkpoints, args.top_k)
+    # Exact sliding counts must keep every (timestamp, product_id) in the window
+    exact_kb = max_window * 16 / 1024
+    results = [evaluate(products, times, checkpoints, args, int(w), int(d))
+               for d in args.depths.split(',') for w in args.widths.split(',')]
+
+    print(f"{'width':>7}{'depth':>6}{'memory KB':>11}{f'recall@{args.top_k}':>11}{'rel err':>9}{'events/s':>11}")
+    for r in results:
+        print(f"{r['width']:>7}{r['depth']:>6}{r['memory_kb']:>11.1f}{r[f'recall_at_{args.top_k}']:>11.3f}"
+              f"{r['mean_relative_error']:>9.3f}{r['events_per_s']:>11,}")
+    print(f"Exact sliding window holds up to {max_window:,} events: ~{exact_kb:,.0f} KB")
+
+    with open(args.output, "w") as f:
+        json.dump({"events": len(products), "window_s": args.window_s, "top_k": args.top_k,
+                   "exact_window_kb": round(exact_kb, 1), "results": results}, f, indent=2)
+    print(f"✅ Saved benchmark results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Validate a DynamoDB import-from-S3 export written by the Glue job
+(--dynamodb_write_mode import) before starting an import.
+
+The key schema of each table comes from the aws_dynamodb_table resources in
+modules/dynamodb/main.tf. Every gzip DynamoDB JSON line is checked for:
+
+- a top-level {"Item": {...}} object with typed attribute values
+- the hash/range key attributes being present with the declared type
+- parseable number values and non-empty keys
+- the 400 KB DynamoDB item size limit
+- duplicate primary keys, which an import rejects
+
+Usage:
+    python validate_dynamodb_import.py ./features_local/dynamodb_import/user_product_features/<run_id>
+    python validate_dynamodb_import.py s3://bucket/dynamodb_import/user_product_features/<run_id> \
+        --table user_product_features
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import re
+import sys
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules", "dynamodb", "main.tf")
+MAX_ITEM_BYTES = 400 * 1024
+TYPE_DESCRIPTORS = {"S", "N", "B", "BOOL", "NULL", "M", "L", "SS", "NS", "BS"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('export_path', type=str, help="Export run directory (local or s3://)")
+    parser.add_argument('--table', type=str, default=None,
+                        help="Table name in main.tf (default: read from manifest.json)")
+    parser.add_argument('--schema', type=str, default=DEFAULT_SCHEMA)
+    parser.add_argument('--max_errors', type=int, default=20)
+    return parser.parse_args()
+
+
+def load_key_schemas(tf_path):
+    """Return {table: {"hash": (name, type), "range": (name, type) or None}} from aws_dynamodb_table blocks."""
+    with open(tf_path) as f:
+        text = f.read()
+    schemas = {}
+    for match in re.finditer(r'resource\s+"aws_dynamodb_table"\s+"(\w+)"\s*\{', text):
+        # Take the block body up to the next resource
+        end = text.find('\nresource ', match.end())
+        body = text[match.end():end if end != -1 else len(text)]
+        attributes = dict(re.findall(r'name\s*=\s*"(\w+)"\s*\n\s*type\s*=\s*"(\w+)"', body))
+        hash_key = re.search(r'hash_key\s*=\s*"(\w+)"', body).group(1)
+        range_key = re.search(r'range_key\s*=\s*"(\w+)"', body)
+        schemas[match.group(1)] = {
+            "hash": (hash_key, attributes[hash_key]),
+            "range": (range_key.group(1), attributes[range_key.group(1)]) if range_key else None,
+        }
+    return schemas
+
+
+def open_export(export_path):
+    """Return (manifest or None, list of (name, opener)) for the data files of an export."""
+    if export_path.startswith("s3://"):
+        import boto3
+        s3 = boto3.client('s3')
+        bucket, _, prefix = export_path[len("s3://"):].partition("/")
+        prefix = prefix.rstrip("/")
+        try:
+            manifest = json.load(s3.get_object(Bucket=bucket, Key=f"{prefix}/manifest.json")["Body"])
+        except s3.exceptions.NoSuchKey:
+            manifest = None
+        files = []
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=f"{prefix}/data/part-"):
+            for obj in page.get("Contents", []):
+                files.append((obj["Key"], lambda key=obj["Key"]: io.BytesIO(
+                    s3.get_object(Bucket=bucket, Key=key)["Body"].read())))
+        return manifest, files
+
+    manifest_path = os.path.join(export_path, "manifest.json")
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    data_dir = os.path.join(export_path, "data")
+    files = [(name, lambda name=name: open(os.path.join(data_dir, name), "rb"))
+             for name in sorted(os.listdir(data_dir)) if name.startswith("part-")]
+    return manifest, files
+
+
+def check_value(value):
+    """Return an error message for a malformed typed attribute value, or None."""
+    if not isinstance(value, dict) or len(value) != 1:
+        return f"attribute value must have exactly one type descriptor: {value!r}"
+    (descriptor, raw), = value.items()
+    if descriptor not in TYPE_DESCRIPTORS:
+        return f"unknown type descriptor {descriptor!r}"
+    if descriptor == "N":
+        try:
+            number = Decimal(raw)
+        except (InvalidOperation, TypeError):
+            return f"invalid number {raw!r}"
+        if not number.is_finite():
+            return f"non-finite number {raw!r}"
+    return None
+
+
+def validate(export_path, table, schema_path, max_errors=20):
+    """Validate an export and return a summary dict; summary["errors"] lists problems found."""
+    manifest, files = open_export(export_path)
+    table = table or (manifest or {}).get("table_name")
+    if not table:
+        raise ValueError("No --table given and no manifest.json with table_name in the export")
+    schemas = load_key_schemas(schema_path)
+    if table not in schemas:
+        raise ValueError(f"Table {table!r} not found in {schema_path}; known: {sorted(schemas)}")
+    schema = schemas[table]
+    keys = [schema["hash"]] + ([schema["range"]] if schema["range"] else [])
+
+    errors, seen = [], set()
+    items = duplicates = 0
+
+    def error(message):
+        if len(errors) < max_errors:
+            errors.append(message)
+
+    if not files:
+        error("no data files (part-*) found")
+    for name, opener in files:
+        with gzip.open(opener(), "rt", encoding="utf-8") as lines:
+            for line_no, line in enumerate(lines, 1):
+                where = f"{os.path.basename(name)}:{line_no}"
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    error(f"{where}: invalid JSON ({e})")
+                    continue
+                item = record.get("Item") if isinstance(record, dict) else None
+                if not isinstance(item, dict):
+                    error(f"{where}: line is not an {{\"Item\": {{...}}}} object")
+                    continue
+                items += 1
+                if len(line.encode("utf-8")) > MAX_ITEM_BYTES:
+                    error(f"{where}: item exceeds {MAX_ITEM_BYTES} bytes")
+                for attr, value in item.items():
+                    problem = check_value(value)
+                    if problem:
+                        error(f"{where}: {attr}: {problem}")
+                key = []
+                for key_name, key_type in keys:
+                    value = item.get(key_name)
+                    if not isinstance(value, dict) or key_type not in value:
+                        error(f"{where}: key {key_name} missing or not of type {key_type}")
+                    elif value[key_type] in ("", None):
+                        error(f"{where}: key {key_name} is empty")
+                    elif check_value(value) is None:
+                        # 5 and 5.0 are the same number key in DynamoDB
+                        key.append(str(Decimal(value[key_type]).normalize()) if key_type == "N" else value[key_type])
+                if len(key) == len(keys):
+                    key = tuple(key)
+                    if key in seen:
+                        duplicates += 1
+                        error(f"{where}: duplicate primary key {key}")
+                    seen.add(key)
+
+    if manifest is not None:
+        if manifest.get("item_count") not in (None, items):
+            error(f"manifest item_count {manifest['item_count']} != {items} items in data files")
+        declared = {d["AttributeName"]: d["AttributeType"] for d in manifest.get("attribute_definitions", [])}
+        for key_name, key_type in keys:
+            if declared.get(key_name, key_type) != key_type:
+                error(f"manifest declares {key_name} as {declared[key_name]}, main.tf as {key_type}")
+
+    return {"table": table, "files": len(files), "items": items, "duplicate_keys": duplicates,
+            "key_schema": {"hash": schema["hash"], "range": schema["range"]}, "errors": errors}
+
+
+def main():
+    args = parse_args()
+    summary = validate(args.export_path, args.table, args.schema, args.max_errors)
+    print(f"🔍 {summary['table']}: {summary['items']} items in {summary['files']} files, "
+          f"key schema {summary['key_schema']}")
+    if summary["errors"]:
+        for message in summary["errors"]:
+            print(f"❌ {message}")
+        sys.exit(1)
+    print("✅ Export is valid for DynamoDB import")
+
+
+if __name__ == "__main__":
+    main()